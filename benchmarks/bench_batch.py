@@ -0,0 +1,96 @@
+"""
+Batch search throughput benchmark
+Compares a serial loop over find_best_ski_resorts with one
+find_best_ski_resorts_batch call, both against the fake Google server with
+cold caches, and reports queries/sec and Google calls per endpoint.
+
+Usage:
+    python benchmarks/bench_batch.py [--queries 200] [--latency 0.05]
+
+Town names are added to the location gazetteer and geocoded by the fake
+server to stable points across New England, so nearby towns overlap.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ski_resort_finder"))
+from embedding_store import EmbeddingStore  # noqa: E402
+from fake_google import FakeGoogleServer  # noqa: E402
+from location_extractor import CITIES, default_gazetteer  # noqa: E402
+from places_cache import PlacesCache  # noqa: E402
+from resort_catalog import ResortCatalog  # noqa: E402
+from ski_resort import SkiResortFinder, resort_location_aliases  # noqa: E402
+from vector_index import VectorIndex  # noqa: E402
+
+TOWNS = [
+    "Adams", "Amesbury", "Andover", "Athol", "Barre", "Bath", "Belfast", "Bennington", "Berlin", "Bethel",
+    "Brattleboro", "Bridgton", "Brunswick", "Camden", "Claremont", "Colebrook", "Conway", "Dover", "Easthampton",
+    "Ellsworth", "Exeter", "Farmington", "Fitchburg", "Franconia", "Gardner", "Gorham", "Greenfield", "Hanover",
+    "Hinsdale", "Houlton", "Jaffrey", "Jay", "Keene", "Killingly", "Laconia", "Lebanon", "Lee", "Lenox",
+    "Lewiston", "Littleton", "Ludlow", "Lyndonville", "Machias", "Manchester Center", "Middlebury", "Milford",
+    "Millinocket", "Morrisville", "Newport", "North Adams", "Norwich", "Orange", "Orono", "Peterborough",
+    "Plymouth", "Presque Isle", "Randolph", "Rangeley", "Rockland", "Rumford", "Saco", "Skowhegan",
+    "Springvale", "St. Johnsbury", "Stowe Village", "Stratton", "Sturbridge", "Tamworth", "Ware", "Waterbury",
+    "Westfield", "White River Junction", "Wilmington", "Windsor", "Winchendon", "Wolfeboro", "Woodstock",
+]
+TEMPLATES = ["ski resorts near {}", "family friendly skiing close to {}", "best powder near {}", "night skiing around {}"]
+
+
+def make_queries(count):
+    return [TEMPLATES[i % len(TEMPLATES)].format(TOWNS[i % len(TOWNS)]) for i in range(count)]
+
+
+def fresh_finder(base_url, model_name):
+    """A finder with empty caches, catalog and embedding store in a new temp directory."""
+    directory = tempfile.mkdtemp(prefix="bench-batch-")
+    os.environ["GOOGLE_MAPS_BASE_URL"] = base_url
+    finder = SkiResortFinder("bench-key", model_name=model_name, cache=PlacesCache(os.path.join(directory, "places.sqlite3")))
+    finder.catalog = ResortCatalog(os.path.join(directory, "catalog.sqlite3"))
+    finder.embedding_store = EmbeddingStore(model_name, directory)
+    finder.vector_index = VectorIndex(model_name, directory)
+    finder.location_extractor.gazetteer = default_gazetteer(resort_location_aliases(), cities=CITIES + TOWNS)
+    return finder
+
+
+def run(mode, server, queries, model_name):
+    finder = fresh_finder(server.base_url, model_name)
+    finder.prewarm()
+    server.reset_counts()
+    start = time.perf_counter()
+    if mode == "serial":
+        results = [finder.find_best_ski_resorts(query) for query in queries]
+    else:
+        results = finder.find_best_ski_resorts_batch(queries)
+    elapsed = time.perf_counter() - start
+    return results, elapsed, dict(server.calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake Google latency per request (s)")
+    parser.add_argument("--model", default="paraphrase-distilroberta-base-v1")
+    args = parser.parse_args()
+
+    queries = make_queries(args.queries)
+    with FakeGoogleServer(latency=args.latency, geocode_unknown=True) as server:
+        serial, serial_time, serial_calls = run("serial", server, queries, args.model)
+        batch, batch_time, batch_calls = run("batch", server, queries, args.model)
+
+    same = sum(
+        1 for a, b in zip(serial, batch)
+        if {r["name"] for r in a or []} == {r["name"] for r in b or []}
+    )
+    print(f"{len(queries)} queries, fake Google latency {args.latency * 1000:.0f}ms")
+    print(f"{'mode':>8} {'seconds':>9} {'queries/s':>10} {'geocode':>8} {'nearby':>7}")
+    for mode, elapsed, calls in (("serial", serial_time, serial_calls), ("batch", batch_time, batch_calls)):
+        print(f"{mode:>8} {elapsed:>9.2f} {len(queries) / elapsed:>10.1f} "
+              f"{calls.get('geocode', 0):>8} {calls.get('place/nearbysearch', 0):>7}")
+    print(f"speedup {serial_time / batch_time:.1f}x; identical result sets for {same}/{len(queries)} queries")
+
+
+if __name__ == '__main__':
+    main()
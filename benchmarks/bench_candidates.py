@@ -0,0 +1,125 @@
+"""
+Candidate pipeline memory benchmark
+Compares the original list-of-dicts ranking pipeline (filter_by_distance ->
+remove_duplicates -> remove_invalid_resorts -> get_top_matches ->
+sort_resorts) with the columnar CandidateBatch pipeline in
+ski_resort_finder/candidates.py, per request.
+
+Usage:
+    python benchmarks/bench_candidates.py [--sizes 100 300 1000 10000] [--top-n 30]
+
+Reports the peak memory allocated during one request (tracemalloc), the
+number of resort dicts built and the time per request. Query similarities
+are precomputed per resort so only the candidate handling is measured.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ski_resort_finder"))
+from candidates import CandidateBatch  # noqa: E402
+from geo import coordinates, within_distance  # noqa: E402
+from vector_index import top_k  # noqa: E402
+
+CENTER = (42.3732, -72.5199)  # Amherst, MA
+MAX_DISTANCE_KM = 100
+
+
+def make_resorts(count, seed=0):
+    """Nearby Search candidates as ski_resort_finder.py parsed them (with website/reviews placeholders)."""
+    rng = np.random.default_rng(seed)
+    lats = CENTER[0] + rng.uniform(-1.5, 1.5, count)
+    lngs = CENTER[1] + rng.uniform(-2, 2, count)
+    ratings = np.where(rng.random(count) < 0.1, 0, np.round(rng.uniform(1, 5, count), 1))
+    return [
+        {"name": f"Resort {i % (count - count // 20)}", "address": f"{i % (count - count // 20)} Mountain Rd",
+         "rating": float(rating), "lat": float(lat), "lng": float(lng), "place_id": f"place-{i}",
+         "website": "", "reviews": []}
+        for i, (lat, lng, rating) in enumerate(zip(lats, lngs, ratings))
+    ]
+
+
+def dict_pipeline(resorts, scores, top_n):
+    # The original pipeline: every stage builds new dicts or lists
+    lats, lngs = coordinates(resorts)
+    indices, distances = within_distance(*CENTER, lats, lngs, MAX_DISTANCE_KM)
+    resorts = [{**resorts[i], "distance": float(d)} for i, d in zip(indices, distances)]
+    rows = indices
+    unique_resorts = {}
+    unique_rows = {}
+    for resort, row in zip(resorts, rows):
+        key = (resort["name"].lower(), resort["address"].lower())
+        if key not in unique_resorts:
+            unique_resorts[key] = resort
+            unique_rows[key] = row
+    resorts = list(unique_resorts.values())
+    rows = list(unique_rows.values())
+    valid = [(resort, row) for resort, row in zip(resorts, rows) if resort["rating"] > 0]
+    resorts = [resort for resort, _ in valid]
+    similarities = scores[[row for _, row in valid]]
+    top_resorts = [resorts[i] for i in top_k(similarities, top_n)]
+    return sorted(top_resorts, key=lambda x: (-x["rating"], x["distance"]))
+
+
+def batch_pipeline(resorts, scores, top_n):
+    candidates = CandidateBatch.from_records(resorts).within(*CENTER, MAX_DISTANCE_KM).unique().rated()
+    similarities = scores[candidates.rows]
+    return candidates.take(top_k(similarities, top_n)).sorted_by_rating().records()
+
+
+def measure(pipeline, resorts, scores, top_n, repeat):
+    tracemalloc.start()
+    result = pipeline(resorts, scores, top_n)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        pipeline(resorts, scores, top_n)
+    return result, peak, (time.perf_counter() - start) / repeat
+
+
+def count_dicts(pipeline, resorts, scores, top_n):
+    """Resort dicts a pipeline builds, counted through the keys() call of {**resort}."""
+    built = [0]
+
+    class Counting(dict):
+        # Overriding __iter__ takes dict unpacking off its fast path, so keys() is called
+        def __iter__(self):
+            return super().__iter__()
+
+        def keys(self):
+            built[0] += 1
+            return super().keys()
+
+    pipeline([Counting(resort) for resort in resorts], scores, top_n)
+    return built[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 300, 1000, 10000])
+    parser.add_argument("--top-n", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    print(f"{'candidates':>10} {'pipeline':>8} {'peak KiB':>9} {'dicts':>7} {'ms/request':>11}")
+    for size in args.sizes:
+        resorts = make_resorts(size)
+        scores = rng.random(size)
+        results = {}
+        for name, pipeline in (("dicts", dict_pipeline), ("batch", batch_pipeline)):
+            result, peak, seconds = measure(pipeline, resorts, scores, args.top_n, args.repeat)
+            dicts = count_dicts(pipeline, resorts, scores, args.top_n)
+            results[name] = [resort["place_id"] for resort in result]
+            print(f"{size:>10} {name:>8} {peak / 1024:>9.1f} {dicts:>7} {seconds * 1000:>11.3f}")
+        if results["dicts"] != results["batch"]:
+            print(f"Warning: pipelines disagree for {size} candidates")
+
+
+if __name__ == '__main__':
+    main()
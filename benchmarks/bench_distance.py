@@ -0,0 +1,94 @@
+"""
+Distance filter micro-benchmark
+Compares the original per-resort geodesic filter_by_distance against the
+vectorized haversine kernel in ski_resort_finder/geo.py.
+
+Usage:
+    python benchmarks/bench_distance.py [--sizes 100 10000 1000000]
+
+The geodesic baseline is timed on at most --baseline-limit points and
+extrapolated linearly beyond that, since it takes minutes at 1M points.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from geopy.distance import geodesic
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ski_resort_finder"))
+from geo import coordinates, within_distance  # noqa: E402
+
+CENTER = (42.3732, -72.5199)  # Amherst, MA
+MAX_DISTANCE_KM = 100
+
+
+def make_resorts(count, seed=0):
+    rng = np.random.default_rng(seed)
+    lats = CENTER[0] + rng.uniform(-2, 2, count)
+    lngs = CENTER[1] + rng.uniform(-2.5, 2.5, count)
+    return [{"name": f"Resort {i}", "lat": float(lat), "lng": float(lng)} for i, (lat, lng) in enumerate(zip(lats, lngs))]
+
+
+def geodesic_filter(resorts, lat, lng):
+    # The original filter_by_distance
+    return [
+        {**resort, "distance": geodesic((lat, lng), (resort["lat"], resort["lng"])).km}
+        for resort in resorts if geodesic((lat, lng), (resort["lat"], resort["lng"])).km <= MAX_DISTANCE_KM
+    ]
+
+
+def vectorized_filter(resorts, lat, lng, exact=False):
+    lats, lngs = coordinates(resorts)
+    indices, distances = within_distance(lat, lng, lats, lngs, MAX_DISTANCE_KM, exact=exact)
+    return [{**resorts[i], "distance": float(d)} for i, d in zip(indices, distances)]
+
+
+def kernel_only(lats, lngs, lat, lng):
+    return within_distance(lat, lng, lats, lngs, MAX_DISTANCE_KM)
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 1_000_000])
+    parser.add_argument("--baseline-limit", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'points':>10} {'geodesic (s)':>14} {'haversine (s)':>14} {'kernel (s)':>12} {'exact (s)':>12} {'speedup':>9}")
+    for size in args.sizes:
+        resorts = make_resorts(size)
+        lats, lngs = coordinates(resorts)
+
+        sample = resorts[:min(size, args.baseline_limit)]
+        baseline = best_of(lambda: geodesic_filter(sample, *CENTER), 1 if len(sample) > 1000 else args.repeat)
+        baseline *= size / len(sample)
+        estimated = "*" if len(sample) < size else " "
+
+        vectorized = best_of(lambda: vectorized_filter(resorts, *CENTER), args.repeat)
+        kernel = best_of(lambda: kernel_only(lats, lngs, *CENTER), args.repeat)
+        exact = best_of(lambda: vectorized_filter(sample, *CENTER, exact=True), 1) * size / len(sample)
+
+        # Sanity check: same survivors as the original implementation (up to haversine error at the edge)
+        if size <= args.baseline_limit:
+            original = {r["name"] for r in geodesic_filter(resorts, *CENTER)}
+            exact_names = {r["name"] for r in vectorized_filter(resorts, *CENTER, exact=True)}
+            assert original == exact_names, "exact mode must match geodesic filtering"
+
+        print(f"{size:>10} {baseline:>13.4f}{estimated} {vectorized:>14.4f} {kernel:>12.5f} {exact:>12.4f} "
+              f"{baseline / vectorized:>8.0f}x")
+    print("* extrapolated from --baseline-limit points")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+Embedding backend benchmark
+Compares the PyTorch SentenceTransformer with the int8 ONNX Runtime encoder
+(ski_resort_finder/onnx_encoder.py): model load time, peak RSS, query and
+resort-batch encode latency, and how closely the ONNX rankings follow the
+PyTorch ones.
+
+Usage:
+    python benchmarks/bench_embeddings.py [--threads 1 4] [--top-k 10 30]
+    python benchmarks/bench_embeddings.py --min-overlap 0.9   # exit 1 if rankings drift
+
+Each backend and thread count runs in its own process, so the peak RSS is
+that encoder's alone; the one-off ONNX export runs in a separate process
+first. Resort texts come from the Nearby Search and Place Details responses
+in the benchmark cassette and queries from queries.txt.
+
+Accuracy: for every query, the resorts are ranked by cosine similarity under
+each backend. overlap@k is the share of the PyTorch top k that is also in
+the ONNX top k; top-1 is how often both rank the same resort first. The
+cosine between each text's PyTorch and ONNX vectors is reported as well.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PACKAGE = os.path.join(HERE, "..", "ski_resort_finder")
+sys.path.insert(0, PACKAGE)
+from cassette import Cassette  # noqa: E402
+from embedding_store import resort_text  # noqa: E402
+
+DEFAULT_CASSETTE = os.path.join(HERE, "cassettes", "new_england.json.gz")
+DEFAULT_QUERIES = os.path.join(HERE, "queries.txt")
+BACKENDS = ("torch", "onnx")
+
+
+def load_queries(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def resort_texts(cassette_path):
+    """Distinct resort texts, as the finders encode them, from the cassette's Places responses."""
+    texts = {}
+    for body in Cassette.load(cassette_path).interactions.values():
+        for place in body.get("results") or []:
+            if place.get("name") and "vicinity" in place:
+                texts.setdefault(resort_text({"name": place["name"], "address": place["vicinity"]}), None)
+        place = body.get("result") or {}
+        if place.get("name"):
+            texts.setdefault(resort_text({"name": place["name"], "address": place.get("formatted_address", "")}), None)
+    return list(texts)
+
+
+def worker(args):
+    """Load one backend in this process, time its encodes and save the vectors."""
+    from lazy_models import sentence_model
+
+    threads = args.threads[0]
+    if args.worker == "onnx":
+        os.environ["SKI_RESORT_ONNX_THREADS"] = str(threads)
+    elif threads:
+        import torch
+        torch.set_num_threads(threads)
+
+    queries = load_queries(args.queries)
+    texts = resort_texts(args.cassette)
+
+    start = time.perf_counter()
+    model = sentence_model(args.model, backend=args.worker).get()
+    load_seconds = time.perf_counter() - start
+    model.encode(queries[:4])  # first call allocates arenas and caches
+
+    query_latencies = []
+    query_vectors = []
+    for _ in range(args.repeat):
+        for query in queries:
+            start = time.perf_counter()
+            vector = model.encode(query)
+            query_latencies.append(time.perf_counter() - start)
+            if len(query_vectors) < len(queries):
+                query_vectors.append(vector)
+
+    start = time.perf_counter()
+    resort_vectors = model.encode(texts, batch_size=64, convert_to_numpy=True, show_progress_bar=False)
+    batch_seconds = time.perf_counter() - start
+
+    np.savez(args.output + ".npz", queries=np.asarray(query_vectors, dtype=np.float32),
+             resorts=np.asarray(resort_vectors, dtype=np.float32))
+    with open(args.output, "w") as f:
+        json.dump({
+            "load_seconds": load_seconds,
+            "query_latencies": query_latencies,
+            "batch_seconds": batch_seconds,
+            "resorts": len(texts),
+            # ru_maxrss is in KiB on Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }, f)
+
+
+def run_backend(backend, threads, args):
+    """Run one backend in a child process; returns (summary, query vectors, resort vectors)."""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        output = f.name
+    command = [sys.executable, os.path.abspath(__file__), "--worker", backend, "--threads", str(threads),
+               "--model", args.model, "--queries", args.queries, "--cassette", args.cassette,
+               "--repeat", str(args.repeat), "--output", output]
+    with open(args.log, "a") as log:
+        log.write(f"==== {backend} threads={threads} ====\n")
+        log.flush()
+        subprocess.run(command, check=True, stdout=log, stderr=subprocess.STDOUT)
+    with open(output) as f:
+        data = json.load(f)
+    vectors = np.load(output + ".npz")
+    query_vectors, resort_vectors = vectors["queries"], vectors["resorts"]
+    os.remove(output)
+    os.remove(output + ".npz")
+
+    latencies_ms = np.array(data["query_latencies"]) * 1000
+    summary = {
+        "backend": backend,
+        "threads": threads,
+        "load_seconds": data["load_seconds"],
+        "query_p50_ms": float(np.percentile(latencies_ms, 50)),
+        "query_p95_ms": float(np.percentile(latencies_ms, 95)),
+        "batch_ms_per_resort": data["batch_seconds"] * 1000 / max(data["resorts"], 1),
+        "peak_rss_mb": data["peak_rss_mb"],
+    }
+    return summary, query_vectors, resort_vectors
+
+
+def _normalize(matrix):
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+
+def ranking_overlap(reference, candidate, top_ks):
+    """overlap@k for each k, top-1 agreement and vector cosines of candidate against reference."""
+    (ref_queries, ref_resorts), (queries, resorts) = reference, candidate
+    ref_scores = _normalize(ref_queries) @ _normalize(ref_resorts).T
+    scores = _normalize(queries) @ _normalize(resorts).T
+    ref_order = np.argsort(-ref_scores, axis=1)
+    order = np.argsort(-scores, axis=1)
+    result = {}
+    for k in top_ks:
+        k = min(k, ref_scores.shape[1])
+        shared = [len(set(ref_order[q, :k]) & set(order[q, :k])) / k for q in range(len(ref_order))]
+        result[f"overlap@{k}"] = float(np.mean(shared))
+        result[f"min_overlap@{k}"] = float(np.min(shared))
+    result["top1"] = float(np.mean(ref_order[:, 0] == order[:, 0]))
+    cosines = np.sum(_normalize(ref_resorts) * _normalize(resorts), axis=1)
+    result["mean_cosine"] = float(cosines.mean())
+    result["min_cosine"] = float(cosines.min())
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--model", default="paraphrase-distilroberta-base-v1")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4],
+                        help="Intra-op threads to compare (0 = library default)")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[10, 30])
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the query corpus")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE)
+    parser.add_argument("--min-overlap", type=float, help="Exit 1 if mean overlap@k falls below this for any k")
+    parser.add_argument("--json", help="Write the summaries and accuracy to this file")
+    parser.add_argument("--log", default=os.path.join(tempfile.gettempdir(), "bench_embeddings.log"))
+    # Internal: run one backend in this process
+    parser.add_argument("--worker", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    # The one-off export loads torch; keep it out of the ONNX process being measured
+    with open(args.log, "a") as log:
+        subprocess.run([sys.executable, os.path.join(PACKAGE, "onnx_encoder.py"), "export", "--model", args.model],
+                       check=True, stdout=log, stderr=subprocess.STDOUT)
+
+    summaries, vectors = [], {}
+    for threads in args.threads:
+        for backend in BACKENDS:
+            summary, query_vectors, resort_vectors = run_backend(backend, threads, args)
+            summaries.append(summary)
+            vectors.setdefault(backend, (query_vectors, resort_vectors))
+
+    print(f"{'backend':>8} {'threads':>7} {'load s':>7} {'RSS MB':>7} {'query p50 ms':>13} "
+          f"{'query p95 ms':>13} {'ms/resort':>10}")
+    for s in summaries:
+        print(f"{s['backend']:>8} {s['threads']:>7} {s['load_seconds']:>7.2f} {s['peak_rss_mb']:>7.0f} "
+              f"{s['query_p50_ms']:>13.2f} {s['query_p95_ms']:>13.2f} {s['batch_ms_per_resort']:>10.3f}")
+
+    accuracy = ranking_overlap(vectors["torch"], vectors["onnx"], args.top_k)
+    print(f"ONNX int8 vs PyTorch over {len(vectors['torch'][0])} queries x {len(vectors['torch'][1])} resorts: "
+          + ", ".join(f"{name} {value:.3f}" for name, value in accuracy.items()))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summaries": summaries, "accuracy": accuracy}, f, indent=2)
+    if args.min_overlap is not None:
+        drifted = [name for name, value in accuracy.items()
+                   if name.startswith("overlap@") and value < args.min_overlap]
+        if drifted:
+            print(f"Ranking drift: {', '.join(drifted)} below {args.min_overlap}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+"""
+Load test
+Drives /api/search of one api/index.py instance with concurrent requests and
+finds where its latency collapses. Everything runs locally: Google is the
+fake server in ski_resort_finder/fake_google.py, with per-request latency,
+jitter and page tokens that only become valid after a delay, as with Google.
+
+Usage:
+    python benchmarks/bench_load.py --concurrency 1 4 16 64 --duration 20   # closed loop
+    python benchmarks/bench_load.py --rate 2 5 10 20 --duration 20          # open loop
+    python benchmarks/bench_load.py --mix repeat=0.2,unique=0.8 --latency 0.1 --page-token-delay 2
+    python benchmarks/bench_load.py --workers 4 --json load.json            # four pre-fork workers
+
+Closed loop: each of --concurrency clients sends its next request as soon as
+the previous one is answered, so the offered load adapts to the server.
+Open loop: requests arrive as a Poisson process at --rate per second
+whatever the server does, and latency is measured from each request's
+scheduled arrival, so queueing (in the client too) is not hidden.
+Each level runs for --duration seconds, one after another against the same
+server, so caches warm up from level to level. Use --cache-dir to start
+from caches kept from an earlier run.
+
+Query mix (--mix): "repeat" sends a corpus query as it is, so the result
+cache can answer it; "unique" appends a request number, so the search runs
+again on top of the Google response cache and the catalog.
+
+Reported per level: throughput, latency percentiles of answered requests
+(200 and 404), error rate (5xx, timeouts and connection errors), Google
+calls per request by endpoint and the server's RSS. A level whose p99
+exceeds --slo or whose error rate exceeds 1% is marked as saturated.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PACKAGE = os.path.join(HERE, "..", "ski_resort_finder")
+sys.path.insert(0, PACKAGE)
+from bench_prefork import child_pids, free_port, load_queries  # noqa: E402
+from fake_google import FakeGoogleServer, synthetic_places  # noqa: E402
+from prefork import process_memory  # noqa: E402
+
+DEFAULT_QUERIES = os.path.join(HERE, "queries.txt")
+DEFAULT_APP = os.path.join(HERE, "..", "api", "index.py")
+ENDPOINTS = ("geocode", "place/nearbysearch", "place/details")
+MIX_KINDS = ("repeat", "unique")
+# Error rate above which a level counts as saturated
+MAX_ERROR_RATE = 0.01
+
+
+def parse_mix(value):
+    """'repeat=0.2,unique=0.8' -> {'repeat': 0.2, 'unique': 0.8} (weights are normalized)."""
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in MIX_KINDS:
+            raise argparse.ArgumentTypeError(f"unknown query kind {name!r} (expected {', '.join(MIX_KINDS)})")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise argparse.ArgumentTypeError("the mix needs a positive weight")
+    return {name: weight / total for name, weight in weights.items()}
+
+
+class QueryMix:
+    """Draws queries from the corpus according to the mix weights (thread-safe)."""
+
+    def __init__(self, queries, mix, seed=0):
+        self.queries = queries
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self._random = random.Random(seed)
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            kind = self._random.choices(self.kinds, self.weights)[0]
+            query = self._random.choice(self.queries)
+            self._counter += 1
+            number = self._counter
+        if kind == "unique":
+            # A different normalized query for the result cache; the location is unchanged
+            return f"{query} (request {number})"
+        return query
+
+
+class Recorder:
+    """Outcomes of one level: (latency in s or None, outcome) per request."""
+
+    def __init__(self):
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def add(self, latency, outcome):
+        with self._lock:
+            self.samples.append((latency, outcome))
+
+
+def send(session, url, query, timeout):
+    """POST one search; returns 'ok', 'not_found', 'http_<status>', 'timeout' or 'connection_error'."""
+    try:
+        response = session.post(url, json={"query": query}, timeout=timeout)
+    except requests.Timeout:
+        return "timeout"
+    except requests.RequestException:
+        return "connection_error"
+    if response.status_code == 200:
+        return "ok"
+    if response.status_code == 404:
+        return "not_found"
+    return f"http_{response.status_code}"
+
+
+def closed_loop(url, mix, concurrency, duration, timeout):
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        with requests.Session() as session:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                outcome = send(session, url, mix.next(), timeout)
+                recorder.add(time.perf_counter() - start, outcome)
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder
+
+
+def open_loop(url, mix, rate, duration, timeout, max_in_flight, seed=0):
+    recorder = Recorder()
+    sessions = threading.local()
+    arrivals = random.Random(seed)
+
+    def request(scheduled):
+        session = getattr(sessions, "session", None)
+        if session is None:
+            session = sessions.session = requests.Session()
+        outcome = send(session, url, mix.next(), timeout)
+        # From the scheduled arrival, so time spent waiting for a client thread counts
+        recorder.add(time.perf_counter() - scheduled, outcome)
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        start = time.perf_counter()
+        scheduled = start
+        while True:
+            scheduled += arrivals.expovariate(rate)
+            if scheduled - start >= duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(request, scheduled)
+    return recorder
+
+
+def summarize(recorder, elapsed, calls, server_pids, slo):
+    samples = recorder.samples
+    answered = [latency for latency, outcome in samples if outcome in ("ok", "not_found")]
+    errors = {}
+    for _, outcome in samples:
+        if outcome not in ("ok", "not_found"):
+            errors[outcome] = errors.get(outcome, 0) + 1
+    requests_sent = len(samples)
+    latencies_ms = np.array(answered) * 1000
+    percentile = (lambda q: float(np.percentile(latencies_ms, q))) if len(latencies_ms) else (lambda q: None)
+    error_rate = sum(errors.values()) / requests_sent if requests_sent else 0.0
+    memory = [process_memory(pid) for pid in server_pids]
+    summary = {
+        "requests": requests_sent,
+        "throughput": len(answered) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(50),
+        "p90_ms": percentile(90),
+        "p99_ms": percentile(99),
+        "max_ms": float(latencies_ms.max()) if len(latencies_ms) else None,
+        "not_found": sum(1 for _, outcome in samples if outcome == "not_found"),
+        "error_rate": error_rate,
+        "errors": errors,
+        "google_calls_per_request": sum(calls.values()) / requests_sent if requests_sent else 0.0,
+        "google_calls": {endpoint: calls.get(endpoint, 0) / requests_sent if requests_sent else 0.0
+                         for endpoint in ENDPOINTS},
+        "server_rss_mb": sum(m["rss_mb"] for m in memory if m),
+    }
+    summary["saturated"] = bool(error_rate > MAX_ERROR_RATE or summary["p99_ms"] is None
+                                or summary["p99_ms"] > slo * 1000)
+    return summary
+
+
+def start_server(fake, args):
+    """Start the app under the pre-fork server; returns (process, base_url)."""
+    port = free_port()
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix="bench-load-")
+    env = dict(os.environ, GOOGLE_MAPS_API_KEY="load-test-key", GOOGLE_MAPS_BASE_URL=fake.base_url,
+               SKI_RESORT_CACHE_DIR=cache_dir)
+    command = [sys.executable, os.path.join(PACKAGE, "prefork.py"), "--app", args.app,
+               "--workers", str(args.workers), "--port", str(port)]
+    with open(args.log, "a") as log:
+        log.write(f"==== bench_load {' '.join(command)} ====\n")
+        log.flush()
+        process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}; see {args.log}")
+        try:
+            if requests.get(f"{base_url}/api/test", timeout=1).ok:
+                return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"server did not start within {args.startup_timeout}s; see {args.log}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--concurrency", type=int, nargs="+", help="Closed loop: concurrent clients per level")
+    parser.add_argument("--rate", type=float, nargs="+", help="Open loop: requests per second per level")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per level")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("repeat=0.5,unique=0.5"),
+                        help="Query kinds and weights, e.g. repeat=0.2,unique=0.8")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout (s)")
+    parser.add_argument("--slo", type=float, default=2.0, help="p99 latency (s) above which a level is saturated")
+    parser.add_argument("--max-in-flight", type=int, default=512, help="Open loop: most concurrent requests")
+    parser.add_argument("--warmup", type=int, default=1, help="Requests sent before the first level (models load)")
+    parser.add_argument("--seed", type=int, default=0)
+    # Server
+    parser.add_argument("--app", default=DEFAULT_APP, help="Python file defining the WSGI app")
+    parser.add_argument("--workers", type=int, default=1, help="Pre-fork worker processes (1 = one instance)")
+    parser.add_argument("--cache-dir", help="Cache directory for the server (default: a new empty one)")
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    # Fake Google
+    parser.add_argument("--latency", type=float, default=0.08, help="Google latency per request (s)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Extra uniform random latency (s)")
+    parser.add_argument("--page-token-delay", type=float, default=1.5, help="Seconds before a page token is valid")
+    parser.add_argument("--places", type=int, default=2000, help="Synthetic resorts served by the fake Google")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every Nth Google call with HTTP 429")
+    parser.add_argument("--json", help="Write the summaries to this file")
+    parser.add_argument("--log", default=os.path.join(tempfile.gettempdir(), "bench_load.log"))
+    args = parser.parse_args()
+    if not args.concurrency and not args.rate:
+        args.concurrency = [1, 4, 16]
+
+    queries = load_queries(args.queries)
+    mix = QueryMix(queries, args.mix, seed=args.seed)
+    fake = FakeGoogleServer(places=synthetic_places(args.places), latency=args.latency, jitter=args.jitter,
+                            page_token_delay=args.page_token_delay, rate_limit_every=args.rate_limit_every,
+                            geocode_unknown=True).start()
+    process = None
+    summaries = []
+    try:
+        process, base_url = start_server(fake, args)
+        url = f"{base_url}/api/search"
+        with requests.Session() as session:
+            for query in queries[:args.warmup]:
+                send(session, url, query, args.startup_timeout)
+        server_pids = child_pids(process.pid) or [process.pid]
+
+        levels = [("closed", level) for level in args.concurrency or []] + [("open", level) for level in args.rate or []]
+        for loop, level in levels:
+            fake.reset_counts()
+            start = time.perf_counter()
+            if loop == "closed":
+                recorder = closed_loop(url, mix, level, args.duration, args.timeout)
+            else:
+                recorder = open_loop(url, mix, level, args.duration, args.timeout, args.max_in_flight,
+                                     seed=args.seed + len(summaries))
+            elapsed = time.perf_counter() - start
+            summary = summarize(recorder, elapsed, dict(fake.calls), server_pids, args.slo)
+            summary.update(loop=loop, level=level)
+            summaries.append(summary)
+            print(f"{loop} {level:g}: {summary['throughput']:.1f} req/s, p99 "
+                  f"{summary['p99_ms'] or float('nan'):.0f} ms, errors {summary['error_rate']:.1%}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        fake.stop()
+
+    print(f"{'loop':>6} {'level':>6} {'requests':>8} {'req/s':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+          f"{'max ms':>8} {'errors':>7} {'calls/req':>9} {'geocode':>7} {'nearby':>7} {'details':>7} "
+          f"{'RSS MB':>7}")
+
+    def ms(value):
+        return f"{value:>8.0f}" if value is not None else f"{'-':>8}"
+
+    for s in summaries:
+        calls = s["google_calls"]
+        print(f"{s['loop']:>6} {s['level']:>6g} {s['requests']:>8} {s['throughput']:>7.1f} {ms(s['p50_ms'])} "
+              f"{ms(s['p90_ms'])} {ms(s['p99_ms'])} {ms(s['max_ms'])} {s['error_rate']:>7.1%} "
+              f"{s['google_calls_per_request']:>9.2f} {calls['geocode']:>7.2f} {calls['place/nearbysearch']:>7.2f} "
+              f"{calls['place/details']:>7.2f} {s['server_rss_mb']:>7.0f}"
+              f"{'  saturated' if s['saturated'] else ''}")
+    saturated = next((s for s in summaries if s["saturated"]), None)
+    if saturated:
+        print(f"Saturated at {saturated['loop']} loop level {saturated['level']:g} "
+              f"(p99 above {args.slo:g}s or more than {MAX_ERROR_RATE:.0%} errors)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summaries, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Pre-fork memory benchmark
+Serves api/index.py with ski_resort_finder/prefork.py in both layouts, with
+the models loaded by every worker (--no-preload, as with independent worker
+processes today) and preloaded once in the master, replays the query corpus
+against each and reports per-process USS/PSS/RSS.
+
+Usage:
+    python benchmarks/bench_prefork.py [--workers 4] [--rounds 2]
+    python benchmarks/bench_prefork.py --cache-dir /path/with/vector/index
+
+Google responses come from the benchmark cassette, so no network is needed.
+Memory is read from /proc/<pid>/smaps_rollup (Linux only) once the workers
+have served the corpus and settled. USS is what each worker costs on its
+own, and the total PSS is what the whole server costs.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PACKAGE = os.path.join(HERE, "..", "ski_resort_finder")
+sys.path.insert(0, PACKAGE)
+from cassette import Cassette, CassetteServer  # noqa: E402
+from prefork import process_memory  # noqa: E402
+
+DEFAULT_CASSETTE = os.path.join(HERE, "cassettes", "new_england.json.gz")
+DEFAULT_QUERIES = os.path.join(HERE, "queries.txt")
+LAYOUTS = (("per-worker", ["--no-preload"]), ("preforked", []))
+
+
+def load_queries(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def child_pids(pid):
+    """Processes whose parent is pid."""
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; the parent pid follows its closing parenthesis
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def wait_settled(pids, timeout, interval=1.0, tolerance_mb=2.0):
+    """Wait until no process's RSS grows by more than tolerance_mb per interval (e.g. models loaded)."""
+    deadline = time.monotonic() + timeout
+    last = None
+    while time.monotonic() < deadline:
+        current = [(process_memory(pid) or {}).get("rss_mb", 0) for pid in pids]
+        if last is not None and all(now - before <= tolerance_mb for now, before in zip(current, last)):
+            return True
+        last = current
+        time.sleep(interval)
+    return False
+
+
+def run_layout(name, options, server, args):
+    """Start the pre-fork server in one layout, replay the corpus and return its memory summary."""
+    port = free_port()
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix="bench-prefork-")
+    env = dict(os.environ, GOOGLE_MAPS_API_KEY="bench-key", GOOGLE_MAPS_BASE_URL=server.base_url,
+               SKI_RESORT_CACHE_DIR=cache_dir)
+    command = [sys.executable, os.path.join(PACKAGE, "prefork.py"), "--workers", str(args.workers),
+               "--port", str(port)] + options
+    with open(args.log, "a") as log:
+        log.write(f"==== {name} ====\n")
+        log.flush()
+        start = time.perf_counter()
+        master = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        while True:
+            if master.poll() is not None:
+                raise RuntimeError(f"{name} server exited with status {master.returncode}; see {args.log}")
+            try:
+                if requests.get(f"{base_url}/api/test", timeout=1).ok:
+                    break
+            except requests.RequestException:
+                time.sleep(0.2)
+        workers = child_pids(master.pid)
+        while len(workers) < args.workers and master.poll() is None:
+            time.sleep(0.2)
+            workers = child_pids(master.pid)
+        wait_settled([master.pid] + workers, args.timeout)
+        ready_seconds = time.perf_counter() - start
+
+        def search(query):
+            try:
+                return requests.post(f"{base_url}/api/search", json={"query": query}, timeout=120).status_code
+            except requests.RequestException:
+                return None
+
+        queries = load_queries(args.queries) * args.rounds
+        with ThreadPoolExecutor(max_workers=args.workers * 2) as executor:
+            statuses = list(executor.map(search, queries))
+        wait_settled([master.pid] + workers, args.timeout)
+
+        master_memory = process_memory(master.pid)
+        worker_memory = [process_memory(pid) for pid in workers]
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=30)
+
+    worker_memory = [memory for memory in worker_memory if memory]
+    return {
+        "layout": name,
+        "workers": len(worker_memory),
+        "ready_seconds": ready_seconds,
+        "answered": sum(1 for status in statuses if status in (200, 404)),
+        "requests": len(statuses),
+        "master_uss_mb": master_memory["uss_mb"],
+        "worker_uss_mb": float(np.mean([m["uss_mb"] for m in worker_memory])),
+        "worker_uss_max_mb": float(np.max([m["uss_mb"] for m in worker_memory])),
+        "worker_rss_mb": float(np.mean([m["rss_mb"] for m in worker_memory])),
+        "total_pss_mb": master_memory["pss_mb"] + sum(m["pss_mb"] for m in worker_memory),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=2, help="Passes over the query corpus")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE)
+    parser.add_argument("--latency", type=float, default=0.02, help="Injected latency per Google request (s)")
+    parser.add_argument("--cache-dir", help="Cache directory to serve from (default: a new empty one per layout)")
+    parser.add_argument("--timeout", type=float, default=300, help="Longest wait for workers to settle (s)")
+    parser.add_argument("--json", help="Write the summaries to this file")
+    parser.add_argument("--log", default=os.path.join(tempfile.gettempdir(), "bench_prefork.log"))
+    args = parser.parse_args()
+
+    with CassetteServer(Cassette.load(args.cassette), latency=args.latency) as server:
+        summaries = [run_layout(name, options, server, args) for name, options in LAYOUTS]
+
+    print(f"{'layout':>11} {'workers':>7} {'ready s':>8} {'answered':>9} {'master USS':>11} {'worker USS':>11} "
+          f"{'max USS':>8} {'worker RSS':>11} {'total PSS':>10}")
+    for s in summaries:
+        print(f"{s['layout']:>11} {s['workers']:>7} {s['ready_seconds']:>8.1f} {s['answered']:>4}/{s['requests']:<4} "
+              f"{s['master_uss_mb']:>11.0f} {s['worker_uss_mb']:>11.0f} {s['worker_uss_max_mb']:>8.0f} "
+              f"{s['worker_rss_mb']:>11.0f} {s['total_pss_mb']:>10.0f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summaries, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""
+Ranking benchmark
+Measures the query embedding cache (ski_resort_finder/query_embeddings.py)
+and the BM25 prefilter and hybrid score (ski_resort_finder/lexical.py) in the
+ranking stage of find_best_ski_resorts on large candidate sets.
+
+Usage:
+    python benchmarks/bench_ranking.py [--sizes 500 2000] [--rounds 3]
+    python benchmarks/bench_ranking.py --prefilter 200 --weight 0.3 --json ranking.json
+
+Each candidate set is a synthetic region of resorts whose names and
+addresses mix resort words, features and towns from the query corpus. Every
+mode ranks each query in queries.txt against it --rounds times with a fresh
+embedding store, so the first round encodes the candidates (cold) and later
+rounds reuse them (warm):
+
+    dense      every query encoded, every candidate embedded and scored
+    cached     + query embedding cache
+    prefilter  + only the --prefilter best BM25 candidates embedded and scored
+    hybrid     + BM25 fused into the ranking score with --weight
+
+Reported per mode: encoder calls, query and resort texts encoded, ms per
+ranking (cold first round; warm p50/p95) and overlap@top-n, the share of the
+dense top results each mode also returns.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "ski_resort_finder"))
+from bench_search import fresh_finder, load_queries  # noqa: E402
+from search_stats import track_search  # noqa: E402
+
+DEFAULT_QUERIES = os.path.join(HERE, "queries.txt")
+CENTER = (42.3732, -72.5199)  # Amherst, MA
+NAMES = ["Pine", "Eagle", "Summit", "Birch", "Granite", "Maple", "Cedar", "Falcon", "Hawk", "Spruce",
+         "Crystal", "Thunder", "Timber", "Powder", "Glacier", "Ridge"]
+KINDS = ["Mountain", "Ski Area", "Resort", "Peak", "Ski Hill", "Nordic Center", "Mountain Lodge",
+         "Snowboard Park", "Family Ski Area", "Night Skiing", "Ski School", "Cross Country Center"]
+TOWNS = ["Amherst", "Boston", "Burlington", "Concord", "Portland", "Worcester", "Springfield", "Rutland",
+         "Montpelier", "North Conway", "Hartford", "Pittsfield", "Northampton", "Manchester", "Nashua",
+         "Bangor", "Lowell", "Providence", "Albany", "Stowe"]
+STREETS = ["Mountain Rd", "Summit Dr", "Main St", "Ski Way", "Lodge Ln", "Valley Rd"]
+MODES = ("dense", "cached", "prefilter", "hybrid")
+
+
+class CountingModel:
+    """Stands in for the finder's lazy model and counts encode calls and texts."""
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = 0
+        self.texts = 0
+
+    def get(self):
+        return self
+
+    def encode(self, sentences, *args, **kwargs):
+        self.calls += 1
+        self.texts += 1 if isinstance(sentences, str) else len(sentences)
+        return self.model.encode(sentences, *args, **kwargs)
+
+
+def make_resorts(count, seed=0):
+    """A region of count candidate resorts (as the finders parse them) within 100 km of CENTER."""
+    rng = np.random.default_rng(seed)
+    resorts = []
+    for i in range(count):
+        distance, bearing = 95 * np.sqrt(rng.random()), rng.uniform(0, 2 * np.pi)
+        resorts.append({
+            "name": f"{rng.choice(NAMES)} {rng.choice(KINDS)}",
+            "address": f"{rng.integers(1, 999)} {rng.choice(STREETS)}, {rng.choice(TOWNS)}",
+            "rating": float(np.round(rng.uniform(2.5, 5), 1)),
+            "lat": CENTER[0] + distance * np.cos(bearing) / 111.0,
+            "lng": CENTER[1] + distance * np.sin(bearing) / (111.0 * np.cos(np.radians(CENTER[0]))),
+            "place_id": f"bench-{seed}-{i}",
+        })
+    return resorts
+
+
+def configure(finder, mode, args):
+    if mode == "dense":
+        finder.query_embeddings = None
+    if mode in ("prefilter", "hybrid"):
+        finder.lexical_prefilter = args.prefilter
+    if mode == "hybrid":
+        finder.lexical_weight = args.weight
+
+
+def run_mode(mode, resorts, queries, model, args):
+    finder = fresh_finder(args.finder, args.model)
+    finder._model = counting = CountingModel(model)
+    configure(finder, mode, args)
+
+    cold, warm, results = [], [], []
+    for round_number in range(args.rounds):
+        for query in queries:
+            start = time.perf_counter()
+            with track_search():
+                ranked = finder._rank_resorts(query, resorts, *CENTER)
+            elapsed = (time.perf_counter() - start) * 1000
+            (cold if round_number == 0 else warm).append(elapsed)
+            if round_number == 0:
+                results.append([resort["place_id"] for resort in ranked or []])
+    resort_texts = finder.embedding_store.encoded
+    return {
+        "mode": mode,
+        "candidates": len(resorts),
+        "encoder_calls": counting.calls,
+        "query_texts": counting.texts - resort_texts,
+        "resort_texts": resort_texts,
+        "cold_ms": float(np.mean(cold)),
+        "warm_p50_ms": float(np.percentile(warm, 50)) if warm else None,
+        "warm_p95_ms": float(np.percentile(warm, 95)) if warm else None,
+    }, results
+
+
+def overlap(reference, results):
+    """Mean share of each reference result list that is also in the corresponding result list."""
+    shares = [len(set(ref) & set(res)) / len(ref) for ref, res in zip(reference, results) if ref]
+    return float(np.mean(shares)) if shares else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000], help="Candidates per region")
+    parser.add_argument("--rounds", type=int, default=3, help="Passes over the query corpus (first is cold)")
+    parser.add_argument("--prefilter", type=int, default=200, help="Candidates kept by the BM25 prefilter")
+    parser.add_argument("--weight", type=float, default=0.3, help="BM25 weight of the hybrid score")
+    parser.add_argument("--finder", default="ski_resort", choices=("ski_resort", "ski_resort_finder"))
+    parser.add_argument("--model", default="paraphrase-distilroberta-base-v1")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--json", help="Write the summaries to this file")
+    args = parser.parse_args()
+    args.rounds = max(args.rounds, 1)
+
+    from lazy_models import sentence_model
+    model = sentence_model(args.model).get()
+    queries = load_queries(args.queries)
+    # Encoder warm-up outside the measurements
+    model.encode(queries[:4])
+
+    summaries = []
+    for size in args.sizes:
+        resorts = make_resorts(size, seed=size)
+        reference = None
+        for mode in MODES:
+            summary, results = run_mode(mode, resorts, queries, model, args)
+            if reference is None:
+                reference = results
+            summary["overlap"] = overlap(reference, results)
+            summaries.append(summary)
+
+    print(f"{'candidates':>10} {'mode':>9} {'encode calls':>12} {'query texts':>11} {'resort texts':>12} "
+          f"{'cold ms':>8} {'warm p50':>9} {'warm p95':>9} {'overlap':>8}")
+    for s in summaries:
+        warm_p50 = f"{s['warm_p50_ms']:>9.2f}" if s["warm_p50_ms"] is not None else f"{'-':>9}"
+        warm_p95 = f"{s['warm_p95_ms']:>9.2f}" if s["warm_p95_ms"] is not None else f"{'-':>9}"
+        print(f"{s['candidates']:>10} {s['mode']:>9} {s['encoder_calls']:>12} {s['query_texts']:>11} "
+              f"{s['resort_texts']:>12} {s['cold_ms']:>8.1f} {warm_p50} {warm_p95} {s['overlap']:>8.2f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summaries, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""
+Offline search benchmark
+Replays recorded Google Geocoding / Nearby Search / Place Details responses
+(benchmarks/cassettes) through a local server with injected latency, runs a
+query corpus through both SkiResortFinder implementations and reports
+p50/p95/p99 latency, throughput, Google API calls per query and peak RSS.
+No network access is needed.
+
+Usage:
+    python benchmarks/bench_search.py [--latency 0.05] [--jitter 0.02]
+    python benchmarks/bench_search.py --json results.json
+    python benchmarks/bench_search.py --baseline results.json   # exit 1 on regression
+    python benchmarks/bench_search.py --record [--upstream URL]  # re-record the cassette
+
+Each finder runs in its own process with empty caches, models loaded before
+timing starts, and the queries run one after another, so the numbers are
+cold-cache latencies and the peak RSS belongs to that finder alone.
+
+--record runs the corpus against --upstream and saves every response. With no
+--upstream it records from the synthetic fake_google server (this is how the
+checked-in cassette was made); pass https://maps.googleapis.com/maps/api and
+set GOOGLE_MAPS_API_KEY to record live Google responses instead.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "ski_resort_finder"))
+from cassette import Cassette, CassetteServer  # noqa: E402
+from fake_google import FakeGoogleServer  # noqa: E402
+from search_stats import track_search  # noqa: E402
+
+DEFAULT_CASSETTE = os.path.join(HERE, "cassettes", "new_england.json.gz")
+DEFAULT_QUERIES = os.path.join(HERE, "queries.txt")
+# Module name of each finder implementation
+FINDERS = ("ski_resort", "ski_resort_finder")
+ENDPOINTS = ("geocode", "place/nearbysearch", "place/details")
+# Metrics checked against --baseline; higher is worse for all of them
+REGRESSION_METRICS = ("p50_ms", "p95_ms", "calls_per_query")
+
+
+def load_queries(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def fresh_finder(module_name, model_name):
+    """A finder of the given implementation with empty caches in a new temp directory."""
+    from embedding_store import EmbeddingStore
+    from lazy_models import embedding_space
+    from places_cache import PlacesCache
+    from resort_catalog import ResortCatalog
+    from vector_index import VectorIndex
+
+    module = __import__(module_name)
+    directory = tempfile.mkdtemp(prefix="bench-search-")
+    finder = module.SkiResortFinder("bench-key", model_name=model_name,
+                                    cache=PlacesCache(os.path.join(directory, "places.sqlite3")))
+    finder.catalog = ResortCatalog(os.path.join(directory, "catalog.sqlite3"))
+    # Per backend, as in the finders: torch and ONNX int8 vectors must not mix
+    finder.embedding_store = EmbeddingStore(embedding_space(model_name), directory)
+    finder.vector_index = VectorIndex(embedding_space(model_name), directory)
+    return finder
+
+
+def worker(args):
+    """Run the corpus through one finder (in this process) and write its timings as JSON."""
+    os.environ["GOOGLE_MAPS_BASE_URL"] = args.base_url
+    finder = fresh_finder(args.worker, args.model)
+    finder.prewarm()
+
+    latencies, result_counts, duplicates = [], [], []
+    start = time.perf_counter()
+    for query in load_queries(args.queries):
+        query_start = time.perf_counter()
+        with track_search() as stats:
+            results = finder.find_best_ski_resorts(query)
+        latencies.append(time.perf_counter() - query_start)
+        result_counts.append(len(results or []))
+        duplicates.append(stats.get("duplicates.place_id") + stats.get("duplicates.merged"))
+    elapsed = time.perf_counter() - start
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "latencies": latencies,
+            "elapsed": elapsed,
+            "result_counts": result_counts,
+            "duplicates": duplicates,
+            # ru_maxrss is in KiB on Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }, f)
+
+
+def run_finder(name, server, args):
+    """Run one finder in a child process against server; returns its summary dict."""
+    server.reset_counts()
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        output = f.name
+    command = [sys.executable, os.path.abspath(__file__), "--worker", name, "--base-url", server.base_url,
+               "--queries", args.queries, "--model", args.model, "--output", output]
+    # Finder logging goes to a log file so the report stays readable
+    with open(args.log, "a") as log:
+        log.write(f"==== {name} ====\n")
+        log.flush()
+        subprocess.run(command, check=True, stdout=log, stderr=subprocess.STDOUT)
+    with open(output) as f:
+        data = json.load(f)
+    os.remove(output)
+
+    latencies_ms = np.array(data["latencies"]) * 1000
+    queries = len(latencies_ms)
+    calls = dict(server.calls)
+    return {
+        "finder": name,
+        "queries": queries,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "queries_per_sec": queries / data["elapsed"],
+        "calls_per_query": sum(calls.values()) / queries,
+        "calls": {endpoint: calls.get(endpoint, 0) / queries for endpoint in ENDPOINTS},
+        "empty_results": sum(1 for count in data["result_counts"] if not count),
+        "duplicates_per_query": sum(data["duplicates"]) / queries,
+        "peak_rss_mb": data["peak_rss_mb"],
+        "cassette_misses": getattr(server, "misses", 0),
+    }
+
+
+def print_report(summaries, args):
+    print(f"latency {args.latency * 1000:.0f}ms (+ up to {args.jitter * 1000:.0f}ms jitter) per Google request")
+    print(f"{'finder':>18} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/s':>6} {'calls/q':>8} "
+          f"{'geocode':>8} {'nearby':>7} {'details':>8} {'dups/q':>7} {'RSS MB':>7} {'misses':>7}")
+    for s in summaries:
+        print(f"{s['finder']:>18} {s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f} "
+              f"{s['queries_per_sec']:>6.2f} {s['calls_per_query']:>8.2f} {s['calls']['geocode']:>8.2f} "
+              f"{s['calls']['place/nearbysearch']:>7.2f} {s['calls']['place/details']:>8.2f} {s['duplicates_per_query']:>7.1f} "
+              f"{s['peak_rss_mb']:>7.0f} {s['cassette_misses']:>7}")
+        if s["cassette_misses"]:
+            print(f"Warning: {s['finder']} made {s['cassette_misses']} requests missing from the cassette; re-record it")
+
+
+def compare(summaries, baseline_path, tolerance):
+    """Names of metrics that regressed by more than tolerance against a --json baseline."""
+    with open(baseline_path) as f:
+        baseline = {s["finder"]: s for s in json.load(f)}
+    regressions = []
+    for s in summaries:
+        old = baseline.get(s["finder"])
+        if not old:
+            continue
+        for metric in REGRESSION_METRICS:
+            if old[metric] and s[metric] > old[metric] * (1 + tolerance):
+                regressions.append(f"{s['finder']} {metric}: {old[metric]:.2f} -> {s[metric]:.2f}")
+    return regressions
+
+
+def record(args):
+    cassette = Cassette(meta={"queries": os.path.basename(args.queries), "finders": list(args.finders)})
+    if args.upstream:
+        api_key = os.getenv("GOOGLE_MAPS_API_KEY") or os.getenv("GOOGLE_PLACES_API_KEY")
+        cassette.meta["source"] = args.upstream
+        with CassetteServer(cassette, upstream=args.upstream, api_key=api_key) as server:
+            for name in args.finders:
+                run_finder(name, server, args)
+    else:
+        cassette.meta["source"] = "fake_google"
+        with FakeGoogleServer(geocode_unknown=True) as fake:
+            with CassetteServer(cassette, upstream=fake.base_url) as server:
+                for name in args.finders:
+                    run_finder(name, server, args)
+    cassette.save(args.cassette)
+    print(f"Recorded {len(cassette)} responses to {args.cassette}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE)
+    parser.add_argument("--queries", default=DEFAULT_QUERIES, help="Query corpus, one per line")
+    parser.add_argument("--finders", nargs="+", choices=FINDERS, default=list(FINDERS))
+    parser.add_argument("--latency", type=float, default=0.05, help="Injected latency per Google request (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra uniform random latency per request (s)")
+    parser.add_argument("--model", default="paraphrase-distilroberta-base-v1")
+    parser.add_argument("--json", help="Write the summaries to this file")
+    parser.add_argument("--baseline", help="Summaries from an earlier --json run; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression against --baseline")
+    parser.add_argument("--log", default=os.path.join(tempfile.gettempdir(), "bench_search.log"),
+                        help="Where finder output goes")
+    parser.add_argument("--record", action="store_true", help="Re-record the cassette instead of benchmarking")
+    parser.add_argument("--upstream", help="API root to record from (default: the fake Google server)")
+    # Internal: run one finder in this process
+    parser.add_argument("--worker", choices=FINDERS, help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+    if args.record:
+        record(args)
+        return
+
+    cassette = Cassette.load(args.cassette)
+    with CassetteServer(cassette, latency=args.latency, jitter=args.jitter) as server:
+        summaries = [run_finder(name, server, args) for name in args.finders]
+    print_report(summaries, args)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summaries, f, indent=2)
+    if args.baseline:
+        regressions = compare(summaries, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,21 @@ Ski Resort Finder API
 Flask backend for serving ski resort search requests.
 This API interacts with the SkiResortFinder class to provide resort search functionality.
 """
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
+import hmac
 import os
+import sys
+import threading
 import traceback
 from ski_resort import SkiResortFinder
+from places_cache import get_default_cache
+from crawler import crawler_enabled, start_crawler
+from result_cache import ResultCache
+from metrics import PROMETHEUS_CONTENT_TYPE, render as render_metrics, server_timing, server_timing_enabled
+from search_stats import track_search
+from streaming import MIMETYPES, STREAM_HEADERS, render, search_events, stream_format
 
 # Load environment variables from .env file
 # This includes the GOOGLE_MAPS_API_KEY or GOOGLE_PLACES_API
@@ -32,22 +41,59 @@ CORS(app, resources={
     }
 })
 
-# Initialize SkiResortFinder with Google Maps API key
+# Google Maps API key
 # First try GOOGLE_MAPS_API_KEY, then fallback to GOOGLE_PLACES_API_KEY if needed
 api_key = os.getenv('GOOGLE_MAPS_API_KEY') or os.getenv('GOOGLE_PLACES_API_KEY')
 if not api_key:
     print("Warning: No Google Maps API key found in environment variables")
-    ski_finder = None
-else:
-    try:
-        # Create an instance of SkiResortFinder with the API key
-        ski_finder = SkiResortFinder(api_key)
-        print("SkiResortFinder initialized successfully")
-    except Exception as e:
-        # Handle initialization errors gracefully
-        print(f"Error initializing SkiResortFinder: {str(e)}")
-        print(traceback.format_exc())
-        ski_finder = None
+
+# SkiResortFinder is created on the first search rather than at import time,
+# so a cold start (and /api/test) never waits for the models to load
+_ski_finder = None
+_ski_finder_lock = threading.Lock()
+
+def get_ski_finder():
+    """
+    Return the shared SkiResortFinder, creating it on first use
+    Returns None if no API key is configured or initialization failed
+    """
+    global _ski_finder
+    if _ski_finder is None and api_key:
+        with _ski_finder_lock:
+            if _ski_finder is None:
+                try:
+                    # Create an instance of SkiResortFinder with the API key
+                    _ski_finder = SkiResortFinder(api_key)
+                    print("SkiResortFinder initialized successfully")
+                except Exception as e:
+                    # Handle initialization errors gracefully
+                    print(f"Error initializing SkiResortFinder: {str(e)}")
+                    print(traceback.format_exc())
+    return _ski_finder
+
+# Whole-query result cache with request coalescing
+# SKI_RESORT_SHARED_RESULT_CACHE=1 shares cached results between worker processes via SQLite
+result_cache = ResultCache(
+    namespace='ski_resort',
+    disk_cache=get_default_cache() if os.getenv('SKI_RESORT_SHARED_RESULT_CACHE', '').lower() in ('1', 'true', 'yes') else None,
+)
+
+# Upper bound on /api/search/batch request size
+DEFAULT_MAX_BATCH_QUERIES = 500
+try:
+    MAX_BATCH_QUERIES = int(os.getenv('SKI_RESORT_MAX_BATCH_QUERIES', DEFAULT_MAX_BATCH_QUERIES))
+except ValueError:
+    print(f"Warning: ignoring invalid SKI_RESORT_MAX_BATCH_QUERIES, using {DEFAULT_MAX_BATCH_QUERIES}")
+    MAX_BATCH_QUERIES = DEFAULT_MAX_BATCH_QUERIES
+
+# Set SKI_RESORT_PREWARM=1 to load the models in the background right after startup
+if api_key and os.getenv('SKI_RESORT_PREWARM', '').lower() in ('1', 'true', 'yes'):
+    threading.Thread(target=lambda: get_ski_finder() and _ski_finder.prewarm(), daemon=True).start()
+
+# Set SKI_RESORT_CRAWLER=1 to keep popular regions crawled in the background, so their searches
+# are answered from the catalog (see ski_resort_finder/crawler.py)
+if api_key and crawler_enabled():
+    threading.Thread(target=lambda: start_crawler(get_ski_finder()), daemon=True).start()
 
 @app.route('/test', methods=['GET'])
 def test_connection_legacy():
@@ -78,23 +124,24 @@ def test_connection():
         return jsonify({"error": "Internal server error"}), 500
 
 @app.route('/search', methods=['POST'])
-def search_resorts_legacy():
+async def search_resorts_legacy():
     """
     Legacy endpoint for searching ski resorts
     Maintained for backward compatibility with older frontend versions
     Simply forwards to the new /api/search endpoint
     """
-    return search_resorts()
+    return await search_resorts()
 
 @app.route('/api/search', methods=['POST'])
-def search_resorts():
+async def search_resorts():
     """
     Main endpoint for searching ski resorts based on user query
     Expects: JSON with a 'query' field containing the search text
     Returns: JSON array of ski resort objects or error message
     """
     try:
-        # Check if SkiResortFinder was properly initialized
+        # Check if SkiResortFinder can be initialized
+        ski_finder = get_ski_finder()
         if not ski_finder:
             return jsonify({"error": "Ski resort finder not initialized. Please check API key configuration."}), 500
 
@@ -108,18 +155,105 @@ def search_resorts():
             return jsonify({"error": "Query cannot be empty"}), 400
 
         # Perform the search using SkiResortFinder
-        results = ski_finder.find_best_ski_resorts(query)
+        with track_search() as stats:
+            results = await result_cache.get_or_compute_async(query, lambda: ski_finder.find_best_ski_resorts_async(query))
         if not results:
             return jsonify({"error": "No ski resorts found for the given query"}), 404
 
         # Return the search results
-        return jsonify(results)
+        response = jsonify(results)
+        if server_timing_enabled():
+            response.headers['Server-Timing'] = server_timing(stats)
+        return response
     except Exception as e:
         # Log the error for debugging
         print(f"Error processing request: {str(e)}")
         print(traceback.format_exc())
         return jsonify({"error": "An error occurred while processing your request"}), 500
 
+@app.route('/api/search/stream', methods=['GET', 'POST'])
+def search_resorts_stream():
+    """
+    Streaming search: NDJSON by default, Server-Sent Events with Accept: text/event-stream
+    Emits location, partial (unranked batches as they arrive) and final events
+    Accepts a JSON body with 'query', or ?query= for EventSource clients
+    """
+    ski_finder = get_ski_finder()
+    if not ski_finder:
+        return jsonify({"error": "Ski resort finder not initialized. Please check API key configuration."}), 500
+
+    data = request.get_json(silent=True) or {}
+    query = (data.get("query") or request.args.get("query") or "").strip()
+    if not query:
+        return jsonify({"error": "No query provided"}), 400
+
+    fmt = stream_format(request.headers.get("Accept"))
+    events = search_events(result_cache, query, lambda: ski_finder.stream_best_ski_resorts_async(query))
+    return Response(render(events, fmt), mimetype=MIMETYPES[fmt], headers=STREAM_HEADERS)
+
+@app.route('/api/search/batch', methods=['POST'])
+def search_resorts_batch():
+    """
+    Search many queries at once (e.g. nightly precomputation)
+    Expects: JSON with a 'queries' list of up to MAX_BATCH_QUERIES strings
+    Returns: JSON with one {query, resorts} entry per query, in order
+    """
+    try:
+        ski_finder = get_ski_finder()
+        if not ski_finder:
+            return jsonify({"error": "Ski resort finder not initialized. Please check API key configuration."}), 500
+
+        data = request.get_json(silent=True) or {}
+        queries = data.get("queries")
+        if not isinstance(queries, list) or not queries or not all(isinstance(query, str) and query.strip() for query in queries):
+            return jsonify({"error": "Expected a non-empty list of non-empty query strings"}), 400
+        if len(queries) > MAX_BATCH_QUERIES:
+            return jsonify({"error": f"At most {MAX_BATCH_QUERIES} queries per batch"}), 400
+
+        # Only queries missing from the result cache are searched
+        results = {query: result_cache.get(query) for query in queries}
+        pending = list(dict.fromkeys(query for query, cached in results.items() if not cached))
+        if pending:
+            for query, found in zip(pending, ski_finder.find_best_ski_resorts_batch(pending)):
+                result_cache.set(query, found)
+                results[query] = found
+        return jsonify({"results": [{"query": query, "resorts": results[query] or []} for query in queries]})
+    except Exception as e:
+        print(f"Error processing batch request: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({"error": "An error occurred while processing your request"}), 500
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus metrics for this worker process: search and stage durations,
+    results per search, and per-search counters (API calls, cache hits, cells)
+    """
+    return Response(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.route('/api/admin/stats', methods=['GET'])
+def admin_stats():
+    """
+    Cache and coalescing statistics for operators
+    Only served when SKI_RESORT_ADMIN_TOKEN is set, to requests sending it as X-Admin-Token
+    """
+    admin_token = os.getenv('SKI_RESORT_ADMIN_TOKEN')
+    if not admin_token:
+        # Off unless a token is configured: the stats expose cache, catalog and quota internals
+        return jsonify({"error": "Not found"}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), admin_token):
+        return jsonify({"error": "Forbidden"}), 403
+    stats = {"result_cache": result_cache.stats()}
+    # Only report on the finder if a search already created it
+    if _ski_finder:
+        stats["places_cache"] = _ski_finder.cache.stats()
+        stats["location_extractor"] = _ski_finder.location_extractor.stats()
+        if _ski_finder.query_embeddings is not None:
+            stats["query_embeddings"] = _ski_finder.query_embeddings.stats()
+        if _ski_finder.crawler:
+            stats["crawler"] = _ski_finder.crawler.stats()
+    return jsonify(stats)
+
 @app.errorhandler(404)
 def not_found_error(error):
     """
@@ -138,6 +272,11 @@ def internal_error(error):
 
 # Start the Flask server when this file is run directly
 if __name__ == '__main__':
+    if '--profile-startup' in sys.argv:
+        # Report import and model load times instead of serving
+        from startup_profile import profile_startup
+        profile_startup(__file__, app, get_ski_finder)
+        sys.exit(0)
     # Get the port from environment variable or use 5001 as default
     port = int(os.environ.get('PORT', 5001))
     print(f"Starting server on port {port}")
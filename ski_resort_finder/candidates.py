@@ -0,0 +1,104 @@
+"""
+Candidates
+Columnar batch of resort candidates for the ranking pipeline.
+
+The pipeline used to copy candidates dict by dict at every stage
+({**resort, "distance": d} in filter_by_distance, fresh lists in
+remove_duplicates, remove_invalid_resorts, get_top_matches and
+sort_resorts). A CandidateBatch leaves the parsed resort dicts alone and
+keeps the columns the pipeline actually reads (rating, coordinates,
+distance) as NumPy arrays. Filtering, de-duplication, top-k and sorting
+only narrow or reorder an array of row indices; dicts carrying a distance
+are built by records() for the final top-N only.
+
+Usage:
+    candidates = CandidateBatch.from_records(resorts)
+    candidates = candidates.within(lat, lng, 100).unique().rated()
+    top = candidates.take(best_positions).sorted_by_rating().records()
+"""
+import numpy as np
+
+try:
+    from .geo import coordinates, within_distance
+    from .dedup import unique_positions
+except ImportError:
+    from geo import coordinates, within_distance
+    from dedup import unique_positions
+
+
+class CandidateBatch:
+    """
+    A view (rows) over columnar resort data shared by every stage of one search.
+
+    Args:
+        sources: The resort dicts, never modified or copied
+        ratings, lats, lngs: float64 columns aligned with sources
+        distances: float64 column of distances in km (NaN until within() ran)
+        rows: Indices into sources of the candidates still in the batch, in order
+    """
+
+    __slots__ = ("sources", "ratings", "lats", "lngs", "distances", "rows")
+
+    def __init__(self, sources, ratings, lats, lngs, distances=None, rows=None):
+        self.sources = sources
+        self.ratings = ratings
+        self.lats = lats
+        self.lngs = lngs
+        self.distances = distances if distances is not None else np.full(len(sources), np.nan)
+        self.rows = rows if rows is not None else np.arange(len(sources))
+
+    @classmethod
+    def from_records(cls, resorts):
+        if not isinstance(resorts, list):
+            resorts = list(resorts)
+        # A missing rating counts as unrated, like the 0 default of the Nearby Search parsers
+        ratings = np.fromiter((resort.get("rating") or 0 for resort in resorts), dtype=np.float64, count=len(resorts))
+        lats, lngs = coordinates(resorts)
+        return cls(resorts, ratings, lats, lngs)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _view(self, rows, distances=None):
+        return CandidateBatch(self.sources, self.ratings, self.lats, self.lngs,
+                              self.distances if distances is None else distances, rows)
+
+    def within(self, lat, lng, max_distance_km, exact=False):
+        """Candidates within max_distance_km of (lat, lng), with their distances filled in."""
+        positions, distances = within_distance(
+            lat, lng, self.lats[self.rows], self.lngs[self.rows], max_distance_km, exact=exact
+        )
+        rows = self.rows[positions]
+        column = self.distances.copy()
+        column[rows] = distances
+        return self._view(rows, column)
+
+    def unique(self):
+        """Candidates left after merging duplicates (see dedup.unique_positions)."""
+        return self.take(unique_positions(
+            self.source_records(), self.lats[self.rows].tolist(), self.lngs[self.rows].tolist()
+        ))
+
+    def rated(self):
+        """Candidates with a rating above zero."""
+        return self._view(self.rows[self.ratings[self.rows] > 0])
+
+    def take(self, positions):
+        """Candidates at the given positions of this batch, in that order."""
+        return self._view(self.rows[np.asarray(positions, dtype=np.int64)])
+
+    def sorted_by_rating(self):
+        """Highest rating first, nearest first among equal ratings (stable)."""
+        order = np.lexsort((self.distances[self.rows], -self.ratings[self.rows]))
+        return self._view(self.rows[order])
+
+    def source_records(self):
+        """The candidates' original resort dicts (not copies), e.g. for embedding."""
+        sources = self.sources
+        return [sources[row] for row in self.rows.tolist()]
+
+    def records(self):
+        """Materialize the candidates as new resort dicts with their distance (NaN before within())."""
+        sources = self.sources
+        distances = self.distances
+        return [{**sources[row], "distance": float(distances[row])} for row in self.rows.tolist()]
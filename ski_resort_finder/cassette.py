@@ -0,0 +1,131 @@
+"""
+Cassettes
+Recorded Google Maps API responses, replayed offline (VCR-style).
+
+A cassette maps each request (endpoint plus parameters, keyed like the
+PlacesCache so the API key and float noise are ignored) to the JSON body
+Google returned. CassetteServer is a FakeGoogleServer that answers from a
+cassette instead of synthetic data, with the same latency injection and
+call counters; in record mode it forwards cache misses to an upstream API
+(live Google or a FakeGoogleServer) and keeps the responses.
+
+Next-page tokens are recorded verbatim, so a replayed search requests the
+same tokens it was given and pagination replays too.
+
+Usage:
+    cassette = Cassette.load("benchmarks/cassettes/new_england.json.gz")
+    with CassetteServer(cassette, latency=0.05) as server:
+        finder = SkiResortFinder("any-key")  # with GOOGLE_MAPS_BASE_URL=server.base_url
+"""
+import gzip
+import json
+import os
+import time
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+try:
+    from .fake_google import FakeGoogleServer
+    from .places_cache import make_cache_key
+except ImportError:
+    from fake_google import FakeGoogleServer
+    from places_cache import make_cache_key
+
+
+def _open(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class Cassette:
+    """Recorded responses keyed by make_cache_key(endpoint, params)."""
+
+    def __init__(self, interactions=None, meta=None):
+        self.interactions = interactions or {}
+        self.meta = meta or {}
+
+    @classmethod
+    def load(cls, path):
+        with _open(path, "r") as f:
+            data = json.load(f)
+        return cls(data.get("interactions"), data.get("meta"))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.meta["recorded_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        with _open(path, "w") as f:
+            # Sorted and compact so re-recordings diff (and compress) well
+            json.dump({"meta": self.meta, "interactions": self.interactions}, f, sort_keys=True, separators=(",", ":"))
+
+    def get(self, endpoint, params):
+        return self.interactions.get(make_cache_key(endpoint, params))
+
+    def put(self, endpoint, params, body):
+        self.interactions[make_cache_key(endpoint, params)] = body
+
+    def __len__(self):
+        return len(self.interactions)
+
+
+class CassetteServer(FakeGoogleServer):
+    """
+    Serve Google Maps endpoints from a Cassette.
+
+    Args:
+        cassette: Cassette to replay (and add to when recording)
+        upstream: API root to forward unrecorded requests to; None replays only.
+                  Requests missing from the cassette then get HTTP 404 and are
+                  counted in misses, so a stale cassette is noticed.
+        api_key: Key sent upstream when recording
+        latency, jitter, host, port: As for FakeGoogleServer
+    """
+
+    def __init__(self, cassette, upstream=None, api_key=None, latency=0.0, jitter=0.0, host="127.0.0.1", port=0):
+        super().__init__(places=[], latency=latency, jitter=jitter, host=host, port=port)
+        self.cassette = cassette
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.api_key = api_key
+        self.misses = 0
+        self.recorded = 0
+        self._session = requests.Session() if upstream else None
+
+    def handle(self, path):
+        parsed = urlparse(path)
+        params = {name: values[0] for name, values in parse_qs(parsed.query).items()}
+        endpoint = parsed.path.split("/maps/api/", 1)[-1].rsplit("/json", 1)[0]
+
+        body = self.cassette.get(endpoint, params)
+        if body is None and self.upstream:
+            # Recording: upstream latency is real, so none is injected
+            body = self._forward(endpoint, params)
+            with self._lock:
+                self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            return (200, body) if body is not None else (502, {"status": "UNKNOWN_ERROR"})
+
+        with self._lock:
+            self.requests_seen += 1
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            if body is None:
+                self.misses += 1
+        self.sleep()
+        if body is None:
+            return 404, {"status": "NOT_FOUND", "error_message": "Request not in cassette"}
+        return 200, body
+
+    def _forward(self, endpoint, params):
+        request_params = dict(params)
+        if self.api_key:
+            request_params["key"] = self.api_key
+        response = self._session.get(f"{self.upstream}/{endpoint}/json", params=request_params, timeout=(3.05, 30))
+        if response.status_code != 200:
+            print(f"Warning: upstream {endpoint} returned HTTP {response.status_code}")
+            return None
+        body = response.json()
+        # Quota errors are transient; keep them out of the cassette
+        if body.get("status") not in ("OVER_QUERY_LIMIT", "UNKNOWN_ERROR", "REQUEST_DENIED"):
+            with self._lock:
+                self.cassette.put(endpoint, params, body)
+                self.recorded += 1
+        return body
@@ -0,0 +1,317 @@
+"""
+Coverage Planner
+Adaptive set of Nearby Search circles covering the search disk.
+
+Instead of a fixed square grid of heavily overlapping circles, the planner
+places circles on a hexagonal lattice and keeps only those whose lattice
+cell touches the max_distance_km disk, which is the minimal lattice cover
+(7 circles of 50 km for a 100 km disk, versus a 5x5 or 3x3 grid). Cells that
+came back empty are remembered in the PlacesCache and skipped next time, and
+only cells that hit the 60-result Nearby Search cap are subdivided into
+smaller circles.
+"""
+import math
+
+try:
+    from . import search_stats
+    from .dedup import SeenPlaces
+except ImportError:
+    import search_stats
+    from dedup import SeenPlaces
+
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LNG_EQUATOR = 111.320
+# Nearby Search never returns more than 3 pages of 20 results
+MAX_NEARBY_RESULTS = 60
+EMPTY_CELL_ENDPOINT = "coverage/empty"
+EMPTY_CELL_TTL = 30 * 24 * 3600
+
+
+class Cell:
+    """One Nearby Search circle."""
+
+    __slots__ = ("lat", "lng", "radius_km", "depth")
+
+    def __init__(self, lat, lng, radius_km, depth=0):
+        self.lat = lat
+        self.lng = lng
+        self.radius_km = radius_km
+        self.depth = depth
+
+    def __repr__(self):
+        return f"Cell({self.lat:.4f}, {self.lng:.4f}, r={self.radius_km:g}km, depth={self.depth})"
+
+
+def offset_to_lat_lng(center_lat, center_lng, x_km, y_km):
+    """Move x_km east and y_km north from a point (equirectangular approximation)."""
+    lat = center_lat + y_km / KM_PER_DEG_LAT
+    lng = center_lng + x_km / (KM_PER_DEG_LNG_EQUATOR * abs(math.cos(math.radians(center_lat))))
+    return lat, lng
+
+
+def _segment_distance(px, py, ax, ay, bx, by):
+    dx, dy = bx - ax, by - ay
+    t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def _hexagon_distance(x, y, radius):
+    """Distance from the origin to the lattice hexagon centred at (x, y) with circumradius radius."""
+    vertices = [
+        (x + radius * math.cos(math.radians(30 + 60 * k)), y + radius * math.sin(math.radians(30 + 60 * k)))
+        for k in range(6)
+    ]
+    edges = list(zip(vertices, vertices[1:] + vertices[:1]))
+    # Inside a convex polygon every edge sees the origin on the same side
+    crosses = [(bx - ax) * (0 - ay) - (by - ay) * (0 - ax) for (ax, ay), (bx, by) in edges]
+    if all(c >= 0 for c in crosses) or all(c <= 0 for c in crosses):
+        return 0.0
+    return min(_segment_distance(0.0, 0.0, ax, ay, bx, by) for (ax, ay), (bx, by) in edges)
+
+
+def cover_disk(disk_radius_km, circle_radius_km):
+    """
+    (x, y) offsets in km of circles of circle_radius_km that cover a disk of disk_radius_km.
+    Circles sit on a hexagonal lattice whose Voronoi cells are inscribed in them,
+    so the union of circles covers every lattice cell that touches the disk.
+    """
+    if disk_radius_km <= circle_radius_km:
+        return [(0.0, 0.0)]
+    spacing = math.sqrt(3) * circle_radius_km
+    row_height = spacing * math.sqrt(3) / 2
+    rows = int(math.ceil((disk_radius_km + circle_radius_km) / row_height)) + 1
+    offsets = []
+    for j in range(-rows, rows + 1):
+        for i in range(-rows - abs(j), rows + abs(j) + 1):
+            x = spacing * (i + j / 2.0)
+            y = row_height * j
+            if _hexagon_distance(x, y, circle_radius_km) < disk_radius_km - 1e-6:
+                offsets.append((x, y))
+    return offsets
+
+
+def _local_offset(anchor_lat, anchor_lng, lat, lng):
+    """Inverse of offset_to_lat_lng: km east and north of the anchor."""
+    x = (lng - anchor_lng) * KM_PER_DEG_LNG_EQUATOR * abs(math.cos(math.radians(anchor_lat)))
+    y = (lat - anchor_lat) * KM_PER_DEG_LAT
+    return x, y
+
+
+def lattice_cells(cx, cy, disk_radius_km, circle_radius_km):
+    """
+    Lattice indices (i, j) and offsets (x, y) of the circles, on a hexagonal lattice
+    anchored at the origin, that cover a disk centred at (cx, cy). Unlike cover_disk
+    the lattice does not move with the disk, so nearby disks share circles.
+    """
+    spacing = math.sqrt(3) * circle_radius_km
+    row_height = spacing * math.sqrt(3) / 2
+    reach = disk_radius_km + circle_radius_km
+    cells = []
+    for j in range(int(math.floor((cy - reach) / row_height)), int(math.ceil((cy + reach) / row_height)) + 1):
+        y = row_height * j
+        i_min = int(math.floor((cx - reach) / spacing - j / 2.0))
+        i_max = int(math.ceil((cx + reach) / spacing - j / 2.0))
+        for i in range(i_min, i_max + 1):
+            x = spacing * (i + j / 2.0)
+            if _hexagon_distance(x - cx, y - cy, circle_radius_km) < disk_radius_km - 1e-6:
+                cells.append(((i, j), (x, y)))
+    return cells
+
+
+class CoveragePlanner:
+    """
+    Plans and runs the Nearby Search cells for a search.
+
+    Args:
+        cache: PlacesCache used to remember cells that returned nothing
+        search_radius_km: Radius of a top-level Nearby Search circle
+        max_depth: How many times a saturated cell may be subdivided
+        baseline_cells: Cell count of the fixed grid this replaces, for reporting savings
+        keyword: keyword() -> the Nearby Search keyword the cells are searched with; a cell
+                 empty for one keyword may not be for another
+    """
+
+    def __init__(self, cache, search_radius_km=50, max_depth=1, baseline_cells=9, keyword=None):
+        self.cache = cache
+        self.search_radius_km = search_radius_km
+        self.max_depth = max_depth
+        self.baseline_cells = baseline_cells
+        self.keyword = keyword
+
+    def _empty_key(self, cell):
+        # Two decimals (~1 km) is far below the size of any cell
+        return {
+            "location": f"{cell.lat:.2f},{cell.lng:.2f}",
+            "radius": int(cell.radius_km * 1000),
+            "keyword": self.keyword() if self.keyword else "",
+        }
+
+    def is_known_empty(self, cell):
+        # contains(), not get(): probing the memo is not a Places response cache hit or miss
+        return self.cache.contains(EMPTY_CELL_ENDPOINT, self._empty_key(cell))
+
+    def mark_empty(self, cell):
+        self.cache.set(EMPTY_CELL_ENDPOINT, self._empty_key(cell), {"status": "OK"}, ttl=EMPTY_CELL_TTL)
+
+    def _cells_for(self, center_lat, center_lng, disk_radius_km, circle_radius_km, depth,
+                   query_lat, query_lng, max_distance_km):
+        cells = []
+        for x, y in cover_disk(disk_radius_km, circle_radius_km):
+            lat, lng = offset_to_lat_lng(center_lat, center_lng, x, y)
+            if depth:
+                # Children only matter where they overlap the query disk
+                qx = (lng - query_lng) * KM_PER_DEG_LNG_EQUATOR * abs(math.cos(math.radians(query_lat)))
+                qy = (lat - query_lat) * KM_PER_DEG_LAT
+                if math.hypot(qx, qy) - circle_radius_km >= max_distance_km:
+                    continue
+            cells.append(Cell(lat, lng, circle_radius_km, depth))
+        return cells
+
+    def plan(self, center_lat, center_lng, max_distance_km):
+        """Top-level cells covering the max_distance_km disk, minus cells known to be empty."""
+        cells = self._cells_for(center_lat, center_lng, max_distance_km, self.search_radius_km, 0,
+                                center_lat, center_lng, max_distance_km)
+        planned = [cell for cell in cells if not self.is_known_empty(cell)]
+        search_stats.incr("cells_planned", len(cells))
+        search_stats.incr("cells_skipped_empty", len(cells) - len(planned))
+        return planned
+
+    def subdivide(self, cell, center_lat, center_lng, max_distance_km):
+        """Half-radius children covering a saturated cell."""
+        return self._cells_for(cell.lat, cell.lng, cell.radius_km, cell.radius_km / 2, cell.depth + 1,
+                               center_lat, center_lng, max_distance_km)
+
+    def _after_round(self, cells, fetched, center_lat, center_lng, max_distance_km, resorts):
+        next_round = []
+        failed = 0
+        for cell, (cell_resorts, raw_count, incomplete) in zip(cells, fetched):
+            resorts.extend(cell_resorts)
+            if raw_count is None or incomplete:
+                failed += 1
+            elif raw_count == 0:
+                self.mark_empty(cell)
+            elif raw_count >= MAX_NEARBY_RESULTS and cell.depth < self.max_depth:
+                search_stats.incr("cells_subdivided")
+                next_round.extend(self.subdivide(cell, center_lat, center_lng, max_distance_km))
+        search_stats.incr("cells_queried", len(cells))
+        search_stats.incr("cells_failed", failed)
+        return next_round, failed
+
+    def _report(self):
+        stats = search_stats.current_stats()
+        if stats is None:
+            return
+        # Each fixed-grid cell costs at least one Nearby Search call
+        saved = self.baseline_cells - stats.get("cells_queried")
+        stats.incr("api_calls_saved", saved)
+        print(f"Coverage: {stats.get('cells_queried')} cells queried "
+              f"({stats.get('cells_skipped_empty')} skipped empty, {stats.get('cells_subdivided')} subdivided), "
+              f"{saved} Nearby Search calls saved vs fixed {self.baseline_cells}-cell grid")
+
+    def search(self, center_lat, center_lng, max_distance_km, fetch_cells, on_complete=None):
+        """
+        Run the adaptive search. fetch_cells(cells) must return one
+        (resorts, raw_result_count, incomplete) triple per cell, in order, with a
+        None count for cells whose request failed and incomplete set for cells
+        whose later pages failed. on_complete() is called only if every cell
+        was searched completely.
+        """
+        resorts = []
+        failed = 0
+        cells = self.plan(center_lat, center_lng, max_distance_km)
+        while cells:
+            fetched = fetch_cells(cells)
+            cells, round_failed = self._after_round(cells, fetched, center_lat, center_lng, max_distance_km, resorts)
+            failed += round_failed
+        self._report()
+        if on_complete and not failed:
+            on_complete()
+        return resorts
+
+    async def search_async(self, center_lat, center_lng, max_distance_km, fetch_cells_async, on_complete=None):
+        """search() with an awaitable fetch_cells_async(cells)."""
+        resorts = []
+        failed = 0
+        cells = self.plan(center_lat, center_lng, max_distance_km)
+        while cells:
+            fetched = await fetch_cells_async(cells)
+            cells, round_failed = self._after_round(cells, fetched, center_lat, center_lng, max_distance_km, resorts)
+            failed += round_failed
+        self._report()
+        if on_complete and not failed:
+            on_complete()
+        return resorts
+
+    def _group_centers(self, centers, group_radius_km):
+        """Greedily group centers around anchors no more than group_radius_km away."""
+        groups = []
+        for index, (lat, lng) in enumerate(centers):
+            for anchor, members in groups:
+                if math.hypot(*_local_offset(anchor[0], anchor[1], lat, lng)) <= group_radius_km:
+                    members.append(index)
+                    break
+            else:
+                groups.append(((lat, lng), [index]))
+        return groups
+
+    def plan_batch(self, centers, max_distance_km):
+        """
+        Top-level cells covering several search disks at once. Nearby centers share
+        one lattice, so a cell needed by several of them is planned once.
+        Returns (cells, owners) where owners[k] is the set of center indices cell k serves.
+        """
+        # Keep each lattice local: equirectangular offsets drift far from the anchor
+        group_radius_km = 4 * max_distance_km
+        cells, owners = [], []
+        for anchor, members in self._group_centers(centers, group_radius_km):
+            lattice = {}
+            for index in members:
+                cx, cy = _local_offset(anchor[0], anchor[1], *centers[index])
+                # Margin for that drift, growing with the distance from the anchor
+                disk_radius_km = max_distance_km + 0.02 * math.hypot(cx, cy)
+                for key, (x, y) in lattice_cells(cx, cy, disk_radius_km, self.search_radius_km):
+                    if key not in lattice:
+                        lat, lng = offset_to_lat_lng(anchor[0], anchor[1], x, y)
+                        lattice[key] = (Cell(lat, lng, self.search_radius_km), set())
+                    lattice[key][1].add(index)
+            for cell, owner in lattice.values():
+                cells.append(cell)
+                owners.append(owner)
+        planned = [k for k, cell in enumerate(cells) if not self.is_known_empty(cell)]
+        search_stats.incr("cells_planned", len(cells))
+        search_stats.incr("cells_skipped_empty", len(cells) - len(planned))
+        return [cells[k] for k in planned], [owners[k] for k in planned]
+
+    def search_batch(self, centers, max_distance_km, fetch_cells):
+        """
+        search() for many centers sharing their cells. Returns one resort list per
+        center and, per center, whether every cell it needed was searched successfully.
+        """
+        results = [[] for _ in centers]
+        # Cells are fetched independently, so overlapping ones repeat places; keep one per center
+        seen = [SeenPlaces() for _ in centers]
+        failed = set()
+        cells, owners = self.plan_batch(centers, max_distance_km)
+        while cells:
+            fetched = fetch_cells(cells)
+            next_cells, next_owners = [], []
+            for cell, owner, (cell_resorts, raw_count, incomplete) in zip(cells, owners, fetched):
+                for index in owner:
+                    results[index].extend(resort for resort in cell_resorts if seen[index].claim(resort.get("place_id")))
+                if raw_count is None or incomplete:
+                    failed |= owner
+                elif raw_count == 0:
+                    self.mark_empty(cell)
+                elif raw_count >= MAX_NEARBY_RESULTS and cell.depth < self.max_depth:
+                    search_stats.incr("cells_subdivided")
+                    children = self.subdivide(cell, cell.lat, cell.lng, cell.radius_km)
+                    next_cells.extend(children)
+                    next_owners.extend([owner] * len(children))
+            search_stats.incr("cells_queried", len(cells))
+            search_stats.incr("cells_failed", sum(1 for _, count, incomplete in fetched if count is None or incomplete))
+            cells, owners = next_cells, next_owners
+        stats = search_stats.current_stats()
+        if stats is not None:
+            print(f"Batch coverage: {stats.get('cells_queried')} cells queried for {len(centers)} centers "
+                  f"({stats.get('cells_skipped_empty')} skipped empty, {stats.get('cells_subdivided')} subdivided)")
+        return results, [index not in failed for index in range(len(centers))]
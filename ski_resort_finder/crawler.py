@@ -0,0 +1,358 @@
+"""
+Region Crawler
+Background pre-crawling and stale-while-revalidate refresh of the resort catalog.
+
+A search whose region is not in the catalog waits for a whole adaptive
+grid search against Google. The RegionCrawler keeps a list of regions
+crawled ahead of time, so searches there are answered from the catalog:
+
+- the regions are the known resort states (or SKI_RESORT_CRAWL_REGIONS)
+  plus the most searched centres recorded by the catalog;
+- a region is crawled again once its coverage is older than refresh_after
+  (by default three quarters of the catalog's max_age), before it expires;
+- a search that finds its region expired but younger than stale_max_age
+  is answered from the catalog anyway and the region is queued for
+  revalidation ahead of the scheduled crawls (see catalog_resorts in the
+  finders);
+- crawls run as BATCH searches, so the rate limiter serves interactive
+  searches first, each crawl has its own Google call budget, and the
+  crawler sleeps after each crawl so its calls average at most qps per
+  second. After a failed crawl (usually quota) it backs off.
+
+Crawls are claimed with a lease in the catalog, so with several worker
+processes each region is crawled by one of them.
+
+Configuration:
+    SKI_RESORT_CRAWLER=1               start the crawler with the app
+    SKI_RESORT_CRAWL_REGIONS="vermont;Denver, CO;39.6,-106.0"
+                                       place names or lat,lng pairs, separated by ';'
+    SKI_RESORT_CRAWL_POPULAR=20        most searched centres to crawl as well (0 = none)
+    SKI_RESORT_CRAWL_QPS=1             average Google calls per second
+    SKI_RESORT_STALE_MAX_AGE=2592000   longest an expired region is still served (seconds)
+
+Usage:
+    python crawler.py            # crawl every due region once and exit (e.g. from cron)
+    python crawler.py --status   # show each region's coverage age
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+
+try:
+    from . import search_stats
+    from .search_stats import track_search
+except ImportError:
+    import search_stats
+    from search_stats import track_search
+
+# Share of the catalog's max_age after which a crawled region is refreshed
+REFRESH_FRACTION = 0.75
+DEFAULT_STALE_MAX_AGE = 30 * 24 * 3600
+DEFAULT_POPULAR_REGIONS = 20
+# Only centres searched this recently count as popular
+POPULAR_WINDOW = 30 * 24 * 3600
+DEFAULT_CRAWL_QPS = 1.0
+# Google calls one region crawl may make
+DEFAULT_REGION_BUDGET = 300
+# Seconds between checks for regions due for a refresh
+DEFAULT_INTERVAL = 600
+FAILURE_BACKOFF = 60
+# How long a process holds a region while crawling it
+LEASE_SECONDS = 600
+
+_COORDINATES = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$")
+
+
+def _env_flag(name):
+    return os.getenv(name, "").lower() in ("1", "true", "yes")
+
+
+def crawler_enabled():
+    return _env_flag("SKI_RESORT_CRAWLER")
+
+
+def _env_number(name, default, parse=float):
+    """parse(os.getenv(name)), or default with a warning if it is malformed."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    try:
+        return parse(value)
+    except ValueError:
+        print(f"Warning: ignoring invalid {name} {value!r}, using {default}")
+        return default
+
+
+def parse_regions(value):
+    """'vermont;Denver, CO;39.6,-106.0' -> ['vermont', 'Denver, CO', (39.6, -106.0)]; None if unset."""
+    if not value:
+        return None
+    regions = []
+    for entry in value.split(";"):
+        entry = entry.strip()
+        if not entry:
+            continue
+        match = _COORDINATES.match(entry)
+        regions.append((float(match.group(1)), float(match.group(2))) if match else entry)
+    return regions
+
+
+def _region_key(lat, lng):
+    return f"{lat:.2f},{lng:.2f}"
+
+
+class RegionCrawler:
+    """
+    Keeps a finder's catalog crawled for a list of regions in a daemon thread.
+
+    Args:
+        finder: SkiResortFinder whose grid search and catalog are used
+        regions: Place names and/or (lat, lng) pairs; defaults to the finder's known resort states, if any
+        popular: How many of the most searched centres to crawl as well
+        refresh_after: Coverage age in seconds at which a region is crawled again
+        stale_max_age: Longest an expired region is still served while it is revalidated
+        qps: Average Google calls per second the crawler may make
+        region_budget: Google calls one region crawl may make
+        interval: Seconds between checks for due regions
+    """
+
+    def __init__(self, finder, regions=None, popular=DEFAULT_POPULAR_REGIONS, refresh_after=None,
+                 stale_max_age=DEFAULT_STALE_MAX_AGE, qps=DEFAULT_CRAWL_QPS,
+                 region_budget=DEFAULT_REGION_BUDGET, interval=DEFAULT_INTERVAL):
+        self.finder = finder
+        self.catalog = finder.catalog
+        self.regions = list(regions) if regions is not None else list(getattr(finder, "known_resorts", {}))
+        self.popular = popular
+        self.refresh_after = refresh_after or self.catalog.max_age * REFRESH_FRACTION
+        self.stale_max_age = stale_max_age
+        self.qps = qps
+        self.region_budget = region_budget
+        self.interval = interval
+        self._geocoded = {}
+        self._pending = deque()
+        self._queued = set()
+        self._next_check = 0.0
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self._counters = {"crawled": 0, "failed": 0, "skipped": 0, "revalidations": 0, "google_calls": 0}
+        self.last_crawl = None
+
+    @classmethod
+    def from_env(cls, finder):
+        """A crawler configured from the SKI_RESORT_CRAWL_* variables (see the module docstring)."""
+        return cls(
+            finder,
+            regions=parse_regions(os.getenv("SKI_RESORT_CRAWL_REGIONS")),
+            popular=_env_number("SKI_RESORT_CRAWL_POPULAR", DEFAULT_POPULAR_REGIONS, int),
+            qps=_env_number("SKI_RESORT_CRAWL_QPS", DEFAULT_CRAWL_QPS),
+            stale_max_age=_env_number("SKI_RESORT_STALE_MAX_AGE", DEFAULT_STALE_MAX_AGE),
+        )
+
+    def _count(self, name, amount=1):
+        with self._cond:
+            self._counters[name] += amount
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._counters)
+            stats["pending"] = len(self._pending)
+        stats["regions"] = len(self.regions)
+        stats["last_crawl"] = self.last_crawl
+        return stats
+
+    def region_centers(self):
+        """(lat, lng) of every configured region (place names geocoded once) and of the popular centres."""
+        centers = []
+        for region in self.regions:
+            if isinstance(region, str):
+                if region not in self._geocoded:
+                    # Geocoding counts against the quota like any other batch call
+                    with track_search(priority=search_stats.BATCH):
+                        lat, lng = self.finder.get_lat_lng_from_location(region)
+                    if lat is None or lng is None:
+                        print(f"Warning: could not geocode crawl region {region!r}")
+                        continue
+                    self._geocoded[region] = (lat, lng)
+                region = self._geocoded[region]
+            centers.append(tuple(region))
+        if self.popular:
+            centers.extend(self.catalog.popular_regions(self.popular, since=time.time() - POPULAR_WINDOW))
+        # A popular centre may be a configured region too
+        distinct = {}
+        for lat, lng in centers:
+            distinct.setdefault(_region_key(lat, lng), (lat, lng))
+        return list(distinct.values())
+
+    def due_regions(self):
+        """Region centres never crawled or due for a refresh, uncovered and oldest first."""
+        due = []
+        for lat, lng in self.region_centers():
+            age = self.coverage_age(lat, lng)
+            if age is None or age >= self.refresh_after:
+                due.append((float("inf") if age is None else age, lat, lng))
+        return [(lat, lng) for _, lat, lng in sorted(due, reverse=True)]
+
+    def serves_stale(self, age):
+        """True if a region whose coverage is age seconds old may still be served while it is revalidated."""
+        return age is not None and age <= self.stale_max_age
+
+    def revalidate(self, lat, lng):
+        """Queue an expired region a search was just answered with, ahead of the scheduled crawls."""
+        with self._cond:
+            key = _region_key(lat, lng)
+            if key in self._queued:
+                return
+            self._queued.add(key)
+            self._pending.appendleft((lat, lng))
+            self._counters["revalidations"] += 1
+            self._cond.notify()
+
+    def _enqueue(self, lat, lng):
+        with self._cond:
+            key = _region_key(lat, lng)
+            if key not in self._queued:
+                self._queued.add(key)
+                self._pending.append((lat, lng))
+
+    def coverage_age(self, lat, lng):
+        """Age of the finder's catalog coverage of the region, or None if it was never covered."""
+        return self.catalog.coverage_age(lat, lng, self.finder.max_distance_km, keyword=self.finder.nearby_keyword)
+
+    def crawl(self, lat, lng):
+        """
+        Run the grid search for one region unless another process is already crawling it
+        or it was refreshed meanwhile. Returns (complete, Google calls made); complete is
+        None if the region was skipped.
+        """
+        age = self.coverage_age(lat, lng)
+        lease = f"crawl:{_region_key(lat, lng)}"
+        if (age is not None and age < self.refresh_after) or not self.catalog.try_lease(lease, LEASE_SECONDS):
+            self._count("skipped")
+            return None, 0
+        started = time.time()
+        try:
+            # Batch priority: the rate limiter lets interactive searches go first
+            with track_search(budget=self.region_budget, priority=search_stats.BATCH) as stats:
+                resorts = self.finder.get_ski_resorts_grid_search(lat, lng)
+        finally:
+            self.catalog.release_lease(lease)
+        self._count("google_calls", stats.spent)
+        # The grid search only records coverage when every cell was searched
+        age = self.coverage_age(lat, lng)
+        if age is None or age > time.time() - started:
+            self._count("failed")
+            print(f"Warning: crawl of ({lat:.4f}, {lng:.4f}) was incomplete; will retry")
+            return False, stats.spent
+        self._count("crawled")
+        self.last_crawl = time.time()
+        print(f"Crawled ({lat:.4f}, {lng:.4f}): {len(resorts)} resorts, {stats.spent} Google calls")
+        return True, stats.spent
+
+    def _pause(self, complete, calls):
+        """Seconds to wait after a crawl: the quota share its calls used, or a back-off after a failure."""
+        if complete is False:
+            # Usually the quota or the rate limiter; give Google (and interactive searches) room
+            return FAILURE_BACKOFF
+        return calls / self.qps if self.qps else 0
+
+    def run_once(self):
+        """Crawl every due region now, in this thread; returns how many were crawled."""
+        crawled = 0
+        for lat, lng in self.due_regions():
+            complete, calls = self.crawl(lat, lng)
+            crawled += bool(complete)
+            if complete is not None:
+                time.sleep(self._pause(complete, calls))
+        return crawled
+
+    def _next(self):
+        """The next region to crawl, or None when it is time to look for due regions (or to stop)."""
+        with self._cond:
+            while not self._pending and not self._stopping:
+                wait = self._next_check - time.monotonic()
+                if wait <= 0:
+                    return None
+                self._cond.wait(wait)
+            if self._stopping:
+                return None
+            lat, lng = self._pending.popleft()
+            self._queued.discard(_region_key(lat, lng))
+            return lat, lng
+
+    def _sleep(self, seconds):
+        with self._cond:
+            if not self._stopping:
+                self._cond.wait_for(lambda: self._stopping, timeout=seconds)
+
+    def _run(self):
+        while not self._stopping:
+            region = self._next()
+            if self._stopping:
+                break
+            try:
+                if region is None:
+                    self._next_check = time.monotonic() + self.interval
+                    for lat, lng in self.due_regions():
+                        self._enqueue(lat, lng)
+                    continue
+                complete, calls = self.crawl(*region)
+            except Exception as e:
+                print(f"Error in crawler: {str(e)}")
+                complete, calls = False, 0
+            if complete is not None:
+                self._sleep(self._pause(complete, calls))
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="region-crawler", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+
+def start_crawler(finder):
+    """Attach a RegionCrawler configured from the environment to finder and start it."""
+    if finder is None:
+        return None
+    if getattr(finder, "crawler", None) is None:
+        finder.crawler = RegionCrawler.from_env(finder).start()
+        print(f"Region crawler started for {len(finder.crawler.regions)} regions")
+    return finder.crawler
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from dotenv import load_dotenv
+    from ski_resort import SkiResortFinder
+
+    parser = argparse.ArgumentParser(description="Crawl the configured regions into the resort catalog")
+    parser.add_argument("--status", action="store_true", help="Show each region's coverage age and exit")
+    args = parser.parse_args()
+
+    load_dotenv()
+    api_key = os.getenv("GOOGLE_MAPS_API_KEY") or os.getenv("GOOGLE_PLACES_API_KEY")
+    if not api_key:
+        raise SystemExit("Error: GOOGLE_MAPS_API_KEY is not set")
+    crawler = RegionCrawler.from_env(SkiResortFinder(api_key))
+    if args.status:
+        for lat, lng in crawler.region_centers():
+            age = crawler.coverage_age(lat, lng)
+            state = "never crawled" if age is None else f"{age / 3600:.1f}h old"
+            print(f"({lat:.4f}, {lng:.4f}): {state}{' (due)' if age is None or age >= crawler.refresh_after else ''}")
+    else:
+        start = time.time()
+        crawled = crawler.run_once()
+        print(f"Crawled {crawled} regions in {time.time() - start:.1f}s")
@@ -0,0 +1,148 @@
+"""
+Dedup
+Duplicate elimination for resort candidates.
+
+Two layers:
+- SeenPlaces is one thread-safe set of place_ids shared by every coverage
+  cell (and page) of a search, so a place returned by several overlapping
+  cells is parsed once and never reaches ranking, embedding or Place Details
+  twice.
+- unique_positions() merges near-duplicates in one hashed pass: places whose
+  normalized names match and that share an address or lie within
+  MERGE_RADIUS_KM of each other, and hard-coded known resorts, which carry
+  the state's coordinates and a synthetic address, matched to a Google
+  place by name alone. The Google place is kept, since it has real
+  coordinates, rating and details.
+
+Eliminated duplicates are counted on the current search as
+"duplicates.place_id" and "duplicates.merged".
+"""
+import functools
+import math
+import re
+import threading
+
+try:
+    from . import search_stats
+except ImportError:
+    import search_stats
+
+# Two places with the same normalized name closer than this are one resort
+MERGE_RADIUS_KM = 3.0
+KM_PER_DEG_LAT = 111.32
+
+# Words that do not tell resorts apart ("Killington Ski Resort" == "Killington Resort")
+NAME_STOPWORDS = {"the", "ski", "skiing", "area", "resort", "resorts", "and", "at", "of"}
+NAME_ALIASES = {"mt": "mount", "mtn": "mountain"}
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+@functools.lru_cache(maxsize=65536)
+def name_key(name):
+    """Normalized resort name for duplicate matching, e.g. 'Mt. Snow Ski Resort' -> 'mount snow'."""
+    words = _NON_ALNUM.sub(" ", (name or "").lower()).split()
+    return " ".join(NAME_ALIASES.get(word, word) for word in words if word not in NAME_STOPWORDS)
+
+
+class SeenPlaces:
+    """Thread-safe set of place_ids claimed by the cells of one search."""
+
+    def __init__(self):
+        self._ids = set()
+        self._lock = threading.Lock()
+
+    def claim(self, place_id):
+        """True the first time a place_id is claimed; repeats are counted as duplicates."""
+        if not place_id:
+            return True
+        with self._lock:
+            if place_id in self._ids:
+                duplicate = True
+            else:
+                self._ids.add(place_id)
+                duplicate = False
+        if duplicate:
+            search_stats.incr("duplicates.place_id")
+        return not duplicate
+
+    def __contains__(self, place_id):
+        with self._lock:
+            return place_id in self._ids
+
+    def __len__(self):
+        with self._lock:
+            return len(self._ids)
+
+
+def _distance_km(lat1, lng1, lat2, lng2):
+    # Equirectangular is exact enough at a few km
+    x = (lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    return math.hypot(x, lat2 - lat1) * KM_PER_DEG_LAT
+
+
+def unique_positions(resorts, lats, lngs, radius_km=MERGE_RADIUS_KM):
+    """
+    Positions of the resorts left after merging duplicates, in first-seen order.
+
+    Resorts are hashed by normalized name; a place only has to be compared with
+    the few earlier places sharing its name, so the pass is O(n) in practice.
+
+    Args:
+        resorts: Resort dicts (name, address, place_id, rating)
+        lats, lngs: Their coordinates, aligned with resorts (NaN if unknown)
+        radius_km: Largest distance between two places merged by name
+    """
+    kept = []        # position kept for each slot
+    by_name = {}     # name key -> slots of the resorts with that name
+    synthetic = {}   # name key -> slot of a known resort no Google place has replaced yet
+    for position, resort in enumerate(resorts):
+        name = resort.get("name") or ""
+        key = name_key(name) or name.lower()
+        address = (resort.get("address") or "").lower()
+        lat, lng = lats[position], lngs[position]
+        located = bool(resort.get("place_id")) and lat == lat and lng == lng
+
+        slots = by_name.get(key)
+        if slots is None:
+            by_name[key] = [len(kept)]
+            if not located:
+                synthetic[key] = len(kept)
+            kept.append(position)
+            continue
+
+        if not located:
+            # A known resort's coordinates are the state's; its name is all there is to match
+            continue
+        duplicate = False
+        for slot in slots:
+            other = kept[slot]
+            if synthetic.get(key) == slot:
+                continue
+            if (resorts[other].get("address") or "").lower() == address or \
+                    _distance_km(lat, lng, lats[other], lngs[other]) <= radius_km:
+                duplicate = True
+                break
+        if duplicate:
+            continue
+        if key in synthetic:
+            if resort.get("rating"):
+                # A rated Google place replaces the known resort of the same name
+                kept[synthetic.pop(key)] = position
+            # Unrated, it would be filtered out and take the known resort with it
+            continue
+        slots.append(len(kept))
+        kept.append(position)
+
+    merged = len(resorts) - len(kept)
+    if merged:
+        search_stats.incr("duplicates.merged", merged)
+    return kept
+
+
+def report():
+    """Print the duplicates eliminated so far in the current search."""
+    stats = search_stats.current_stats()
+    if stats is None:
+        return
+    print(f"Dedup: {stats.get('duplicates.place_id')} repeated places dropped across cells, "
+          f"{stats.get('duplicates.merged')} near-duplicates merged")
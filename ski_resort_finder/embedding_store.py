@@ -0,0 +1,202 @@
+"""
+Embedding Store
+Persistent store of resort embeddings backed by a memory-mapped float32 matrix.
+
+Each resort is keyed by its Google place_id plus a short hash of the text that
+was encoded (so a renamed place is re-encoded), or by a hash of its name and
+address alone when it has no place_id (e.g. the known_resorts table).
+Vectors live in a flat float32 file that is memory-mapped by every worker; the
+key -> row index lives in a small SQLite database so rows can be appended
+safely from several processes. Resorts that were encoded once are never sent to the model again.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+
+import numpy as np
+
+try:
+    from .places_cache import default_cache_dir
+except ImportError:
+    from places_cache import default_cache_dir
+
+
+def resort_text(resort):
+    """Text that is fed to the sentence embedding model for a resort."""
+    return (resort.get("name") or "") + " " + (resort.get("address") or "")
+
+
+def resort_key(resort):
+    """Stable store key: the place_id (plus text hash) when known, otherwise a hash of the text."""
+    text_hash = hashlib.sha1(resort_text(resort).strip().lower().encode("utf-8")).hexdigest()
+    if resort.get("place_id"):
+        return "place:" + resort["place_id"] + ":" + text_hash[:12]
+    return "text:" + text_hash
+
+
+class EmbeddingStore:
+    """
+    Append-only, memory-mapped matrix of resort embeddings.
+
+    Args:
+        model_name: Name of the embedding model; each model gets its own files
+        directory: Where to keep the matrix and index; defaults to default_cache_dir()
+        batch_size: Batch size passed to model.encode
+    """
+
+    def __init__(self, model_name, directory=None, batch_size=64):
+        directory = directory or default_cache_dir()
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.matrix_path = os.path.join(directory, f"embeddings-{slug}.f32")
+        self.index_path = os.path.join(directory, f"embeddings-{slug}.sqlite3")
+        self.batch_size = batch_size
+        self.dim = None
+        self.encoded = 0
+        self.reused = 0
+        self._matrix = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            row = conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+            if row:
+                self.dim = int(row[0])
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _rows_on_disk(self):
+        if not self.dim or not os.path.exists(self.matrix_path):
+            return 0
+        return os.path.getsize(self.matrix_path) // (4 * self.dim)
+
+    def _mapped(self, min_rows):
+        """Return a memory map covering at least min_rows rows, remapping if the file grew."""
+        with self._lock:
+            if self._matrix is None or self._matrix.shape[0] < min_rows:
+                rows = self._rows_on_disk()
+                if rows < min_rows:
+                    raise RuntimeError("Embedding matrix is shorter than its index")
+                self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+            return self._matrix
+
+    def lookup(self, keys):
+        """Map keys to row numbers for the ones already stored."""
+        rows = {}
+        conn = self._connect()
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for key, row in conn.execute(f"SELECT key, row FROM vectors WHERE key IN ({placeholders})", chunk):
+                rows[key] = row
+        return rows
+
+    def get(self, keys):
+        """Return a (len(keys), dim) matrix for stored keys, or None if any key is missing."""
+        rows = self.lookup(keys)
+        if len(rows) < len(set(keys)):
+            return None
+        row_ids = [rows[key] for key in keys]
+        matrix = self._mapped(max(row_ids) + 1 if row_ids else 0)
+        return np.asarray(matrix[row_ids], dtype=np.float32)
+
+    def add(self, keys, vectors):
+        """Append vectors for keys that are not stored yet."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(keys):
+            return
+        conn = self._connect()
+        # BEGIN IMMEDIATE serializes writers across processes; readers only see
+        # rows whose vectors were flushed before the index commit.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self.dim is None:
+                row = conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+                self.dim = int(row[0]) if row else vectors.shape[1]
+                conn.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('dim', ?)", (str(self.dim),))
+            existing = self.lookup(list(keys))
+            pending = {}
+            for key, vector in zip(keys, vectors):
+                if key not in existing and key not in pending:
+                    pending[key] = vector
+            if pending:
+                next_row = conn.execute("SELECT COALESCE(MAX(row), -1) + 1 FROM vectors").fetchone()[0]
+                block = np.stack(list(pending.values())).astype(np.float32)
+                with open(self.matrix_path, "ab") as f:
+                    f.truncate(next_row * 4 * self.dim)
+                    f.seek(next_row * 4 * self.dim)
+                    f.write(block.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                conn.executemany(
+                    "INSERT INTO vectors (key, row) VALUES (?, ?)",
+                    [(key, next_row + offset) for offset, key in enumerate(pending)],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def encode_resorts(self, model, resorts):
+        """
+        Return an embedding matrix for resorts, encoding only the ones not in the store.
+        All missing resorts are sent to the model in a single batched encode call.
+        """
+        if not resorts:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        keys = [resort_key(resort) for resort in resorts]
+        rows = self.lookup(keys)
+        missing = {}
+        for key, resort in zip(keys, resorts):
+            if key not in rows and key not in missing:
+                missing[key] = resort_text(resort)
+
+        fresh = {}
+        if missing:
+            vectors = model.encode(
+                list(missing.values()),
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            ).astype(np.float32)
+            fresh = dict(zip(missing.keys(), vectors))
+            try:
+                self.add(list(fresh.keys()), vectors)
+            except (sqlite3.Error, OSError, RuntimeError) as e:
+                # The store is an optimization; a read-only or full disk must not fail the search
+                print(f"Warning: could not persist embeddings: {str(e)}")
+
+        with self._lock:
+            self.encoded += len(fresh)
+            self.reused += len(keys) - len(fresh)
+
+        stored = [key for key in keys if key not in fresh]
+        stored_matrix = self.get(stored) if stored else None
+        if stored and stored_matrix is None:
+            # Index and matrix disagree (e.g. concurrent reset); fall back to encoding everything
+            return model.encode(
+                [resort_text(resort) for resort in resorts],
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            ).astype(np.float32)
+        stored_vectors = dict(zip(stored, stored_matrix)) if stored else {}
+        return np.stack([fresh[key] if key in fresh else stored_vectors[key] for key in keys])
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self), "encoded": self.encoded, "reused": self.reused}
@@ -0,0 +1,268 @@
+"""
+Fake Google Maps server
+Local stand-in for the Geocoding, Nearby Search and Place Details endpoints,
+so the client layer and the finders can be exercised completely offline.
+
+The server runs in a background thread and serves a deterministic synthetic
+dataset of ski resorts around New England (or any list of places passed in).
+Latency, HTTP 429 bursts, OVER_QUERY_LIMIT responses and the page-token
+warm-up delay of the real API can all be injected.
+
+Usage:
+    with FakeGoogleServer(latency=0.05) as server:
+        client = GoogleMapsClient("test-key", base_url=server.base_url)
+"""
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Coordinates returned by the fake geocoder
+FAKE_GEOCODES = {
+    "amherst": (42.3732, -72.5199),
+    "boston": (42.3601, -71.0589),
+    "burlington": (44.4759, -73.2121),
+    "concord": (43.2081, -71.5376),
+    "portland": (43.6591, -70.2568),
+    "massachusetts": (42.4072, -71.3824),
+    "vermont": (44.5588, -72.5778),
+    "new hampshire": (43.1939, -71.5724),
+    "maine": (45.2538, -69.4455),
+}
+
+RESORT_WORDS = ["Mountain", "Ski Area", "Resort", "Peak", "Valley Ski Resort", "Ski Hill"]
+RESORT_NAMES = ["Pine", "Eagle", "Summit", "Birch", "Granite", "Maple", "Cedar", "Falcon",
+                "Hawk", "Spruce", "Crystal", "Thunder", "Timber", "Powder", "Glacier", "Ridge"]
+PAGE_SIZE = 20
+MAX_RESULTS = 60
+
+
+def _haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371.0088 * math.asin(math.sqrt(a))
+
+
+def synthetic_places(count=400, seed=7, bounds=(41.0, 47.5, -73.8, -67.0)):
+    """Deterministic list of fake ski resorts spread over a lat/lng bounding box."""
+    rng = random.Random(seed)
+    places = []
+    for i in range(count):
+        name = f"{rng.choice(RESORT_NAMES)} {rng.choice(RESORT_WORDS)} {i}"
+        lat = rng.uniform(bounds[0], bounds[1])
+        lng = rng.uniform(bounds[2], bounds[3])
+        places.append({
+            "place_id": f"fake-{i}",
+            "name": name,
+            "vicinity": f"{100 + i} Mountain Rd",
+            "formatted_address": f"{100 + i} Mountain Rd, Testville, VT 05000, USA",
+            "rating": round(rng.uniform(0, 5), 1) if rng.random() > 0.1 else None,
+            "geometry": {"location": {"lat": lat, "lng": lng}},
+            "website": f"https://example.com/resort/{i}",
+            "reviews": [{"author_name": "Skier", "rating": 5, "text": "Great snow"}],
+        })
+    return places
+
+
+class FakeGoogleServer:
+    """
+    Threaded HTTP server imitating the Google Maps web service endpoints.
+
+    Args:
+        places: Place dicts to serve; defaults to synthetic_places()
+        latency: Base delay per request in seconds
+        jitter: Extra uniform random delay per request in seconds
+        rate_limit_every: Answer every Nth request with HTTP 429 (0 disables)
+        over_query_limit_every: Answer every Nth request with OVER_QUERY_LIMIT (0 disables)
+        page_token_delay: Seconds before a next_page_token becomes valid, as with Google
+        geocode_unknown: Geocode addresses missing from FAKE_GEOCODES to a stable point
+                         derived from their hash (inside bounds) instead of ZERO_RESULTS
+        bounds: (min_lat, max_lat, min_lng, max_lng) used for synthetic data
+        host, port: Listen address; port 0 picks a free port
+    """
+
+    def __init__(self, places=None, latency=0.0, jitter=0.0, rate_limit_every=0,
+                 over_query_limit_every=0, page_token_delay=0.0, geocode_unknown=False,
+                 bounds=(41.0, 47.5, -73.8, -67.0), host="127.0.0.1", port=0):
+        self.places = places if places is not None else synthetic_places(bounds=bounds)
+        self.places_by_id = {place["place_id"]: place for place in self.places}
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_every = rate_limit_every
+        self.over_query_limit_every = over_query_limit_every
+        self.page_token_delay = page_token_delay
+        self.geocode_unknown = geocode_unknown
+        self.bounds = bounds
+        self.calls = {}
+        self.requests_seen = 0
+        self._page_tokens = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/maps/api"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_counts(self):
+        with self._lock:
+            self.calls = {}
+            self.requests_seen = 0
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                status, body = server.handle(self.path)
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def sleep(self):
+        """Wait the injected latency (plus jitter) of one request."""
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+    def handle(self, path):
+        """Dispatch a request path to the endpoint handlers; returns (http_status, body)."""
+        parsed = urlparse(path)
+        params = {name: values[0] for name, values in parse_qs(parsed.query).items()}
+        endpoint = parsed.path.split("/maps/api/", 1)[-1].rsplit("/json", 1)[0]
+
+        with self._lock:
+            self.requests_seen += 1
+            count = self.requests_seen
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+        self.sleep()
+        if self.rate_limit_every and count % self.rate_limit_every == 0:
+            return 429, {"status": "OVER_QUERY_LIMIT"}
+        if self.over_query_limit_every and count % self.over_query_limit_every == 0:
+            return 200, {"status": "OVER_QUERY_LIMIT", "results": []}
+
+        if endpoint == "geocode":
+            return 200, self._geocode(params)
+        if endpoint == "place/nearbysearch":
+            return 200, self._nearby(params)
+        if endpoint == "place/details":
+            return 200, self._details(params)
+        return 404, {"status": "NOT_FOUND"}
+
+    def _geocode(self, params):
+        address = " ".join(params.get("address", "").lower().split())
+        for name, (lat, lng) in FAKE_GEOCODES.items():
+            if name in address:
+                return {"status": "OK", "results": [{
+                    "formatted_address": address.title(),
+                    "geometry": {"location": {"lat": lat, "lng": lng}},
+                }]}
+        if self.geocode_unknown and address:
+            digest = hashlib.sha1(address.encode("utf-8")).digest()
+            lat = self.bounds[0] + (self.bounds[1] - self.bounds[0]) * int.from_bytes(digest[:4], "big") / 2 ** 32
+            lng = self.bounds[2] + (self.bounds[3] - self.bounds[2]) * int.from_bytes(digest[4:8], "big") / 2 ** 32
+            return {"status": "OK", "results": [{
+                "formatted_address": address.title(),
+                "geometry": {"location": {"lat": lat, "lng": lng}},
+            }]}
+        return {"status": "ZERO_RESULTS", "results": []}
+
+    def _nearby(self, params):
+        token = params.get("pagetoken")
+        if token:
+            with self._lock:
+                entry = self._page_tokens.get(token)
+            if entry is None:
+                return {"status": "INVALID_REQUEST", "results": []}
+            issued_at, matches, offset = entry
+            if time.time() - issued_at < self.page_token_delay:
+                return {"status": "INVALID_REQUEST", "results": []}
+        else:
+            lat, lng = (float(part) for part in params["location"].split(","))
+            radius_km = float(params.get("radius", 50000)) / 1000
+            matches = [
+                place for place in self.places
+                if _haversine_km(lat, lng, place["geometry"]["location"]["lat"],
+                                 place["geometry"]["location"]["lng"]) <= radius_km
+            ][:MAX_RESULTS]
+            offset = 0
+
+        page = matches[offset:offset + PAGE_SIZE]
+        if not page:
+            return {"status": "ZERO_RESULTS", "results": []}
+        body = {"status": "OK", "results": [
+            {key: place[key] for key in ("place_id", "name", "vicinity", "rating", "geometry") if place.get(key) is not None}
+            for place in page
+        ]}
+        if offset + PAGE_SIZE < len(matches):
+            next_token = uuid.uuid4().hex
+            with self._lock:
+                self._page_tokens[next_token] = (time.time(), matches, offset + PAGE_SIZE)
+            body["next_page_token"] = next_token
+        return body
+
+    def _details(self, params):
+        place = self.places_by_id.get(params.get("place_id"))
+        if place is None:
+            return {"status": "NOT_FOUND"}
+        fields = params.get("fields")
+        result = {key: value for key, value in place.items() if value is not None}
+        if fields:
+            wanted = set(fields.split(","))
+            result = {key: value for key, value in result.items() if key in wanted}
+        return {"status": "OK", "result": result}
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a fake Google Maps API server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--page-token-delay", type=float, default=0.0)
+    args = parser.parse_args()
+    server = FakeGoogleServer(latency=args.latency, page_token_delay=args.page_token_delay, port=args.port)
+    print(f"Fake Google Maps API at {server.base_url} (set GOOGLE_MAPS_BASE_URL to use it)")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
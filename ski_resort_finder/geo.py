@@ -0,0 +1,56 @@
+"""
+Geo helpers
+Vectorized great-circle distances for filtering resort candidates.
+
+filter_by_distance used to call geopy's geodesic (an iterative ellipsoidal
+solver in pure Python) twice per resort. Here distances for every candidate
+are computed in one NumPy haversine pass; the exact geodesic can optionally be
+applied to the few candidates that survive the radius cut.
+"""
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+# Haversine on a sphere differs from the WGS-84 geodesic by at most ~0.5%
+HAVERSINE_MAX_ERROR = 0.005
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Distances in km from (lat, lng) to every point of the lats/lngs arrays."""
+    lat1 = np.radians(lat)
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    dlat = lat2 - lat1
+    dlng = np.radians(np.asarray(lngs, dtype=np.float64)) - np.radians(lng)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def coordinates(resorts):
+    """Columnar lat/lng arrays for a list of resort dicts; missing coordinates become NaN."""
+    lats = np.fromiter((np.nan if r.get("lat") is None else r["lat"] for r in resorts), dtype=np.float64, count=len(resorts))
+    lngs = np.fromiter((np.nan if r.get("lng") is None else r["lng"] for r in resorts), dtype=np.float64, count=len(resorts))
+    return lats, lngs
+
+
+def within_distance(lat, lng, lats, lngs, max_distance_km, exact=False):
+    """
+    Indices and distances of the points within max_distance_km of (lat, lng).
+
+    Returns a columnar pair (indices, distances_km) of NumPy arrays. With
+    exact=True, haversine only prefilters (with a margin for its error) and
+    the returned distances are WGS-84 geodesics computed for the survivors.
+    """
+    distances = haversine_km(lat, lng, lats, lngs)
+    if not exact:
+        indices = np.flatnonzero(distances <= max_distance_km)
+        return indices, distances[indices]
+
+    from geopy.distance import geodesic
+
+    candidates = np.flatnonzero(distances <= max_distance_km * (1 + HAVERSINE_MAX_ERROR))
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    exact_distances = np.array(
+        [geodesic((lat, lng), (lats[i], lngs[i])).km for i in candidates], dtype=np.float64
+    )
+    keep = exact_distances <= max_distance_km
+    return candidates[keep], exact_distances[keep]
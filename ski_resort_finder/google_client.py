@@ -0,0 +1,284 @@
+"""
+Google Maps Client
+Shared HTTP client layer for the Geocoding and Places APIs.
+
+All Google calls go through one requests.Session per process, whose
+keep-alive connection pool is sized to the number of concurrent workers, so
+grid searches reuse TCP+TLS connections instead of handshaking on every call.
+Transient failures (timeouts, HTTP 429/5xx, OVER_QUERY_LIMIT) are retried with
+exponential backoff and full jitter, responses are served from the shared
+PlacesCache when possible, and per-endpoint latency metrics are recorded.
+Every request that does go out waits for a token from the process-wide
+rate limiter and is charged to the current search's call budget.
+"""
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from .places_cache import get_default_cache
+    from .rate_limiter import get_default_limiter
+    from . import metrics
+    from . import search_stats
+except ImportError:
+    from places_cache import get_default_cache
+    from rate_limiter import get_default_limiter
+    import metrics
+    import search_stats
+
+DEFAULT_BASE_URL = "https://maps.googleapis.com/maps/api"
+
+# HTTP statuses and API statuses that are worth retrying
+RETRY_HTTP_STATUSES = (429, 500, 502, 503, 504)
+RETRY_API_STATUSES = ("OVER_QUERY_LIMIT", "UNKNOWN_ERROR")
+
+
+class EndpointMetrics:
+    """Call counters and latency totals for one endpoint."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "cache_hits": self.cache_hits,
+            "avg_ms": self.total_ms / self.calls if self.calls else 0.0,
+            "max_ms": self.max_ms,
+        }
+
+
+class GoogleMapsClient:
+    """
+    Pooled, retrying client for Google Maps web service endpoints.
+
+    Args:
+        api_key: Google Maps API key, added to every request
+        cache: PlacesCache to read and populate; defaults to the process-wide cache
+        pool_size: Keep-alive connections per host; match the executor size
+        timeout: (connect, read) timeout in seconds
+        max_retries: Retries after the first attempt for transient failures
+        backoff_base: First backoff ceiling in seconds, doubled on every retry
+        backoff_max: Upper bound for a single backoff sleep
+        base_url: API root; GOOGLE_MAPS_BASE_URL overrides it (e.g. for fake_google)
+        async_concurrency: Process-wide cap on in-flight requests made via get_json_async
+        limiter: RateLimiter for outbound requests; defaults to the process-wide one
+    """
+
+    def __init__(self, api_key, cache=None, pool_size=5, timeout=(3.05, 10),
+                 max_retries=4, backoff_base=0.5, backoff_max=8.0, base_url=None,
+                 async_concurrency=16, limiter=None):
+        self.api_key = api_key
+        self.cache = cache or get_default_cache()
+        self.limiter = limiter or get_default_limiter()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.base_url = (base_url or os.getenv("GOOGLE_MAPS_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(pool_size, async_concurrency), pool_block=False)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.async_concurrency = async_concurrency
+        # Blocking requests made on behalf of coroutines run here; its size is
+        # the global concurrency limit shared by every event loop in the process
+        self._async_executor = ThreadPoolExecutor(max_workers=async_concurrency, thread_name_prefix="google-async")
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _record(self, endpoint, elapsed_ms=None, error=False, retry=False, cache_hit=False):
+        with self._lock:
+            metrics = self._metrics.setdefault(endpoint, EndpointMetrics())
+            if cache_hit:
+                metrics.cache_hits += 1
+                return
+            if retry:
+                metrics.retries += 1
+                return
+            metrics.calls += 1
+            metrics.total_ms += elapsed_ms
+            metrics.max_ms = max(metrics.max_ms, elapsed_ms)
+            if error:
+                metrics.errors += 1
+
+    def _backoff(self, attempt):
+        # Full jitter: uniform in [0, min(max, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _spend_budget(self, endpoint):
+        """Charge the search budget; False means the search has used it up."""
+        if search_stats.spend_budget():
+            return True
+        search_stats.incr("budget_exhausted")
+        metrics.count_budget_rejection(endpoint)
+        stats = search_stats.current_stats()
+        if stats.get("budget_exhausted") == 1:
+            print(f"Warning: search used its budget of {stats.budget} Google calls; returning partial results")
+        return False
+
+    def _admitted(self, endpoint, waited):
+        if waited is None:
+            search_stats.incr("rate_limited")
+            print(f"Warning: {endpoint} request dropped after waiting {self.limiter.queue_timeout}s for the rate limiter")
+            return False
+        if waited:
+            search_stats.add_time("rate_limit_wait", waited)
+        return True
+
+    def _admit(self, endpoint):
+        """Charge the search budget and wait for a rate limit token; False means do not send."""
+        if not self._spend_budget(endpoint):
+            return False
+        return self._admitted(endpoint, self.limiter.acquire(endpoint, search_stats.current_priority()))
+
+    async def _admit_async(self, endpoint):
+        """_admit() that waits for the rate limit token without holding a thread."""
+        if not self._spend_budget(endpoint):
+            return False
+        return self._admitted(endpoint, await self.limiter.acquire_async(endpoint, search_stats.current_priority()))
+
+    def _cached(self, endpoint, params):
+        cached = self.cache.get(endpoint, params)
+        if cached is not None:
+            self._record(endpoint, cache_hit=True)
+            search_stats.incr(f"cache_hits.{endpoint}")
+        return cached
+
+    def _attempt(self, endpoint, params, use_cache):
+        """
+        Send one request. Returns (body, retry): body is the decoded JSON (None
+        if there was none) and retry is True for a transient failure. A good
+        response is stored in the cache before returning.
+        """
+        request_params = dict(params)
+        request_params["key"] = self.api_key
+        search_stats.incr(f"api_calls.{endpoint}")
+        start = time.perf_counter()
+        try:
+            response = self.session.get(f"{self.base_url}/{endpoint}/json", params=request_params, timeout=self.timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            self._record(endpoint, (time.perf_counter() - start) * 1000, error=True)
+            print(f"Warning: {endpoint} request failed: {str(e)}")
+            return None, True
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        if response.status_code in RETRY_HTTP_STATUSES:
+            self._record(endpoint, elapsed_ms, error=True)
+            return None, True
+        if response.status_code != 200:
+            self._record(endpoint, elapsed_ms, error=True)
+            return None, False
+        try:
+            data = response.json()
+        except ValueError:
+            self._record(endpoint, elapsed_ms, error=True)
+            return None, False
+        if data.get("status") in RETRY_API_STATUSES:
+            self._record(endpoint, elapsed_ms, error=True)
+            return data, True
+
+        self._record(endpoint, elapsed_ms)
+        if use_cache:
+            self.cache.set(endpoint, params, data)
+        return data, False
+
+    def get_json(self, endpoint, params, use_cache=True):
+        """
+        GET an endpoint such as "geocode" or "place/nearbysearch".
+        Returns the decoded JSON body, or None if the request failed after all retries.
+        """
+        if use_cache:
+            cached = self._cached(endpoint, params)
+            if cached is not None:
+                return cached
+
+        data = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._record(endpoint, retry=True)
+                time.sleep(self._backoff(attempt - 1))
+            if not self._admit(endpoint):
+                break
+            body, retry = self._attempt(endpoint, params, use_cache)
+            if not retry:
+                return body
+            # Keep the last quota error body (if any) so callers can see the status
+            data = body if body is not None else data
+        return data
+
+    async def get_json_async(self, endpoint, params, use_cache=True):
+        """
+        Awaitable get_json. Backoff and rate limiter waits are awaited on the
+        event loop; only the blocking cache lookups and HTTP requests run in the
+        client's thread pool, whose size (async_concurrency) bounds in-flight
+        requests across all coroutines and event loops in the process.
+        """
+        loop = asyncio.get_running_loop()
+        # Run in a copy of the caller's context so per-search counters still apply
+        context = contextvars.copy_context()
+
+        def run(func, *args):
+            return loop.run_in_executor(self._async_executor, context.run, func, *args)
+
+        if use_cache:
+            cached = await run(self._cached, endpoint, params)
+            if cached is not None:
+                return cached
+
+        data = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._record(endpoint, retry=True)
+                await asyncio.sleep(self._backoff(attempt - 1))
+            if not await self._admit_async(endpoint):
+                break
+            body, retry = await run(self._attempt, endpoint, params, use_cache)
+            if not retry:
+                return body
+            data = body if body is not None else data
+        return data
+
+    def metrics(self):
+        """Per-endpoint call counts and latencies for this process."""
+        with self._lock:
+            return {endpoint: metrics.as_dict() for endpoint, metrics in self._metrics.items()}
+
+    def close(self):
+        self._async_executor.shutdown(wait=False)
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_default_client(api_key, cache=None, pool_size=5):
+    """
+    Process-wide client per API key (and cache and base URL), so every finder
+    shares one connection pool and one async concurrency limit.
+    """
+    cache = cache or get_default_cache()
+    base_url = (os.getenv("GOOGLE_MAPS_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+    # The client holds on to its cache, so the id stays unique while the entry exists
+    key = (api_key, id(cache), base_url)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = GoogleMapsClient(api_key, cache=cache, pool_size=pool_size, base_url=base_url)
+            _clients[key] = client
+        return client
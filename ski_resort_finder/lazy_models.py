@@ -0,0 +1,149 @@
+"""
+Lazy models
+Thread-safe, load-on-first-use wrappers for the NLP and embedding models.
+
+Importing torch/sentence-transformers and spaCy and loading their models
+takes seconds, so SkiResortFinder no longer does it in __init__: the
+models are loaded by whichever request needs them first (concurrent
+requests wait for the same load), or ahead of time by prewarm(). Loaded
+models are shared by every finder in the process.
+
+The sentence embedding model runs on PyTorch by default; set
+SKI_RESORT_EMBEDDING_BACKEND=onnx for the int8 ONNX Runtime encoder
+(onnx_encoder.py) and SKI_RESORT_ONNX_THREADS for its intra-op threads.
+"""
+import os
+import threading
+import time
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+class LazyResource:
+    """
+    A value built by loader() on first get(), exactly once across threads.
+
+    Args:
+        name: Label used in log lines and startup profiles
+        loader: Zero-argument callable that builds the value
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded = False
+        self.load_seconds = None
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                start = time.perf_counter()
+                self._value = self._loader()
+                self.load_seconds = time.perf_counter() - start
+                self._loaded = True
+                print(f"Loaded {self.name} in {self.load_seconds:.2f}s")
+        return self._value
+
+
+def _shared(key, loader):
+    # One resource per model per process, even with several finders
+    with _models_lock:
+        resource = _models.get(key)
+        if resource is None:
+            resource = _models[key] = LazyResource(key, loader)
+    return resource
+
+
+EMBEDDING_BACKENDS = ("torch", "onnx")
+
+
+def embedding_backend():
+    """Embedding backend from SKI_RESORT_EMBEDDING_BACKEND: "torch" (default) or "onnx"."""
+    backend = os.getenv("SKI_RESORT_EMBEDDING_BACKEND", "torch").lower()
+    if backend not in EMBEDDING_BACKENDS:
+        print(f"Warning: unknown SKI_RESORT_EMBEDDING_BACKEND {backend!r}; using torch")
+        return "torch"
+    return backend
+
+
+def embedding_space(model_name, backend=None):
+    """
+    Name under which vectors of model_name are stored (EmbeddingStore, VectorIndex).
+    Int8 vectors differ slightly from float32 ones, so each backend keeps its own.
+    """
+    backend = backend or embedding_backend()
+    return model_name if backend == "torch" else f"{model_name}@{backend}-int8"
+
+
+def sentence_model(model_name, backend=None):
+    """Lazy sentence embedding model shared by the process, on the configured backend."""
+    backend = backend or embedding_backend()
+    if backend == "onnx":
+        def load():
+            try:
+                from .onnx_encoder import OnnxSentenceEncoder
+            except ImportError:
+                from onnx_encoder import OnnxSentenceEncoder
+            try:
+                threads = int(os.getenv("SKI_RESORT_ONNX_THREADS", "0"))
+            except ValueError:
+                threads = 0
+            return OnnxSentenceEncoder.load(model_name, threads=threads)
+        return _shared(f"onnx-int8:{model_name}", load)
+
+    def load():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    return _shared(f"sentence-transformers:{model_name}", load)
+
+
+def spacy_model(model_name, download=False, enable=None):
+    """
+    Lazy spaCy pipeline shared by the process; optionally downloaded if missing.
+    enable keeps only the named components (plus the tok2vec/transformer they listen to).
+    """
+    def load():
+        import spacy
+        try:
+            nlp = spacy.load(model_name)
+        except OSError:
+            if not download:
+                raise
+            # If the model isn't available, download it
+            spacy.cli.download(model_name)
+            nlp = spacy.load(model_name)
+        if enable:
+            keep = set(enable)
+            for name, pipe in nlp.pipeline:
+                if keep & set(getattr(pipe, "listening_components", [])):
+                    keep.add(name)
+            nlp.select_pipes(enable=[name for name in nlp.pipe_names if name in keep])
+        return nlp
+    key = f"spacy:{model_name}" + (f"[{','.join(enable)}]" if enable else "")
+    return _shared(key, load)
+
+
+def prewarm(resources, background=False):
+    """Load resources now, or in a daemon thread if background; returns the thread."""
+    def run():
+        for resource in resources:
+            try:
+                resource.get()
+            except Exception as e:
+                print(f"Error pre-warming {resource.name}: {str(e)}")
+
+    if not background:
+        run()
+        return None
+    thread = threading.Thread(target=run, name="model-prewarm", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,100 @@
+"""
+Lexical
+BM25 prefilter and hybrid scoring for the ranking pipeline.
+
+Dense ranking embeds every candidate (encoding the ones never seen before)
+and scores all of them against the query, however many candidates a large
+region yields. A lexical pass over resort names and addresses is far
+cheaper: BM25 picks a shortlist of the candidates that share words with
+the query, and only those go on to create_resort_embeddings and
+get_top_matches. Candidates with the same BM25 score (e.g. none at all for
+a query that only names a region) are kept by rating, the order the final
+results are shown in.
+
+The BM25 scores can also be fused into the ranking score:
+    score = (1 - weight) * cosine + weight * bm25 / max(bm25)
+
+Tokens are lower-cased words with light suffix folding ("resorts" ->
+"resort", "skiing" -> "ski"); common query words carry no weight.
+
+Usage:
+    scores = bm25_scores(query, [resort_text(resort) for resort in resorts])
+    positions = shortlist(scores, ratings, 200)
+    ranking = hybrid_scores(similarities, scores[positions], weight=0.3)
+"""
+import functools
+import re
+
+import numpy as np
+
+# BM25 term-frequency saturation and document-length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = frozenset((
+    "a", "an", "and", "any", "are", "around", "at", "best", "by", "close", "find", "for", "from", "good",
+    "great", "i", "in", "is", "looking", "me", "my", "near", "nearby", "of", "on", "or", "some", "the",
+    "to", "want", "what", "where", "which", "with",
+))
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _fold(token):
+    # Not a stemmer: plurals and -ing only, so "pass" and "king" stay as they are
+    if len(token) > 5 and token.endswith("ing"):
+        return token[:-3]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+@functools.lru_cache(maxsize=65536)
+def tokenize(text):
+    """Word tokens of text, lower-cased and suffix-folded (cached: resort texts repeat across searches)."""
+    return tuple(_fold(token) for token in _WORD.findall(text.lower()))
+
+
+def query_terms(query):
+    """Distinct query tokens that carry meaning."""
+    return list(dict.fromkeys(token for token in tokenize(query) if token not in STOPWORDS))
+
+
+def bm25_scores(query, documents, k1=BM25_K1, b=BM25_B):
+    """BM25 score of every document (a string) for query; IDF is computed over the documents themselves."""
+    terms = query_terms(query)
+    count = len(documents)
+    if not terms or not count:
+        return np.zeros(count, dtype=np.float32)
+    term_index = {term: i for i, term in enumerate(terms)}
+    frequencies = np.zeros((len(terms), count), dtype=np.float32)
+    lengths = np.empty(count, dtype=np.float32)
+    for j, document in enumerate(documents):
+        tokens = tokenize(document)
+        lengths[j] = len(tokens)
+        for token in tokens:
+            i = term_index.get(token)
+            if i is not None:
+                frequencies[i, j] += 1
+    document_frequency = np.count_nonzero(frequencies, axis=1)
+    idf = np.log1p((count - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+    norm = k1 * (1 - b + b * lengths / max(float(lengths.mean()), 1.0))
+    return (idf[:, None] * frequencies * (k1 + 1) / (frequencies + norm)).sum(axis=0)
+
+
+def shortlist(scores, ratings, n):
+    """Positions of the n best candidates by BM25 score, then rating; all of them (in order) if n covers them."""
+    if n is None or len(scores) <= n:
+        return np.arange(len(scores))
+    order = np.lexsort((-np.asarray(ratings), -scores))
+    return np.sort(order[:n])
+
+
+def hybrid_scores(similarities, lexical, weight):
+    """Cosine similarities fused with max-normalized BM25 scores; weight 0 leaves the similarities alone."""
+    if not weight or lexical is None:
+        return similarities
+    top = float(lexical.max()) if len(lexical) else 0.0
+    if top <= 0:
+        return similarities
+    return (1 - weight) * similarities + weight * (lexical / top)
@@ -0,0 +1,259 @@
+"""
+Location Extractor
+Tiered location extraction for search queries.
+
+Tier 1 is a gazetteer of states, cities and resort names matched with an
+Aho-Corasick automaton in one pass over the query, on word boundaries (so
+"me" inside "home" is not Maine). Two-letter state abbreviations only
+match when written in upper case and after a comma or at the end of the
+query ("Stowe, VT", "skiing in VT"), so "IN" and "OK" in running text are
+not Indiana and Oklahoma; full names win over abbreviations anywhere in the
+query. A place right after "Mount"/"Mt" is a mountain, not the place
+("Mount Washington" is in New Hampshire, not Washington). Only queries the gazetteer
+cannot place fall through to tier 2, spaCy with every component except NER
+(and what NER listens to) disabled; bulk inputs go through nlp.pipe.
+Hits and latency are recorded per tier.
+"""
+import re
+import threading
+import time
+from collections import deque
+
+try:
+    from . import search_stats
+except ImportError:
+    import search_stats
+
+US_STATES = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR", "california": "CA",
+    "colorado": "CO", "connecticut": "CT", "delaware": "DE", "florida": "FL", "georgia": "GA",
+    "hawaii": "HI", "idaho": "ID", "illinois": "IL", "indiana": "IN", "iowa": "IA",
+    "kansas": "KS", "kentucky": "KY", "louisiana": "LA", "maine": "ME", "maryland": "MD",
+    "massachusetts": "MA", "michigan": "MI", "minnesota": "MN", "mississippi": "MS", "missouri": "MO",
+    "montana": "MT", "nebraska": "NE", "nevada": "NV", "new hampshire": "NH", "new jersey": "NJ",
+    "new mexico": "NM", "new york": "NY", "north carolina": "NC", "north dakota": "ND", "ohio": "OH",
+    "oklahoma": "OK", "oregon": "OR", "pennsylvania": "PA", "rhode island": "RI", "south carolina": "SC",
+    "south dakota": "SD", "tennessee": "TN", "texas": "TX", "utah": "UT", "vermont": "VT",
+    "virginia": "VA", "washington": "WA", "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY",
+}
+
+# Cities people search from; anything else falls through to spaCy
+CITIES = [
+    "amherst", "bangor", "boston", "burlington", "concord", "hartford", "lowell", "manchester",
+    "montpelier", "nashua", "north conway", "northampton", "pittsfield", "portland", "providence",
+    "rutland", "springfield", "worcester", "albany", "lake placid", "new york city", "denver",
+    "boulder", "salt lake city", "reno", "seattle", "los angeles", "san francisco", "chicago",
+]
+
+# Mountains named after a gazetteer place; other "Mount X" phrases fall through to spaCy
+MOUNTAIN_ALIASES = {
+    "mount washington": "new hampshire", "mt washington": "new hampshire", "mt. washington": "new hampshire",
+}
+
+TIERS = ("gazetteer", "spacy")
+
+_MOUNT_PREFIX = re.compile(r"\b(?:mount|mt\.?)\s+$")
+# What may follow an abbreviation that ends the query
+_TRAILING = re.compile(r"[\s.!?]*$")
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == "'"
+
+
+class Gazetteer:
+    """
+    Aho-Corasick automaton over lower-cased phrases.
+
+    Args:
+        entries: Iterable of (phrase, location) pairs; phrase matches map to location
+        abbreviations: Mapping of upper-case abbreviation to location, matched case-sensitively
+    """
+
+    def __init__(self, entries=(), abbreviations=None):
+        # Trie as parallel lists: goto transitions, failure links and outputs per state
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for phrase, location in entries:
+            self._add(phrase.lower(), (location, False))
+        for abbreviation, location in (abbreviations or {}).items():
+            self._add(abbreviation.lower(), (location, True))
+        self._build()
+
+    def _add(self, phrase, value):
+        state = 0
+        for char in phrase:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((len(phrase), value))
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def matches(self, text):
+        """Every (start, end, location, is_abbreviation) match on word boundaries, in text order."""
+        lowered = text.lower()
+        found = []
+        state = 0
+        for i, char in enumerate(lowered):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, (location, case_sensitive) in self._out[state]:
+                start, end = i + 1 - length, i + 1
+                if start > 0 and _is_word_char(lowered[start - 1]):
+                    continue
+                if end < len(lowered) and _is_word_char(lowered[end]):
+                    continue
+                if case_sensitive and not self._abbreviation_at(text, start, end):
+                    continue
+                if _MOUNT_PREFIX.search(lowered, 0, start):
+                    continue
+                found.append((start, end, location, case_sensitive))
+        found.sort(key=lambda m: (m[0], -(m[1] - m[0])))
+        return found
+
+    @staticmethod
+    def _abbreviation_at(text, start, end):
+        # Upper case, and either after a comma ("Stowe, VT") or ending the text ("ski in VT")
+        if not text[start:end].isupper():
+            return False
+        return text[:start].rstrip().endswith(",") or _TRAILING.fullmatch(text, end) is not None
+
+    def find(self, text):
+        """Leftmost-longest full-name location in text, else the leftmost abbreviation; None if neither."""
+        found = self.matches(text)
+        if not found:
+            return None
+        return min(found, key=lambda m: (m[3], m[0], -(m[1] - m[0])))[2]
+
+
+def default_gazetteer(resort_aliases=None, cities=CITIES):
+    """
+    Gazetteer of US states, their abbreviations, cities and resort aliases.
+    resort_aliases maps resort names or nicknames to the location to search.
+
+    >>> gazetteer = default_gazetteer()
+    >>> gazetteer.find("SKI RESORTS IN VERMONT"), gazetteer.find("Is it OK to ski in Vermont")
+    ('vermont', 'vermont')
+    >>> gazetteer.find("Stowe, VT"), gazetteer.find("ski resorts CO"), gazetteer.find("OR ME HI OH")
+    ('vermont', 'colorado', 'ohio')
+    >>> gazetteer.find("ski at Mount Washington"), gazetteer.find("Mt Hood skiing")
+    ('new hampshire', None)
+    """
+    entries = [(state, state) for state in US_STATES]
+    entries += [(city.lower(), city.lower()) for city in cities]
+    entries += list(MOUNTAIN_ALIASES.items())
+    entries += list((resort_aliases or {}).items())
+    abbreviations = {abbreviation: state for state, abbreviation in US_STATES.items()}
+    return Gazetteer(entries, abbreviations)
+
+
+class LocationExtractor:
+    """
+    Gazetteer first, spaCy NER second.
+
+    Args:
+        nlp: LazyResource (or anything with get()) for the spaCy pipeline; only
+             loaded if a query misses the gazetteer
+        gazetteer: Gazetteer for tier 1; defaults to default_gazetteer()
+        lowercase: Lower-case spaCy entities, as the gazetteer's locations are
+    """
+
+    def __init__(self, nlp, gazetteer=None, lowercase=True):
+        self._nlp = nlp
+        self.gazetteer = gazetteer or default_gazetteer()
+        self.lowercase = lowercase
+        self._lock = threading.Lock()
+        self._queries = {tier: 0 for tier in TIERS}
+        self._hits = {tier: 0 for tier in TIERS}
+        self._seconds = {tier: 0.0 for tier in TIERS}
+
+    def _record(self, tier, queries, hits, seconds):
+        with self._lock:
+            self._queries[tier] += queries
+            self._hits[tier] += hits
+            self._seconds[tier] += seconds
+        search_stats.incr(f"location_tier.{tier}", hits)
+
+    def _entity(self, doc):
+        for ent in doc.ents:
+            if ent.label_ in ("GPE", "LOC"):
+                return ent.text.lower() if self.lowercase else ent.text
+        return None
+
+    def extract(self, query):
+        return self.extract_many([query])[0]
+
+    def extract_many(self, queries, batch_size=64):
+        """Locations for many queries; gazetteer misses are batched through nlp.pipe."""
+        results = [None] * len(queries)
+        start = time.perf_counter()
+        misses = []
+        for i, query in enumerate(queries):
+            results[i] = self.gazetteer.find(query)
+            if results[i] is None:
+                misses.append(i)
+        self._record("gazetteer", len(queries), len(queries) - len(misses), time.perf_counter() - start)
+        if not misses:
+            return results
+
+        start = time.perf_counter()
+        docs = self._nlp.get().pipe([queries[i] for i in misses], batch_size=batch_size)
+        for i, doc in zip(misses, docs):
+            results[i] = self._entity(doc)
+        hits = sum(1 for i in misses if results[i] is not None)
+        self._record("spacy", len(misses), hits, time.perf_counter() - start)
+        search_stats.incr("location_tier.miss", len(misses) - hits)
+        return results
+
+    def stats(self):
+        """Per tier: queries it saw, share it answered, and mean latency per query in milliseconds."""
+        with self._lock:
+            return {
+                tier: {
+                    "queries": self._queries[tier],
+                    "hits": self._hits[tier],
+                    "hit_rate": self._hits[tier] / self._queries[tier] if self._queries[tier] else 0.0,
+                    "avg_ms": 1000 * self._seconds[tier] / self._queries[tier] if self._queries[tier] else 0.0,
+                }
+                for tier in self._queries
+            }
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    try:
+        from .lazy_models import spacy_model
+    except ImportError:
+        from lazy_models import spacy_model
+
+    parser = argparse.ArgumentParser(description="Extract locations from queries (one per line on stdin) and report tier stats")
+    parser.add_argument("--spacy-model", default="en_core_web_sm")
+    args = parser.parse_args()
+
+    queries = [line.strip() for line in sys.stdin if line.strip()]
+    extractor = LocationExtractor(spacy_model(args.spacy_model, enable=("ner",)))
+    for query, location in zip(queries, extractor.extract_many(queries)):
+        print(f"{location or '-':<20} {query}")
+    for tier, tier_stats in extractor.stats().items():
+        print(f"{tier:>10}: {tier_stats['hits']}/{tier_stats['queries']} hits "
+              f"({tier_stats['hit_rate']:.0%}), {tier_stats['avg_ms']:.3f} ms/query")
@@ -0,0 +1,142 @@
+"""
+Metrics
+Process-wide search metrics in the Prometheus text exposition format.
+
+Every finished search (see search_stats.track_search) adds its total and
+per-stage wall time to histograms and its counters (API calls, cache hits,
+coverage cells, ...) to labelled counters. The Google rate limiter adds its
+queue wait times and rejected calls. Each worker process keeps its
+own registry, so scrape every worker. server_timing() renders one search's
+stages as a Server-Timing header value for browser dev tools.
+"""
+import os
+import threading
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RESULT_BUCKETS = (0, 1, 5, 10, 20, 30, 50)
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label set (a tuple of (name, value) pairs)."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        counts, total = self.series.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-1] += 1
+        self.series[labels] = (counts, total + value)
+
+    def render(self, name):
+        lines = []
+        for labels, (counts, total) in sorted(self.series.items(), key=lambda item: str(item[0])):
+            prefix = "".join(f'{label}="{value}",' for label, value in labels or ())
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {counts[-1]}')
+            braces = f'{{{prefix[:-1]}}}' if prefix else ""
+            lines.append(f"{name}_sum{braces} {total}")
+            lines.append(f"{name}_count{braces} {counts[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = Histogram(DURATION_BUCKETS)
+        self.stages = Histogram(DURATION_BUCKETS)
+        self.results = Histogram(RESULT_BUCKETS)
+        self.rate_limit_waits = Histogram(WAIT_BUCKETS)
+        self.counters = {}
+        self.rejections = {}
+
+    def observe_search(self, stats):
+        counters = stats.as_dict()
+        timings = stats.timings_dict()
+        with self._lock:
+            self.durations.observe(None, stats.total_seconds or 0.0)
+            for stage, seconds in timings.items():
+                self.stages.observe((("stage", stage),), seconds)
+            if "results" in counters:
+                self.results.observe(None, counters["results"])
+            for name, value in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe_rate_limit_wait(self, endpoint, priority, seconds):
+        with self._lock:
+            self.rate_limit_waits.observe((("endpoint", endpoint), ("priority", priority)), seconds)
+
+    def count_rejection(self, endpoint, reason):
+        with self._lock:
+            key = (endpoint, reason)
+            self.rejections[key] = self.rejections.get(key, 0) + 1
+
+    def render(self):
+        with self._lock:
+            lines = [
+                "# HELP ski_search_duration_seconds Wall time of whole searches.",
+                "# TYPE ski_search_duration_seconds histogram",
+                *self.durations.render("ski_search_duration_seconds"),
+                "# HELP ski_search_stage_seconds Time per pipeline stage, summed over concurrent calls.",
+                "# TYPE ski_search_stage_seconds histogram",
+                *self.stages.render("ski_search_stage_seconds"),
+                "# HELP ski_search_results Resorts returned per search.",
+                "# TYPE ski_search_results histogram",
+                *self.results.render("ski_search_results"),
+                "# HELP ski_search_events_total Per-search counters (API calls, cache hits, cells, ...).",
+                "# TYPE ski_search_events_total counter",
+            ]
+            lines += [f'ski_search_events_total{{name="{name}"}} {value}' for name, value in sorted(self.counters.items())]
+            lines += [
+                "# HELP ski_google_rate_limit_wait_seconds Time Google API calls queued for a rate limit token.",
+                "# TYPE ski_google_rate_limit_wait_seconds histogram",
+                *self.rate_limit_waits.render("ski_google_rate_limit_wait_seconds"),
+                "# HELP ski_google_rejected_calls_total Google API calls not made: rate limit queue timeout or search budget spent.",
+                "# TYPE ski_google_rejected_calls_total counter",
+            ]
+            lines += [
+                f'ski_google_rejected_calls_total{{endpoint="{endpoint}",reason="{reason}"}} {value}'
+                for (endpoint, reason), value in sorted(self.rejections.items())
+            ]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def observe_search(stats):
+    REGISTRY.observe_search(stats)
+
+
+def observe_rate_limit_wait(endpoint, priority, seconds):
+    REGISTRY.observe_rate_limit_wait(endpoint, priority, seconds)
+
+
+def count_rate_limit_rejection(endpoint, priority):
+    REGISTRY.count_rejection(endpoint, f"rate_limit_{priority}")
+
+
+def count_budget_rejection(endpoint):
+    REGISTRY.count_rejection(endpoint, "search_budget")
+
+
+def render():
+    return REGISTRY.render()
+
+
+def server_timing_enabled():
+    return os.getenv("SKI_RESORT_SERVER_TIMING", "").lower() in ("1", "true", "yes")
+
+
+def server_timing(stats):
+    """Server-Timing header value, e.g. 'geocode;dur=12.3, rank;dur=40.1'."""
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in stats.timings_dict().items()]
+    if stats.total_seconds is not None:
+        entries.append(f"total;dur={stats.total_seconds * 1000:.1f}")
+    return ", ".join(entries)
@@ -0,0 +1,237 @@
+"""
+ONNX Encoder
+Int8-quantized ONNX Runtime backend for the sentence embedding model.
+
+The PyTorch SentenceTransformer keeps hundreds of MB of float32 weights per
+worker and spends most of a search's CPU time in encode(). This backend
+exports the model's transformer to ONNX once, quantizes its weights to int8
+(dynamic quantization, so activations stay float) and runs it with ONNX
+Runtime. Only onnxruntime and the tokenizer are needed to serve; torch and
+sentence-transformers are needed for the one-off export, whose result is
+kept in the cache directory (onnx/<model>/) and reused by every process.
+
+OnnxSentenceEncoder.encode() takes the same arguments as
+SentenceTransformer.encode() for the calls this repo makes, so
+create_resort_embeddings, get_top_matches and the EmbeddingStore use it
+unchanged. Vectors are close to, but not identical with, the PyTorch ones;
+see benchmarks/bench_embeddings.py for the ranking overlap.
+
+Usage:
+    encoder = OnnxSentenceEncoder.load("paraphrase-distilroberta-base-v1", threads=2)
+    vectors = encoder.encode(["Killington Resort Killington, VT"], batch_size=64)
+
+    python onnx_encoder.py export [--model paraphrase-distilroberta-base-v1]
+"""
+import inspect
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+try:
+    from .places_cache import default_cache_dir
+except ImportError:
+    from places_cache import default_cache_dir
+
+MODEL_FILE = "model-int8.onnx"
+CONFIG_FILE = "encoder.json"
+ONNX_OPSET = 14
+
+
+def export_dir(model_name):
+    """Where the exported model of model_name lives in the cache directory."""
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+    return os.path.join(default_cache_dir(), "onnx", slug)
+
+
+def export(model_name, directory=None):
+    """
+    Export model_name's transformer to ONNX, quantize it to int8 and save it with
+    its tokenizer and pooling settings. Needs torch, sentence-transformers and onnxruntime.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    directory = directory or export_dir(model_name)
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0].auto_model.eval()
+    pooling = next((module for module in model if type(module).__name__ == "Pooling"), None)
+    if pooling is None or pooling.pooling_mode_mean_tokens:
+        pooling_mode = "mean"
+    elif pooling.pooling_mode_cls_token:
+        pooling_mode = "cls"
+    else:
+        pooling_mode = "max"
+
+    class TokenEmbeddings(torch.nn.Module):
+        # Only last_hidden_state; pooling stays in NumPy so the graph has one output
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask):
+            return self.transformer(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    # Built in a temp directory and renamed into place, so concurrent workers never see half an export
+    staging = tempfile.mkdtemp(prefix="export-", dir=parent)
+    try:
+        sample = model.tokenizer(["Killington Resort Killington, VT"], return_tensors="pt")
+        float_path = os.path.join(staging, "model.onnx")
+        options = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            # torch >= 2.9 defaults to the dynamo exporter, which needs onnxscript
+            options["dynamo"] = False
+        with torch.no_grad():
+            torch.onnx.export(
+                TokenEmbeddings(transformer),
+                (sample["input_ids"], sample["attention_mask"]),
+                float_path,
+                input_names=["input_ids", "attention_mask"],
+                output_names=["token_embeddings"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "token_embeddings": {0: "batch", 1: "sequence"},
+                },
+                opset_version=ONNX_OPSET,
+                **options,
+            )
+        quantize_dynamic(float_path, os.path.join(staging, MODEL_FILE), weight_type=QuantType.QInt8)
+        os.remove(float_path)
+        model.tokenizer.save_pretrained(staging)
+        with open(os.path.join(staging, CONFIG_FILE), "w") as f:
+            json.dump({
+                "model_name": model_name,
+                "pooling": pooling_mode,
+                "normalize": any(type(module).__name__ == "Normalize" for module in model),
+                "max_seq_length": model.max_seq_length,
+                "dim": model.get_sentence_embedding_dimension(),
+            }, f, indent=2)
+        try:
+            os.rename(staging, directory)
+        except OSError:
+            # Another process finished the same export first
+            shutil.rmtree(staging, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    print(f"Exported {model_name} to {directory}")
+    return directory
+
+
+class OnnxSentenceEncoder:
+    """
+    SentenceTransformer.encode() on an exported int8 ONNX model.
+
+    Args:
+        directory: An export() output directory
+        threads: ONNX Runtime intra-op threads per encode call (0 = one per physical core)
+    """
+
+    def __init__(self, directory, threads=0):
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(directory, CONFIG_FILE)) as f:
+            config = json.load(f)
+        self.model_name = config["model_name"]
+        self.pooling = config["pooling"]
+        self.normalize = config["normalize"]
+        self.max_seq_length = config["max_seq_length"]
+        self.dim = config["dim"]
+
+        self.model_path = os.path.join(directory, MODEL_FILE)
+        self.threads = threads
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+        # Fast tokenizers change their truncation/padding state per call and are not thread-safe
+        self._tokenizer_lock = threading.Lock()
+
+    @property
+    def session(self):
+        # ONNX Runtime's thread pools do not survive fork(), so each process builds its own session
+        if self._session is None or self._session_pid != os.getpid():
+            with self._session_lock:
+                if self._session is None or self._session_pid != os.getpid():
+                    import onnxruntime as ort
+
+                    options = ort.SessionOptions()
+                    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                    if self.threads:
+                        options.intra_op_num_threads = self.threads
+                    # Requests already run in parallel threads; one graph at a time per call
+                    options.inter_op_num_threads = 1
+                    self._session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+                    self._session_pid = os.getpid()
+        return self._session
+
+    @classmethod
+    def load(cls, model_name, threads=0, directory=None):
+        """Encoder for model_name, exporting it first if it is not in the cache directory yet."""
+        directory = directory or export_dir(model_name)
+        if not os.path.exists(os.path.join(directory, CONFIG_FILE)):
+            export(model_name, directory)
+        return cls(directory, threads=threads)
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def _encode_batch(self, texts):
+        with self._tokenizer_lock:
+            tokens = self.tokenizer(texts, padding=True, truncation=True,
+                                    max_length=self.max_seq_length, return_tensors="np")
+        mask = tokens["attention_mask"].astype(np.int64)
+        token_embeddings = self.session.run(None, {
+            "input_ids": tokens["input_ids"].astype(np.int64),
+            "attention_mask": mask,
+        })[0]
+        if self.pooling == "cls":
+            return token_embeddings[:, 0]
+        if self.pooling == "max":
+            return np.where(mask[..., None] > 0, token_embeddings, -1e9).max(axis=1)
+        weights = mask[..., None].astype(np.float32)
+        return (token_embeddings * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, show_progress_bar=False,
+               normalize_embeddings=False, **kwargs):
+        """
+        Embed one string (returns a vector) or a list of strings (returns a matrix),
+        as SentenceTransformer.encode does. Texts are batched by length to limit padding.
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        embeddings = np.empty((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch = order[start:start + batch_size]
+            embeddings[batch] = self._encode_batch([texts[i] for i in batch])
+        if self.normalize or normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings[0] if single else embeddings
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export the sentence embedding model to int8 ONNX")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("--model", default="paraphrase-distilroberta-base-v1")
+    parser.add_argument("--force", action="store_true", help="Replace an existing export")
+    args = parser.parse_args()
+    target = export_dir(args.model)
+    if args.force and os.path.exists(target):
+        shutil.rmtree(target)
+    if os.path.exists(os.path.join(target, CONFIG_FILE)):
+        print(f"{args.model} is already exported to {target} (use --force to redo it)")
+    else:
+        export(args.model, target)
@@ -0,0 +1,256 @@
+"""
+Pagination
+Nearby Search page-token chains without idle waits.
+
+Google issues a next_page_token a short while before it becomes valid;
+requesting it too early returns INVALID_REQUEST. The finders used to sleep
+a fixed second before every next page, holding a worker thread idle (and
+dropping the rest of the chain whenever a token needed longer). A PageChain
+instead:
+
+- schedules the next page as a deferred task, so on an executor the worker
+  is released between pages (run_deferred) and coroutines simply await
+  (run_async);
+- requests the next page as soon as the token is expected to be valid,
+  using a process-wide estimate learnt from earlier tokens, and polls every
+  PAGE_TOKEN_POLL seconds while Google still answers INVALID_REQUEST;
+- skips the wait entirely when the next page is already in the PlacesCache;
+- can stop after a page once the search has enough candidates
+  (keep_paging), counting the skipped pages as "pages_skipped".
+
+Usage:
+    chain = PageChain(fetch_page, parse_page, is_cached, keep_paging)
+    resorts, raw_count, incomplete = chain.run()             # blocking
+    future = chain.run_deferred(executor)                    # Future of the same
+    resorts, raw_count, incomplete = await chain.run_async() # fetch_page returns an awaitable
+
+incomplete is True when a page after the first failed (request error,
+non-OK status, budget or rate limiter, a token that never became valid), so
+the cell's places are only partly known.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+
+try:
+    from . import search_stats
+    from .search_stats import submit_with_context
+except ImportError:
+    import search_stats
+    from search_stats import submit_with_context
+
+# First guess at how long a fresh next_page_token takes to become valid
+INITIAL_TOKEN_DELAY = 1.0
+MIN_TOKEN_DELAY = 0.05
+# Retry interval while a token is still INVALID_REQUEST, and when to give up on it
+PAGE_TOKEN_POLL = 0.25
+MAX_TOKEN_WAIT = 6.0
+
+
+class TokenWarmup:
+    """
+    Running estimate of the delay before a next_page_token becomes valid.
+    A token that works on the first try nudges the estimate down; one that
+    needed polling moves it towards the delay it actually took.
+    """
+
+    def __init__(self, initial=INITIAL_TOKEN_DELAY, minimum=MIN_TOKEN_DELAY):
+        self.estimate = initial
+        self.minimum = minimum
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock:
+            return self.estimate
+
+    def observe(self, waited, polled):
+        with self._lock:
+            if polled:
+                self.estimate = 0.5 * self.estimate + 0.5 * waited
+            else:
+                self.estimate = max(self.minimum, 0.9 * self.estimate)
+
+
+token_warmup = TokenWarmup()
+
+
+class Scheduler:
+    """One daemon thread that submits deferred calls to their executors when due."""
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def call_later(self, delay, executor, fn, *args):
+        """Run fn(*args) on executor after delay seconds, in the caller's context."""
+        context = contextvars.copy_context()
+        if delay <= 0:
+            executor.submit(context.run, fn, *args)
+            return
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), executor, context, fn, args))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="page-token-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                _, _, executor, context, fn, args = heapq.heappop(self._heap)
+            try:
+                executor.submit(context.run, fn, *args)
+            except RuntimeError:
+                # The executor shut down meanwhile; finish the call here rather than lose it
+                context.run(fn, *args)
+
+
+_scheduler = Scheduler()
+
+
+class PageChain:
+    """
+    The Nearby Search pages of one coverage cell.
+
+    Args:
+        fetch: fetch(page_token) -> response body or None; page_token is None for the first page
+        parse: parse(body) -> resorts of an OK page
+        is_cached: is_cached(page_token) -> True if that page can be served from the cache
+        keep_paging: keep_paging() -> False to stop before the next page
+        label: Name used in error messages
+    """
+
+    def __init__(self, fetch, parse, is_cached=None, keep_paging=None, label="fetch_ski_resorts_for_point"):
+        self.fetch = fetch
+        self.parse = parse
+        self.is_cached = is_cached
+        self.keep_paging = keep_paging
+        self.label = label
+        self.results = []
+        self.raw_count = None
+        self.incomplete = False
+        self._issued = None
+        self._sent = None
+        self._cached = False
+        self._polled = False
+
+    def result(self):
+        """
+        (resorts, raw_result_count, incomplete); the count is None if the first
+        request failed, incomplete is True if a later page failed.
+        """
+        return self.results, self.raw_count, self.incomplete
+
+    def _fail(self, token):
+        # A failure on a later page leaves the earlier pages' results, but not the whole cell
+        if token:
+            self.incomplete = True
+        return None
+
+    def _after(self, token, data):
+        """Consume one response; returns (next_token, delay) or None when the chain is done."""
+        if data is None:
+            print("Error: Places API request failed")
+            return self._fail(token)
+        status = data.get("status")
+        if token and status == "INVALID_REQUEST" and not self._cached:
+            waited = time.monotonic() - self._issued
+            if waited + PAGE_TOKEN_POLL <= MAX_TOKEN_WAIT:
+                # Not valid yet; try again shortly
+                search_stats.incr("page_token_polls")
+                self._polled = True
+                return token, PAGE_TOKEN_POLL
+            print(f"Warning: next_page_token still invalid after {waited:.1f}s; keeping {len(self.results)} results")
+            return self._fail(token)
+        if status == "ZERO_RESULTS":
+            if self.raw_count is None:
+                self.raw_count = 0
+            return None
+        if status != "OK":
+            print(f"Error: Places API returned status {status}")
+            return self._fail(token)
+
+        if token and not self._cached:
+            token_warmup.observe(self._sent - self._issued, self._polled)
+        places = data.get("results", [])
+        self.raw_count = (self.raw_count or 0) + len(places)
+        self.results.extend(self.parse(data))
+
+        next_token = data.get("next_page_token")
+        if not next_token:
+            return None
+        if self.keep_paging is not None and not self.keep_paging():
+            search_stats.incr("pages_skipped")
+            return None
+        self._issued = time.monotonic()
+        self._polled = False
+        self._cached = bool(self.is_cached and self.is_cached(next_token))
+        return next_token, 0.0 if self._cached else token_warmup.delay()
+
+    def _handle(self, token, data):
+        try:
+            return self._after(token, data)
+        except Exception as e:
+            print(f"Error in {self.label}: {str(e)}")
+            return self._fail(token)
+
+    def _request(self, token):
+        self._sent = time.monotonic()
+        try:
+            data = self.fetch(token)
+        except Exception as e:
+            print(f"Error in {self.label}: {str(e)}")
+            return self._fail(token)
+        return self._handle(token, data)
+
+    def run(self):
+        """Follow the chain in this thread, sleeping until each token is due."""
+        step = (None, 0.0)
+        while step is not None:
+            token, delay = step
+            if delay:
+                time.sleep(delay)
+            step = self._request(token)
+        return self.result()
+
+    def run_deferred(self, executor):
+        """
+        Follow the chain as one executor task per page; between pages no thread
+        is held. Returns a Future of (resorts, raw_result_count, incomplete).
+        """
+        future = Future()
+
+        def request(token):
+            step = self._request(token)
+            if step is None:
+                future.set_result(self.result())
+            else:
+                _scheduler.call_later(step[1], executor, request, step[0])
+
+        submit_with_context(executor, request, None)
+        return future
+
+    async def run_async(self):
+        """Follow the chain with an awaitable fetch, yielding to other chains between pages."""
+        step = (None, 0.0)
+        while step is not None:
+            token, delay = step
+            if delay:
+                await asyncio.sleep(delay)
+            self._sent = time.monotonic()
+            try:
+                data = await self.fetch(token)
+            except Exception as e:
+                print(f"Error in {self.label}: {str(e)}")
+                self._fail(token)
+                break
+            step = self._handle(token, data)
+        return self.result()
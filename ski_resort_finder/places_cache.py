@@ -0,0 +1,241 @@
+"""
+Places Cache
+Persistent, TTL-aware cache for Google Geocoding and Places API responses.
+
+Responses are stored in a SQLite database on local disk so that every worker
+process on the same host (gunicorn workers, warm Vercel instances) shares the
+same cache. Entries are keyed by the normalized endpoint and request
+parameters, expire according to a per-endpoint TTL and are evicted
+least-recently-used once the cache grows past its size bound.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+# Time-to-live for each endpoint, in seconds
+DEFAULT_TTLS = {
+    "geocode": 30 * 24 * 3600,           # Geocoding results practically never change
+    "place/nearbysearch": 24 * 3600,     # New places show up, ratings drift
+    "place/details": 30 * 24 * 3600,     # Only fetched for final results; websites rarely change
+}
+DEFAULT_TTL = 24 * 3600
+
+# Parameters that never take part in the cache key
+IGNORED_PARAMS = ("key",)
+
+# Statuses worth caching; errors and quota failures are always retried
+CACHEABLE_STATUSES = ("OK", "ZERO_RESULTS")
+
+
+def default_cache_dir():
+    """
+    Directory used for all on-disk caches.
+    Can be overridden with SKI_RESORT_CACHE_DIR; defaults to the system temp
+    directory, which is the only writable location on Vercel.
+    """
+    path = os.getenv("SKI_RESORT_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "ski_resort_finder")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def endpoint_from_url(url):
+    """
+    Reduce a Google Maps API URL to its endpoint name,
+    e.g. ".../maps/api/place/nearbysearch/json" -> "place/nearbysearch"
+    """
+    path = url.split("?", 1)[0].rstrip("/")
+    if "/maps/api/" in path:
+        path = path.split("/maps/api/", 1)[1]
+    if path.endswith("/json"):
+        path = path[:-len("/json")]
+    return path.strip("/")
+
+
+def _normalize_value(name, value):
+    if name == "location" and isinstance(value, str) and "," in value:
+        # Round coordinates to ~10 m so tiny float differences share an entry
+        try:
+            lat, lng = (float(part) for part in value.split(","))
+            return f"{lat:.4f},{lng:.4f}"
+        except ValueError:
+            pass
+    if isinstance(value, float):
+        return f"{value:.6f}"
+    value = str(value).strip()
+    if name in ("address", "keyword", "query"):
+        value = " ".join(value.lower().split())
+    return value
+
+
+def make_cache_key(endpoint, params):
+    """Build a stable cache key from an endpoint name and its request parameters."""
+    normalized = sorted(
+        (name, _normalize_value(name, value))
+        for name, value in (params or {}).items()
+        if name not in IGNORED_PARAMS and value is not None
+    )
+    return endpoint + "?" + "&".join(f"{name}={value}" for name, value in normalized)
+
+
+class PlacesCache:
+    """
+    SQLite-backed response cache shared across threads and processes.
+
+    Args:
+        path: Database file; defaults to places.sqlite3 in default_cache_dir()
+        ttls: Mapping of endpoint name to TTL in seconds
+        max_entries: Upper bound on stored responses before LRU eviction
+    """
+
+    def __init__(self, path=None, ttls=None, max_entries=50000):
+        self.path = path or os.path.join(default_cache_dir(), "places.sqlite3")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes_since_prune = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " endpoint TEXT NOT NULL,"
+                " body TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_endpoint ON responses (endpoint)")
+
+    def _connect(self):
+        # One connection per thread; SQLite handles cross-process locking
+        conn = getattr(self._local, "conn", None)
+        # A connection inherited through fork() (pre-fork workers) must not be used; open a new one
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def ttl_for(self, endpoint):
+        return self.ttls.get(endpoint, DEFAULT_TTL)
+
+    def get(self, endpoint, params):
+        """Return the cached JSON body for a request, or None if missing or expired."""
+        key = make_cache_key(endpoint, params)
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT body, expires_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] < now:
+            with self._lock:
+                self.misses += 1
+            return None
+        with conn:
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        with self._lock:
+            self.hits += 1
+        return json.loads(row[0])
+
+    def contains(self, endpoint, params):
+        """True if a fresh response is cached; unlike get() it is not counted as a hit or miss."""
+        row = self._connect().execute(
+            "SELECT 1 FROM responses WHERE key = ? AND expires_at >= ?", (make_cache_key(endpoint, params), time.time())
+        ).fetchone()
+        return row is not None
+
+    def set(self, endpoint, params, body, ttl=None):
+        """Store a JSON response body; non-cacheable statuses are ignored."""
+        if isinstance(body, dict) and body.get("status") not in (None,) + CACHEABLE_STATUSES:
+            return
+        key = make_cache_key(endpoint, params)
+        now = time.time()
+        ttl = self.ttl_for(endpoint) if ttl is None else ttl
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, body, created_at, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, json.dumps(body), now, now + ttl, now),
+            )
+        with self._lock:
+            self._writes_since_prune += 1
+            should_prune = self._writes_since_prune >= 100
+            if should_prune:
+                self._writes_since_prune = 0
+        if should_prune:
+            self.prune()
+
+    def prune(self):
+        """Drop expired entries and evict least-recently-used ones above max_entries."""
+        conn = self._connect()
+        with conn:
+            expired = conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),)).rowcount
+            count = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            overflow = count - self.max_entries
+            evicted = 0
+            if overflow > 0:
+                evicted = conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    " SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+                    (overflow,),
+                ).rowcount
+        with self._lock:
+            self.evictions += expired + evicted
+
+    def iter_responses(self, endpoint=None, include_expired=False):
+        """Yield (endpoint, body) for stored responses, optionally for one endpoint only."""
+        query = "SELECT endpoint, body FROM responses WHERE 1 = 1"
+        args = []
+        if endpoint:
+            query += " AND endpoint = ?"
+            args.append(endpoint)
+        if not include_expired:
+            query += " AND expires_at >= ?"
+            args.append(time.time())
+        for row_endpoint, body in self._connect().execute(query, args).fetchall():
+            yield row_endpoint, json.loads(body)
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        """Hit/miss counters for this process plus the current on-disk size."""
+        size = self._connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": size,
+                "max_entries": self.max_entries,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """Process-wide PlacesCache shared by every SkiResortFinder instance."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PlacesCache()
+        return _default_cache
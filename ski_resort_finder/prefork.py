@@ -0,0 +1,244 @@
+"""
+Pre-fork server
+Serves the app from N worker processes that share one copy of the models.
+
+Running api/index.py under N independent workers loads the
+SentenceTransformer and the spaCy pipeline N times. Here a master process
+imports the app, builds its SkiResortFinder and loads the models once,
+copies the catalog's vector index into shared memory and then forks the
+workers, which share all of it copy-on-write. Before forking the master
+calls gc.freeze(), so the workers' garbage collector never touches (and
+thereby copies) the pages holding the preloaded objects.
+
+Models are only loaded in the master, never run: OpenMP and ONNX Runtime
+thread pools do not survive fork(), so the first encode happens in each
+worker. Every worker serves the app with a threaded WSGI server on the
+listening socket inherited from the master, and the kernel spreads
+connections across them. The master replaces workers that die, stops all
+of them on SIGTERM/SIGINT and prints their memory use on SIGUSR1.
+
+Usage:
+    python ski_resort_finder/prefork.py [--workers 4] [--port 5000] [--app api/index.py]
+    python ski_resort_finder/prefork.py --no-preload   # each worker loads its own models, as before
+
+Per-process memory comes from /proc/<pid>/smaps_rollup (Linux): USS is the
+memory only that process uses, PSS splits shared pages among the processes
+sharing them, RSS counts every mapped page.
+"""
+import argparse
+import gc
+import importlib.util
+import os
+import signal
+import socket
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_APP = os.path.join(HERE, "..", "api", "index.py")
+# A worker that dies sooner than this after starting is restarted with a delay
+MIN_WORKER_LIFETIME = 1.0
+
+
+def load_app(path, attribute="app"):
+    """Import the module at path (e.g. api/index.py) and return (module, WSGI app)."""
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    spec = importlib.util.spec_from_file_location("prefork_app", os.path.abspath(path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module, getattr(module, attribute)
+
+
+def preload(module):
+    """Build the app's SkiResortFinder and load its models and vector index; returns the finder."""
+    get_finder = getattr(module, "get_ski_finder", None)
+    finder = get_finder() if get_finder else None
+    if finder is None:
+        print("Warning: no SkiResortFinder to preload (is the API key set?)")
+        return None
+    start = time.perf_counter()
+    finder.prewarm()
+    if finder.vector_index.share():
+        print(f"Vector index: {len(finder.vector_index.keys)} resorts in shared memory")
+    print(f"Preloaded models in {time.perf_counter() - start:.1f}s")
+    return finder
+
+
+def process_memory(pid):
+    """{"rss_mb", "pss_mb", "uss_mb"} of a process from /proc/<pid>/smaps_rollup, or None."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return None
+    return {
+        "rss_mb": fields.get("Rss", 0) / 1024,
+        "pss_mb": fields.get("Pss", 0) / 1024,
+        "uss_mb": (fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024,
+    }
+
+
+def memory_report(pids):
+    """Print USS/PSS/RSS per process and the total PSS (what the processes cost together)."""
+    total = 0.0
+    for label, pid in pids:
+        memory = process_memory(pid)
+        if memory is None:
+            continue
+        total += memory["pss_mb"]
+        print(f"{label:>8} {pid:>7}  USS {memory['uss_mb']:7.1f} MB  PSS {memory['pss_mb']:7.1f} MB  "
+              f"RSS {memory['rss_mb']:7.1f} MB")
+    print(f"   total PSS {total:.1f} MB")
+
+
+class PreforkServer:
+    """
+    Master process of a pre-fork server.
+
+    Args:
+        module: The imported app module (see load_app)
+        app: Its WSGI app
+        workers: Number of worker processes
+        host, port: Address to listen on
+        preload: Load the models in the master before forking; otherwise each worker loads its own
+        torch_threads: PyTorch intra-op threads per worker (0 = leave the default)
+        crawl: Start a RegionCrawler in every worker (they share the crawl through catalog leases)
+    """
+
+    def __init__(self, module, app, workers=2, host="127.0.0.1", port=5000, preload=True, torch_threads=0,
+                 crawl=False):
+        self.module = module
+        self.app = app
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.preload = preload
+        self.torch_threads = torch_threads
+        self.crawl = crawl
+        self.socket = None
+        self.children = {}
+        self.stopping = False
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return pid
+        try:
+            self._serve()
+        finally:
+            os._exit(0)
+
+    def _serve(self):
+        # Worker: the master handles Ctrl+C and sends SIGTERM to stop the workers
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+        gc.enable()
+        if not self.preload:
+            preload(self.module)
+        if self.torch_threads and "torch" in sys.modules:
+            sys.modules["torch"].set_num_threads(self.torch_threads)
+        if self.crawl:
+            from crawler import start_crawler
+            start_crawler(self.module.get_ski_finder())
+
+        from werkzeug.serving import make_server
+        server = make_server(self.host, self.port, self.app, threaded=True, fd=self.socket.fileno())
+        print(f"Worker {os.getpid()} serving on http://{self.host}:{self.port}")
+        server.serve_forever()
+
+    def report(self, *_):
+        memory_report([("master", os.getpid())] + [("worker", pid) for pid in sorted(self.children)])
+
+    def _stop(self, *_):
+        self.stopping = True
+
+    def run(self):
+        self.socket = socket.create_server((self.host, self.port), backlog=128)
+        if self.preload:
+            gc.collect()
+            # Everything allocated so far is left alone by the collector in master and workers
+            gc.freeze()
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGUSR1, self.report)
+        for _ in range(self.workers):
+            self._spawn()
+        print(f"Master {os.getpid()}: {self.workers} workers on http://{self.host}:{self.port}"
+              f" ({'models preloaded' if self.preload else 'models loaded per worker'})")
+
+        while not self.stopping:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            if not pid:
+                time.sleep(0.2)
+                continue
+            started = self.children.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            print(f"Warning: worker {pid} exited with status {status}; starting a new one")
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                time.sleep(MIN_WORKER_LIFETIME)
+            self._spawn()
+        self.shutdown()
+
+    def shutdown(self, timeout=10.0):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                self.children.pop(pid, None)
+        deadline = time.monotonic() + timeout
+        while self.children and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self.children.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        for pid in self.children:
+            os.kill(pid, signal.SIGKILL)
+        self.socket.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork server sharing preloaded models between workers")
+    parser.add_argument("--app", default=DEFAULT_APP, help="Python file defining the WSGI app")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SKI_RESORT_WORKERS", 2)))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 5000)))
+    parser.add_argument("--no-preload", action="store_true", help="Load the models in each worker instead")
+    parser.add_argument("--torch-threads", type=int, default=0,
+                        help="PyTorch threads per worker (default: CPUs / workers)")
+    args = parser.parse_args()
+
+    threads = args.torch_threads or max(1, (os.cpu_count() or 1) // args.workers)
+    os.environ.setdefault("SKI_RESORT_ONNX_THREADS", str(threads))
+    # The app's background pre-warm and crawler threads would still be running at fork time;
+    # the workers start their own crawlers instead
+    os.environ.pop("SKI_RESORT_PREWARM", None)
+    crawl = os.environ.pop("SKI_RESORT_CRAWLER", "").lower() in ("1", "true", "yes")
+    if not args.no_preload:
+        # Objects created while loading are frozen anyway; skip collecting them meanwhile
+        gc.disable()
+
+    module, app = load_app(args.app)
+    if not args.no_preload:
+        preload(module)
+    PreforkServer(module, app, workers=args.workers, host=args.host, port=args.port,
+                  preload=not args.no_preload, torch_threads=threads, crawl=crawl).run()
+
+
+if __name__ == '__main__':
+    main()
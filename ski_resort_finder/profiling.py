@@ -0,0 +1,77 @@
+"""
+Profiling
+Sampled profiles of whole searches.
+
+Set SKI_RESORT_PROFILE_SAMPLE_RATE (e.g. 0.01 for 1% of searches) to write a
+profile of sampled searches to SKI_RESORT_PROFILE_DIR (default: profiles/
+in the cache directory). pyinstrument is used when it is installed, since it
+follows async code and writes a readable HTML report; otherwise cProfile
+writes a .prof file for pstats or snakeviz.
+"""
+import cProfile
+import os
+import random
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    from .places_cache import default_cache_dir
+except ImportError:
+    from places_cache import default_cache_dir
+
+
+def sample_rate():
+    try:
+        return float(os.getenv("SKI_RESORT_PROFILE_SAMPLE_RATE", "0"))
+    except ValueError:
+        return 0.0
+
+
+def profile_dir():
+    directory = os.getenv("SKI_RESORT_PROFILE_DIR") or os.path.join(default_cache_dir(), "profiles")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+@contextmanager
+def sampled_profile(name="search"):
+    """Profile the block for a sample_rate() share of calls; yields the output path or None."""
+    rate = sample_rate()
+    if rate <= 0 or random.random() >= rate:
+        yield None
+        return
+
+    stem = os.path.join(profile_dir(), f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}")
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        Profiler = None
+
+    if Profiler is not None:
+        profiler = Profiler(async_mode="enabled")
+        path = stem + ".html"
+        profiler.start()
+        try:
+            yield path
+        finally:
+            profiler.stop()
+            with open(path, "w") as f:
+                f.write(profiler.output_html())
+            print(f"Wrote search profile to {path}")
+        return
+
+    profiler = cProfile.Profile()
+    path = stem + ".prof"
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active on this thread (overlapping async searches)
+        yield None
+        return
+    try:
+        yield path
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"Wrote search profile to {path}")
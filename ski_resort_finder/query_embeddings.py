@@ -0,0 +1,109 @@
+"""
+Query Embeddings
+In-process LRU cache of query embeddings.
+
+get_top_matches used to encode the user query on every call, although
+popular phrasings ("ski resorts in vermont") come back again and again and
+the result cache only helps within its TTL. QueryEmbeddingCache keys
+L2-normalized vectors by the normalized query text (the same normalization
+as the result cache, see result_cache.normalize_query), so every phrasing
+that normalizes alike shares one vector. The query itself is what gets
+encoded, as on the uncached path, so a cased model sees the user's text.
+Batches encode all their misses in one call.
+
+Usage:
+    cache = QueryEmbeddingCache(max_entries=4096)
+    vector = cache.encode(model, "Ski resorts in Vermont")
+    matrix = cache.encode_many(model, queries)
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    from .result_cache import normalize_query
+    from .vector_index import normalize
+    from . import search_stats
+except ImportError:
+    from result_cache import normalize_query
+    from vector_index import normalize
+    import search_stats
+
+DEFAULT_MAX_ENTRIES = 4096
+
+
+class QueryEmbeddingCache:
+    """
+    Thread-safe LRU of normalized query -> normalized embedding.
+
+    Args:
+        max_entries: Vectors kept (a 768-dim vector is 3 KB)
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key):
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return vector
+
+    def _store(self, key, vector):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def encode(self, model, query):
+        """The normalized embedding of query, encoding it only on a cache miss."""
+        key = normalize_query(query)
+        vector = self._lookup(key)
+        if vector is not None:
+            search_stats.incr("query_embedding_hits")
+            return vector
+        vector = normalize(model.encode(query))
+        # Callers share the cached array; keep them from changing it in place
+        vector.setflags(write=False)
+        search_stats.incr("query_encodes")
+        self._store(key, vector)
+        return vector
+
+    def encode_many(self, model, queries):
+        """Normalized embeddings of queries as a matrix; all misses are encoded in one call."""
+        keys = [normalize_query(query) for query in queries]
+        vectors = {}
+        texts = {}
+        for key, query in zip(keys, queries):
+            if key not in vectors:
+                vectors[key] = self._lookup(key)
+                texts[key] = query
+        missing = [key for key, vector in vectors.items() if vector is None]
+        search_stats.incr("query_embedding_hits", len(vectors) - len(missing))
+        if missing:
+            # The first phrasing of each missing key is encoded, as it was written
+            encoded = normalize(model.encode([texts[key] for key in missing], batch_size=64,
+                                             convert_to_numpy=True, show_progress_bar=False))
+            search_stats.incr("query_encodes", len(missing))
+            for key, vector in zip(missing, encoded):
+                vector = vector.copy()
+                vector.setflags(write=False)
+                vectors[key] = vector
+                self._store(key, vector)
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([vectors[key] for key in keys])
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
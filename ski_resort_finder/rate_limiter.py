@@ -0,0 +1,249 @@
+"""
+Rate Limiter
+Quota-aware token buckets for outbound Google Maps API calls.
+
+Every GoogleMapsClient request takes a token from its endpoint's bucket
+before going out, however many searches (and worker thread pools) are
+running, so traffic stays under the per-endpoint QPS limits instead of
+running into OVER_QUERY_LIMIT. Buckets live in the process by default; with
+SKI_RESORT_RATE_LIMIT_SHARED=1 they live in a SQLite file in the cache
+directory and every worker process on the host draws from the same ones.
+Coroutines wait with acquire_async(), which sleeps on the event loop
+instead of blocking a thread.
+
+Interactive searches go first: a batch caller only takes a token when no
+interactive caller is waiting for the same endpoint. A caller that cannot
+get a token within the queue timeout is rejected and the request treated
+as failed, so the search degrades to cached or partial results.
+
+Configuration:
+    SKI_RESORT_GOOGLE_QPS="geocode=50,place/nearbysearch=50,place/details=50"
+        (0 disables the limit for an endpoint)
+    SKI_RESORT_RATE_LIMIT_TIMEOUT=10   longest queue wait in seconds
+    SKI_RESORT_RATE_LIMIT_SHARED=1     share buckets across processes
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    from .places_cache import default_cache_dir
+    from .search_stats import INTERACTIVE
+    from . import metrics
+except ImportError:
+    from places_cache import default_cache_dir
+    from search_stats import INTERACTIVE
+    import metrics
+
+DEFAULT_QPS = {
+    "geocode": 50.0,
+    "place/nearbysearch": 50.0,
+    "place/details": 50.0,
+}
+DEFAULT_QUEUE_TIMEOUT = 10.0
+# How often a batch caller held back by interactive ones looks again
+PRIORITY_POLL_SECONDS = 0.05
+
+
+class TokenBucket:
+    """In-process token bucket refilled at rate tokens/s up to burst tokens."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """(True, 0) if a token was taken, else (False, seconds until the next token)."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True, 0.0
+            return False, (1 - self._tokens) / self.rate
+
+
+class SharedTokenBucket:
+    """
+    Token bucket stored in SQLite, so every process on the host shares it.
+    Each attempt is one short BEGIN IMMEDIATE transaction.
+    """
+
+    def __init__(self, name, rate, burst=None, path=None):
+        self.name = name
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self.path = path or os.path.join(default_cache_dir(), "rate_limit.sqlite3")
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def try_acquire(self):
+        conn = self._connect()
+        # Wall clock, since monotonic clocks are not comparable across processes
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)).fetchone()
+            tokens, updated = row if row else (self.burst, now)
+            tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+            acquired = tokens >= 1
+            if acquired:
+                tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)", (self.name, tokens, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return (True, 0.0) if acquired else (False, (1 - tokens) / self.rate)
+
+
+class RateLimiter:
+    """
+    Per-endpoint token buckets with interactive-over-batch priority.
+
+    Args:
+        qps: Mapping of endpoint to requests per second; endpoints not listed (or 0) are unlimited
+        queue_timeout: Longest a caller waits for a token before being rejected
+        shared: Keep the buckets in SQLite so all processes on the host share them
+        path: SQLite file for shared buckets
+    """
+
+    def __init__(self, qps=None, queue_timeout=DEFAULT_QUEUE_TIMEOUT, shared=False, path=None):
+        self.qps = dict(DEFAULT_QPS if qps is None else qps)
+        self.queue_timeout = queue_timeout
+        self.shared = shared
+        self.buckets = {
+            endpoint: SharedTokenBucket(endpoint, rate, path=path) if shared else TokenBucket(rate)
+            for endpoint, rate in self.qps.items() if rate > 0
+        }
+        self._waiting = {}
+        self._cond = threading.Condition()
+
+    def _interactive_waiting(self, endpoint):
+        return self._waiting.get((endpoint, INTERACTIVE), 0) > 0
+
+    def _try_acquire(self, bucket, endpoint, priority):
+        """(True, 0) if a token was taken, else (False, seconds to wait before trying again)."""
+        with self._cond:
+            if priority != INTERACTIVE and self._interactive_waiting(endpoint):
+                return False, PRIORITY_POLL_SECONDS
+        return bucket.try_acquire()
+
+    def _enter(self, key):
+        with self._cond:
+            self._waiting[key] = self._waiting.get(key, 0) + 1
+
+    def _leave(self, key):
+        with self._cond:
+            self._waiting[key] -= 1
+            # Batch callers held back by this one may go now
+            self._cond.notify_all()
+
+    def acquire(self, endpoint, priority=INTERACTIVE, timeout=None):
+        """
+        Block until a token for endpoint is available. Returns the seconds waited,
+        or None if the caller was rejected after timeout (default queue_timeout).
+        """
+        bucket = self.buckets.get(endpoint)
+        if bucket is None:
+            return 0.0
+        timeout = self.queue_timeout if timeout is None else timeout
+        start = time.monotonic()
+        key = (endpoint, priority)
+        self._enter(key)
+        try:
+            while True:
+                acquired, wait = self._try_acquire(bucket, endpoint, priority)
+                if acquired:
+                    waited = time.monotonic() - start
+                    metrics.observe_rate_limit_wait(endpoint, priority, waited)
+                    return waited
+                remaining = start + timeout - time.monotonic()
+                if remaining <= 0:
+                    metrics.count_rate_limit_rejection(endpoint, priority)
+                    return None
+                with self._cond:
+                    self._cond.wait(min(wait, remaining))
+        finally:
+            self._leave(key)
+
+    async def acquire_async(self, endpoint, priority=INTERACTIVE, timeout=None):
+        """
+        acquire() for coroutines: waits with asyncio.sleep instead of blocking a thread.
+        Shared buckets are tried in a worker thread, since each try is a SQLite transaction.
+        """
+        bucket = self.buckets.get(endpoint)
+        if bucket is None:
+            return 0.0
+        timeout = self.queue_timeout if timeout is None else timeout
+        start = time.monotonic()
+        key = (endpoint, priority)
+        self._enter(key)
+        try:
+            while True:
+                if self.shared:
+                    acquired, wait = await asyncio.to_thread(self._try_acquire, bucket, endpoint, priority)
+                else:
+                    acquired, wait = self._try_acquire(bucket, endpoint, priority)
+                if acquired:
+                    waited = time.monotonic() - start
+                    metrics.observe_rate_limit_wait(endpoint, priority, waited)
+                    return waited
+                remaining = start + timeout - time.monotonic()
+                if remaining <= 0:
+                    metrics.count_rate_limit_rejection(endpoint, priority)
+                    return None
+                await asyncio.sleep(min(wait, remaining))
+        finally:
+            self._leave(key)
+
+
+def parse_qps(value):
+    """'geocode=50,place/details=20' -> {"geocode": 50.0, "place/details": 20.0}, over DEFAULT_QPS."""
+    qps = dict(DEFAULT_QPS)
+    for item in (value or "").split(","):
+        if "=" not in item:
+            continue
+        endpoint, rate = item.split("=", 1)
+        try:
+            qps[endpoint.strip()] = float(rate)
+        except ValueError:
+            print(f"Warning: ignoring invalid rate {item!r} in SKI_RESORT_GOOGLE_QPS")
+    return qps
+
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_default_limiter():
+    """Process-wide limiter configured from the environment."""
+    global _default_limiter
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            try:
+                timeout = float(os.getenv("SKI_RESORT_RATE_LIMIT_TIMEOUT", DEFAULT_QUEUE_TIMEOUT))
+            except ValueError:
+                timeout = DEFAULT_QUEUE_TIMEOUT
+            _default_limiter = RateLimiter(
+                parse_qps(os.getenv("SKI_RESORT_GOOGLE_QPS")),
+                queue_timeout=timeout,
+                shared=os.getenv("SKI_RESORT_RATE_LIMIT_SHARED", "").lower() in ("1", "true", "yes"),
+            )
+        return _default_limiter
@@ -0,0 +1,344 @@
+"""
+Resort Catalog
+Local catalog of ski resorts with a spatial index for radius queries.
+
+Every Nearby Search result the finders see is upserted here (name, address,
+lat/lng, rating, place_id, website), together with the regions that were
+fully searched. When a query's search disk lies inside a fresh covered
+region, find_best_ski_resorts answers from the catalog with one vectorized
+NumPy haversine pass over in-memory coordinate columns (geo.py; about a
+millisecond for tens of thousands of resorts, with no index to build or
+library to import on the first query) and never calls Google; stale or uncovered regions still go to the Places API.
+Searched centres are counted as well, so the background crawler
+(crawler.py) knows which regions are popular; the counts are kept in memory
+and flushed every QUERY_FLUSH_INTERVAL seconds by a daemon thread, so a
+search never waits for a SQLite write.
+
+The catalog lives in SQLite next to the other caches, so all worker
+processes share it. Build or refresh it from cached Places responses with:
+    python resort_catalog.py import
+"""
+import atexit
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+try:
+    from .places_cache import default_cache_dir, get_default_cache
+    from .geo import within_distance
+except ImportError:
+    from places_cache import default_cache_dir, get_default_cache
+    from geo import within_distance
+
+EARTH_RADIUS_KM = 6371.0088
+# How long a searched region is trusted before going back to Google
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+# Searched centres are counted in memory and written to SQLite this often
+QUERY_FLUSH_INTERVAL = 30
+
+
+def _haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class ResortCatalog:
+    """
+    SQLite-backed resort catalog with in-memory coordinate columns.
+
+    Args:
+        path: Database file; defaults to catalog.sqlite3 in default_cache_dir()
+        max_age: Seconds a covered region stays fresh
+    """
+
+    def __init__(self, path=None, max_age=DEFAULT_MAX_AGE):
+        self.path = path or os.path.join(default_cache_dir(), "catalog.sqlite3")
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._loaded_version = None
+        self._coords = None
+        self._rows = []
+        # (lat, lng) -> [searches, last seen] not yet written to the queries table
+        self._pending_queries = {}
+        self._queries_lock = threading.Lock()
+        self._flusher_pid = None
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS resorts ("
+                " place_id TEXT PRIMARY KEY,"
+                " name TEXT NOT NULL,"
+                " address TEXT,"
+                " lat REAL NOT NULL,"
+                " lng REAL NOT NULL,"
+                " rating REAL,"
+                " website TEXT,"
+                " updated_at REAL NOT NULL)"
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(coverage)")]
+            if columns and "keyword" not in columns:
+                # Coverage recorded before it was keyed by keyword cannot be attributed to a finder
+                conn.execute("DROP TABLE coverage")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS coverage ("
+                " lat REAL NOT NULL,"
+                " lng REAL NOT NULL,"
+                " radius_km REAL NOT NULL,"
+                " keyword TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (lat, lng, radius_km, keyword))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS queries ("
+                " lat REAL NOT NULL,"
+                " lng REAL NOT NULL,"
+                " count INTEGER NOT NULL,"
+                " last_seen REAL NOT NULL,"
+                " PRIMARY KEY (lat, lng))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                " name TEXT PRIMARY KEY,"
+                " expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _version(self):
+        return self._connect().execute("SELECT COUNT(*), MAX(updated_at) FROM resorts").fetchone()
+
+    def _ensure_index(self):
+        """(Re)load the rows and coordinate columns when this or another process changed the catalog."""
+        version = self._version()
+        with self._lock:
+            if version == self._loaded_version:
+                return self._coords, self._rows
+            rows = self._connect().execute(
+                "SELECT place_id, name, address, lat, lng, rating, website FROM resorts"
+            ).fetchall()
+            coords = None
+            if rows:
+                coords = (np.array([row[3] for row in rows], dtype=np.float64),
+                          np.array([row[4] for row in rows], dtype=np.float64))
+            self._coords, self._rows, self._loaded_version = coords, rows, version
+            return coords, rows
+
+    def upsert_places(self, places):
+        """
+        Store Nearby Search / Place Details results (Google's place format).
+        Rows only change (and updated_at, the in-memory columns' version, only moves) when
+        a place's data does, so re-reading cached pages does not rebuild the index.
+        """
+        now = time.time()
+        records = []
+        for place in places:
+            location = (place.get("geometry") or {}).get("location") or {}
+            if not place.get("place_id") or not place.get("name") or "lat" not in location:
+                continue
+            records.append((
+                place["place_id"], place["name"],
+                place.get("vicinity") or place.get("formatted_address") or "",
+                location["lat"], location["lng"], place.get("rating"), place.get("website"), now,
+            ))
+        if not records:
+            return 0
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO resorts (place_id, name, address, lat, lng, rating, website, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(place_id) DO UPDATE SET"
+                " name = excluded.name,"
+                " address = COALESCE(NULLIF(resorts.address, ''), excluded.address),"
+                " lat = excluded.lat, lng = excluded.lng,"
+                " rating = COALESCE(excluded.rating, resorts.rating),"
+                " website = COALESCE(excluded.website, resorts.website),"
+                " updated_at = excluded.updated_at"
+                " WHERE resorts.name IS NOT excluded.name"
+                " OR resorts.lat IS NOT excluded.lat OR resorts.lng IS NOT excluded.lng"
+                " OR (COALESCE(resorts.address, '') = '' AND excluded.address != '')"
+                " OR (excluded.rating IS NOT NULL AND excluded.rating IS NOT resorts.rating)"
+                " OR (excluded.website IS NOT NULL AND excluded.website IS NOT resorts.website)",
+                records,
+            )
+        return len(records)
+
+    def record_coverage(self, lat, lng, radius_km, keyword="", fetched_at=None):
+        """
+        Remember that every resort within radius_km of (lat, lng) that a Nearby Search
+        with keyword finds is in the catalog.
+        """
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO coverage (lat, lng, radius_km, keyword, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (round(lat, 4), round(lng, 4), radius_km, keyword, fetched_at or time.time()),
+            )
+
+    def coverage_age(self, lat, lng, radius_km, keyword=""):
+        """
+        Age in seconds of the freshest region searched with keyword that contains
+        the whole radius_km disk around (lat, lng), or None if no region contains it.
+        """
+        best = None
+        now = time.time()
+        for c_lat, c_lng, c_radius, fetched_at in self._connect().execute(
+            "SELECT lat, lng, radius_km, fetched_at FROM coverage WHERE radius_km >= ? AND keyword = ?",
+            (radius_km, keyword),
+        ):
+            # Allow ~1 km of slack so geocoder jitter does not defeat the catalog
+            if _haversine_km(lat, lng, c_lat, c_lng) + radius_km <= c_radius + 1.0:
+                age = now - fetched_at
+                best = age if best is None else min(best, age)
+        return best
+
+    def is_covered(self, lat, lng, radius_km, max_age=None, keyword=""):
+        age = self.coverage_age(lat, lng, radius_km, keyword=keyword)
+        return age is not None and age <= (self.max_age if max_age is None else max_age)
+
+    def record_query(self, lat, lng):
+        """Count a search centred on (lat, lng), for popular_regions(); in memory until the next flush."""
+        key = (round(lat, 2), round(lng, 2))
+        with self._queries_lock:
+            if self._flusher_pid != os.getpid():
+                # First count in this process (or a forked child): counts copied from the parent are not ours
+                self._pending_queries = {}
+                self._flusher_pid = os.getpid()
+                threading.Thread(target=self._flush_loop, name="catalog-query-flush", daemon=True).start()
+                atexit.register(self.flush_queries)
+            entry = self._pending_queries.setdefault(key, [0, 0.0])
+            entry[0] += 1
+            entry[1] = time.time()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(QUERY_FLUSH_INTERVAL)
+            self.flush_queries()
+
+    def flush_queries(self):
+        """Write the searches counted since the last flush; returns how many centres were written."""
+        with self._queries_lock:
+            pending, self._pending_queries = self._pending_queries, {}
+        if not pending:
+            return 0
+        try:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO queries (lat, lng, count, last_seen) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(lat, lng) DO UPDATE SET count = count + excluded.count,"
+                    " last_seen = MAX(last_seen, excluded.last_seen)",
+                    [(lat, lng, count, last_seen) for (lat, lng), (count, last_seen) in pending.items()],
+                )
+        except sqlite3.Error as e:
+            # Popularity is only a hint for the crawler; drop the counts rather than fail
+            print(f"Warning: could not record searched regions: {str(e)}")
+            return 0
+        return len(pending)
+
+    def popular_regions(self, limit=20, since=None):
+        """The limit most searched (lat, lng) centres, most searched first, optionally only those seen since then."""
+        # This process's own recent searches count too
+        self.flush_queries()
+        return [
+            (lat, lng) for lat, lng in self._connect().execute(
+                "SELECT lat, lng FROM queries WHERE last_seen >= ? ORDER BY count DESC LIMIT ?",
+                (since or 0, limit),
+            )
+        ]
+
+    def try_lease(self, name, seconds):
+        """
+        Take the named lease for seconds unless another holder's lease is still
+        running; lets one of several processes claim a job such as a crawl.
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            claimed = conn.execute(
+                "INSERT INTO leases (name, expires_at) VALUES (?, ?)"
+                " ON CONFLICT(name) DO UPDATE SET expires_at = excluded.expires_at"
+                " WHERE leases.expires_at < ?",
+                (name, now + seconds, now),
+            ).rowcount
+        return claimed > 0
+
+    def release_lease(self, name):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM leases WHERE name = ?", (name,))
+
+    def query_radius(self, lat, lng, radius_km):
+        """Places (Google's place format) within radius_km of (lat, lng), nearest first."""
+        coords, rows = self._ensure_index()
+        if coords is None:
+            return []
+        indices, distances = within_distance(lat, lng, coords[0], coords[1], radius_km)
+        order = np.argsort(distances, kind="stable")
+        return [
+            {
+                "place_id": rows[i][0],
+                "name": rows[i][1],
+                "vicinity": rows[i][2],
+                "geometry": {"location": {"lat": rows[i][3], "lng": rows[i][4]}},
+                "rating": rows[i][5] or 0,
+                "website": rows[i][6] or "",
+                "distance": float(d),
+            }
+            for i, d in zip(indices[order], distances[order])
+        ]
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM resorts").fetchone()[0]
+
+
+def import_from_cache(catalog, cache=None):
+    """Upsert every place found in cached Nearby Search and Place Details responses."""
+    cache = cache or get_default_cache()
+    count = 0
+    for _, body in cache.iter_responses("place/nearbysearch"):
+        count += catalog.upsert_places(body.get("results", []))
+    for _, body in cache.iter_responses("place/details"):
+        if body.get("result"):
+            count += catalog.upsert_places([body["result"]])
+    return count
+
+
+_default_catalog = None
+_default_catalog_lock = threading.Lock()
+
+
+def get_default_catalog():
+    """Process-wide ResortCatalog shared by every SkiResortFinder instance."""
+    global _default_catalog
+    with _default_catalog_lock:
+        if _default_catalog is None:
+            _default_catalog = ResortCatalog()
+        return _default_catalog
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage the local ski resort catalog")
+    parser.add_argument("command", choices=["import", "stats"])
+    args = parser.parse_args()
+
+    catalog = get_default_catalog()
+    if args.command == "import":
+        start = time.time()
+        imported = import_from_cache(catalog)
+        print(f"Imported {imported} places from the Places cache in {time.time() - start:.1f}s")
+    print(f"Catalog {catalog.path}: {len(catalog)} resorts")
@@ -0,0 +1,184 @@
+"""
+Result Cache
+Whole-query result cache with single-flight request coalescing.
+
+/api/search results are cached under the normalized query text in an
+in-process LRU with a TTL, optionally backed by the shared PlacesCache
+database so every worker process on the host sees them. Concurrent
+identical queries that miss the cache are coalesced: the first one runs
+the search and the others wait for its result instead of starting their
+own grid search.
+
+Flask runs each async view in its own event loop, so in-flight searches
+are tracked with concurrent.futures.Future objects, which can be awaited
+from any loop via asyncio.wrap_future.
+"""
+import asyncio
+import re
+import string
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+try:
+    from .search_stats import incr
+except ImportError:
+    from search_stats import incr
+
+RESULT_ENDPOINT = "search/results"
+DEFAULT_RESULT_TTL = 3600
+
+
+def normalize_query(query):
+    """Lower-case, collapse whitespace and drop surrounding punctuation."""
+    return re.sub(r"\s+", " ", query.lower()).strip(string.whitespace + string.punctuation)
+
+
+class ResultCache:
+    """
+    LRU + TTL cache of search results keyed by normalized query.
+
+    Args:
+        namespace: Distinguishes finders sharing one disk cache (their results differ)
+        max_entries: In-process LRU bound
+        ttl: Seconds a result stays fresh
+        disk_cache: Optional PlacesCache used as a shared second level
+    """
+
+    def __init__(self, namespace="default", max_entries=1024, ttl=DEFAULT_RESULT_TTL, disk_cache=None):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_cache = disk_cache
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _disk_params(self, key):
+        return {"namespace": self.namespace, "query": key}
+
+    def get(self, query):
+        """Cached result for a query, or None."""
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                value = entry[1]
+            else:
+                value = None
+        if value is not None:
+            incr("result_cache.hits")
+            return value
+        if self.disk_cache is not None:
+            value = self.disk_cache.get(RESULT_ENDPOINT, self._disk_params(key))
+            if value is not None:
+                self._store(key, value, write_disk=False)
+                with self._lock:
+                    self.disk_hits += 1
+                incr("result_cache.disk_hits")
+                return value
+        return None
+
+    def _store(self, key, value, write_disk=True):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if write_disk and self.disk_cache is not None:
+            self.disk_cache.set(RESULT_ENDPOINT, self._disk_params(key), value, ttl=self.ttl)
+
+    def set(self, query, value):
+        # Empty results are not cached; they are often transient upstream failures
+        if value:
+            self._store(normalize_query(query), value)
+
+    def _join(self, key):
+        """(future, is_leader): the in-flight computation for key, creating it if there is none."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                # A leader finished between our cache lookup and now
+                self.hits += 1
+                future = Future()
+                future.set_result(entry[1])
+                return future, False
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            self.misses += 1
+            future = self._in_flight[key] = Future()
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._in_flight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def get_or_compute(self, query, compute):
+        """Cached result, else compute() run once for all concurrent callers with this query."""
+        value = self.get(query)
+        if value is not None:
+            return value
+        key = normalize_query(query)
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            value = compute()
+        except Exception as e:
+            self._finish(key, future, error=e)
+            raise
+        self.set(query, value)
+        self._finish(key, future, value)
+        return value
+
+    async def get_or_compute_async(self, query, compute):
+        """get_or_compute with an async compute(); waiters may be on other event loops."""
+        value = self.get(query)
+        if value is not None:
+            return value
+        key = normalize_query(query)
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            value = await compute()
+        except BaseException as e:
+            # Includes cancellation, so waiters are never left hanging
+            self._finish(key, future, error=e)
+            raise
+        self.set(query, value)
+        self._finish(key, future, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "in_flight": len(self._in_flight),
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+            }
@@ -0,0 +1,175 @@
+"""
+Search Stats
+Per-search counters and stage timings carried through a request via contextvars.
+
+find_best_ski_resorts opens a SearchStats with track_search(); any code
+running in the same context (including worker threads started with
+submit_with_context) can then call incr() or time a stage with @timed
+without the stats object being threaded through every method signature.
+When the outermost search finishes its stats are added to the process-wide
+metrics, and a sampled share of searches is profiled.
+"""
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from . import metrics
+    from .profiling import sampled_profile
+except ImportError:
+    import metrics
+    from profiling import sampled_profile
+
+_current_stats = contextvars.ContextVar("search_stats", default=None)
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+# Outbound Google calls one search may make; cached responses are free
+DEFAULT_SEARCH_BUDGET = 150
+
+
+def default_budget():
+    """Per-search Google call budget from SKI_RESORT_SEARCH_BUDGET (0 = unlimited)."""
+    try:
+        budget = int(os.getenv("SKI_RESORT_SEARCH_BUDGET", DEFAULT_SEARCH_BUDGET))
+    except ValueError:
+        budget = DEFAULT_SEARCH_BUDGET
+    return budget or None
+
+
+class SearchStats:
+    """
+    Thread-safe counters for a single search request.
+
+    Args:
+        budget: Outbound Google calls the search may make (None = unlimited)
+        priority: INTERACTIVE or BATCH, for the Google rate limiter
+    """
+
+    def __init__(self, budget=None, priority=INTERACTIVE):
+        self.counters = {}
+        # Seconds per stage, summed over calls (concurrent calls can exceed wall time)
+        self.timings = {}
+        self.total_seconds = None
+        self.budget = budget
+        self.priority = priority
+        self.spent = 0
+        self._lock = threading.Lock()
+
+    def spend(self):
+        """Take one call from the budget; False once it is used up."""
+        with self._lock:
+            if self.budget is not None and self.spent >= self.budget:
+                return False
+            self.spent += 1
+            return True
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def get(self, name, default=0):
+        with self._lock:
+            return self.counters.get(name, default)
+
+    def add_time(self, stage, seconds):
+        with self._lock:
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def as_dict(self):
+        with self._lock:
+            return dict(self.counters)
+
+    def timings_dict(self):
+        with self._lock:
+            return dict(self.timings)
+
+
+def current_stats():
+    """The SearchStats of the search running in this context, or None."""
+    return _current_stats.get()
+
+
+def incr(name, amount=1):
+    """Increment a counter on the current search, if there is one."""
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.incr(name, amount)
+
+
+def current_priority():
+    stats = _current_stats.get()
+    return stats.priority if stats is not None else INTERACTIVE
+
+
+def spend_budget():
+    """Take one Google call from the current search's budget; True outside a search."""
+    stats = _current_stats.get()
+    return stats is None or stats.spend()
+
+
+def add_time(stage, seconds):
+    """Add time to a stage of the current search, if there is one."""
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.add_time(stage, seconds)
+
+
+def timed(stage):
+    """Decorator recording a function's (or coroutine's) wall time as a stage of the current search."""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    add_time(stage, time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                add_time(stage, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def track_search(budget=None, priority=INTERACTIVE, searches=1):
+    """
+    Open a SearchStats for the duration of a search, with a Google call budget
+    (default_budget() per search if None; a batch counts as searches searches)
+    and a rate limiter priority.
+    Nested calls (e.g. an endpoint wrapping find_best_ski_resorts) share the outer one.
+    """
+    stats = _current_stats.get()
+    if stats is not None:
+        yield stats
+        return
+    if budget is None:
+        budget = default_budget()
+        budget = budget * max(searches, 1) if budget else None
+    stats = SearchStats(budget=budget, priority=priority)
+    token = _current_stats.set(stats)
+    start = time.perf_counter()
+    try:
+        with sampled_profile():
+            yield stats
+    finally:
+        _current_stats.reset(token)
+        stats.total_seconds = time.perf_counter() - start
+        metrics.observe_search(stats)
+
+
+def submit_with_context(executor, fn, *args):
+    """executor.submit that runs fn in a copy of the caller's context, so incr() still works."""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
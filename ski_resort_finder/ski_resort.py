@@ -1,68 +1,177 @@
-import requests
 from dotenv import load_dotenv
 import os
-import time
-import spacy
-from sentence_transformers import SentenceTransformer
+import asyncio
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from geopy.distance import geodesic
-from functools import lru_cache
 from concurrent.futures import ThreadPoolExecutor
 
+try:
+    from .places_cache import get_default_cache, endpoint_from_url
+    from .google_client import get_default_client
+    from .embedding_store import EmbeddingStore, resort_key, resort_text
+    from .vector_index import VectorIndex, normalize, top_k
+    from .lazy_models import sentence_model, embedding_space, spacy_model, prewarm
+    from .location_extractor import LocationExtractor, default_gazetteer
+    from .coverage import CoveragePlanner
+    from .candidates import CandidateBatch
+    from .dedup import SeenPlaces, report as report_duplicates
+    from .pagination import PageChain
+    from .query_embeddings import QueryEmbeddingCache
+    from .lexical import bm25_scores, hybrid_scores, shortlist
+    from .resort_catalog import get_default_catalog
+    from .search_stats import track_search, submit_with_context, timed
+    from . import search_stats
+except ImportError:
+    from places_cache import get_default_cache, endpoint_from_url
+    from google_client import get_default_client
+    from embedding_store import EmbeddingStore, resort_key, resort_text
+    from vector_index import VectorIndex, normalize, top_k
+    from lazy_models import sentence_model, embedding_space, spacy_model, prewarm
+    from location_extractor import LocationExtractor, default_gazetteer
+    from coverage import CoveragePlanner
+    from candidates import CandidateBatch
+    from dedup import SeenPlaces, report as report_duplicates
+    from pagination import PageChain
+    from query_embeddings import QueryEmbeddingCache
+    from lexical import bm25_scores, hybrid_scores, shortlist
+    from resort_catalog import get_default_catalog
+    from search_stats import track_search, submit_with_context, timed
+    import search_stats
+
+# Known major ski resorts by state
+KNOWN_RESORTS = {
+    'massachusetts': [
+        'Wachusett Mountain',
+        'Berkshire East',
+        'Jiminy Peak',
+        'Nashoba Valley',
+        'Blandford Ski Area'
+    ],
+    'vermont': [
+        'Killington Resort',
+        'Stowe Mountain Resort',
+        'Mount Snow',
+        'Sugarbush Resort',
+        'Okemo Mountain Resort'
+    ],
+    'new hampshire': [
+        'Loon Mountain',
+        'Waterville Valley',
+        'Bretton Woods',
+        'Cannon Mountain',
+        'Mount Sunapee'
+    ],
+    'maine': [
+        'Sunday River',
+        'Sugarloaf',
+        'Saddleback Mountain',
+        'Shawnee Peak',
+        'Mount Abram'
+    ]
+}
+
+# Resort names and nicknames that place a query in a state
+RESORT_ALIASES = {
+    'berkshire': 'massachusetts', 'wachusett': 'massachusetts',
+    'killington': 'vermont', 'stowe': 'vermont',
+    'loon': 'new hampshire', 'waterville': 'new hampshire',
+    'sunday river': 'maine', 'sugarloaf': 'maine',
+}
+
+
+def resort_location_aliases():
+    """Gazetteer entries mapping every known resort name and alias to its state."""
+    aliases = {name.lower(): state for state, names in KNOWN_RESORTS.items() for name in names}
+    aliases.update(RESORT_ALIASES)
+    return aliases
+
+
+def known_resort_records(state, lat=None, lng=None):
+    """Resort dicts for the hard-coded resorts of a state, placed at the given coordinates."""
+    return [
+        {
+            "name": resort_name,
+            "address": f"{resort_name}, {state.title()}",
+            "rating": 4.5,  # Default rating for known resorts
+            "lat": lat,
+            "lng": lng,
+            "place_id": None
+        }
+        for resort_name in KNOWN_RESORTS.get(state, [])
+    ]
+
 class SkiResortFinder:
-    def __init__(self, api_key, model_name='paraphrase-distilroberta-base-v1', max_distance_km=100):
+    def __init__(self, api_key, model_name='paraphrase-distilroberta-base-v1', max_distance_km=100, cache=None):
         load_dotenv()
         self.API_KEY = api_key
-        self.model = SentenceTransformer(model_name)
-        
-        # Use a smaller spaCy model that's easier to deploy
-        try:
-            self.nlp = spacy.load('en_core_web_sm')
-        except:
-            # If the model isn't available, download a small one
-            spacy.cli.download('en_core_web_sm')
-            self.nlp = spacy.load('en_core_web_sm')
-            
+        # Models load on first use (or prewarm()), so constructing a finder is cheap
+        self._model = sentence_model(model_name)
+        # Use a smaller spaCy model that's easier to deploy, downloading it if needed
+        self._nlp = spacy_model('en_core_web_sm', download=True, enable=('ner',))
+        # States, cities and resort names are matched without spaCy; it only sees the rest
+        self.location_extractor = LocationExtractor(self._nlp, default_gazetteer(resort_location_aliases()))
+
         self.max_distance_km = max_distance_km
+        # Haversine distances are within 0.5% of geodesic; set True to pay for exact ones
+        self.exact_distances = False
+        # Stop following page tokens once a search has this many candidates (e.g. 40 for the
+        # top 10); None follows every page. Regions searched this way are not recorded as covered.
+        self.enough_candidates = None
+        # Shared on-disk cache of Google API responses
+        self.cache = cache or get_default_cache()
+        # Worker threads per grid search; the shared HTTP connection pool is sized for at least this many
+        self.max_workers = 5
+        self.client = get_default_client(self.API_KEY, cache=self.cache, pool_size=self.max_workers)
+        # Persistent resort embeddings so known resorts are never re-encoded
+        self.embedding_store = EmbeddingStore(embedding_space(model_name))
+        # Prebuilt normalized matrix of catalog resorts (vector_index.py build), memory-mapped
+        self.vector_index = VectorIndex(embedding_space(model_name))
+        self.vector_index.load()
+        # Embeddings of recent queries by normalized text; None encodes every query
+        self.query_embeddings = QueryEmbeddingCache()
+        # Only embed and score the N best BM25 matches of a search's candidates (e.g. 200; see
+        # lexical.py); None scores every candidate semantically
+        self.lexical_prefilter = None
+        # Weight of the BM25 score in the hybrid ranking score; 0 ranks by cosine similarity only
+        self.lexical_weight = 0.0
+        # Nearby Search keyword; coverage and empty cells are recorded per keyword
+        self.nearby_keyword = "ski resort|mountain|ski area|ski hill"
+        # Adaptive Nearby Search coverage; replaces a fixed 5x5 grid of 50km circles
+        self.coverage_planner = CoveragePlanner(self.cache, search_radius_km=50, baseline_cells=25,
+                                                keyword=lambda: self.nearby_keyword)
+        # Local resort catalog answering searches in regions that were already crawled
+        self.catalog = get_default_catalog()
+        # RegionCrawler keeping popular regions crawled (crawler.py start_crawler); None disables
+        # serving expired catalog regions while they are refreshed
+        self.crawler = None
         
         # Known major ski resorts by state
-        self.known_resorts = {
-            'massachusetts': [
-                'Wachusett Mountain',
-                'Berkshire East',
-                'Jiminy Peak',
-                'Nashoba Valley',
-                'Blandford Ski Area'
-            ],
-            'vermont': [
-                'Killington Resort',
-                'Stowe Mountain Resort',
-                'Mount Snow',
-                'Sugarbush Resort',
-                'Okemo Mountain Resort'
-            ],
-            'new hampshire': [
-                'Loon Mountain',
-                'Waterville Valley',
-                'Bretton Woods',
-                'Cannon Mountain',
-                'Mount Sunapee'
-            ],
-            'maine': [
-                'Sunday River',
-                'Sugarloaf',
-                'Saddleback Mountain',
-                'Shawnee Peak',
-                'Mount Abram'
-            ]
-        }
+        self.known_resorts = KNOWN_RESORTS
+
+    @property
+    def model(self):
+        return self._model.get()
 
-    @lru_cache(maxsize=100)
+    @property
+    def nlp(self):
+        return self._nlp.get()
+
+    def prewarm(self, background=False):
+        """Load the NLP and embedding models now instead of on the first search."""
+        return prewarm([self._nlp, self._model], background=background)
+
+    def get_json(self, url, params):
+        """
+        GET a Google Maps API endpoint through the pooled, retrying client,
+        serving repeat requests from the shared response cache.
+        Returns the decoded JSON body, or None if the request failed.
+        """
+        return self.client.get_json(endpoint_from_url(url), params)
+
+    @timed("geocode")
     def get_lat_lng_from_location(self, location):
         url = "https://maps.googleapis.com/maps/api/geocode/json"
-        params = {"address": location, "key": self.API_KEY}
-        response = requests.get(url, params=params).json()
+        params = {"address": location}
+        response = self.get_json(url, params) or {}
 
         if response.get("results"):
             lat = response["results"][0]["geometry"]["location"]["lat"]
@@ -70,186 +179,560 @@ class SkiResortFinder:
             return lat, lng
         return None, None
 
+    @timed("extract_location")
     def extract_location(self, query):
-        doc = self.nlp(query)
-        locations = []
-        
-        # Extract locations and states
-        for ent in doc.ents:
-            if ent.label_ in ["GPE", "LOC"]:
-                locations.append(ent.text.lower())
-        
-        # Check for state names in the query
-        state_keywords = {
-            'massachusetts': ['massachusetts', 'ma', 'berkshire', 'wachusett'],
-            'vermont': ['vermont', 'vt', 'killington', 'stowe'],
-            'new hampshire': ['new hampshire', 'nh', 'loon', 'waterville'],
-            'maine': ['maine', 'me', 'sunday river', 'sugarloaf']
+        return self.location_extractor.extract(query)
+
+    @timed("extract_location")
+    def extract_locations(self, queries):
+        """extract_location for many queries, batching spaCy over the gazetteer misses."""
+        return self.location_extractor.extract_many(queries)
+
+    def _nearby_params(self, lat, lng, page_token=None, radius_km=50):
+        params = {
+            "location": f"{lat},{lng}",
+            "radius": int(radius_km * 1000),  # 50km for top-level coverage cells
+            "keyword": self.nearby_keyword,
+            "type": "establishment"
         }
-        
-        for state, keywords in state_keywords.items():
-            if any(keyword in query.lower() for keyword in keywords):
-                locations.append(state)
-        
-        return locations[0] if locations else None
+        if page_token:
+            params["pagetoken"] = page_token
+        return params
 
-    def fetch_ski_resorts_for_point(self, lat, lng):
-        url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+    def _parse_nearby_page(self, data, seen_resorts):
         results = []
-        seen_resorts = set()
-        next_page_token = None
-
-        while True:
-            params = {
-                "location": f"{lat},{lng}",
-                "radius": 50000,  # Increased radius to 50km
-                "keyword": "ski resort|mountain|ski area|ski hill",
-                "type": "establishment",
-                "key": self.API_KEY
+        for place in data.get("results", []):
+            place_id = place.get("place_id")
+            name = place.get("name", "").lower()
+            vicinity = place.get("vicinity", "").lower()
+
+            # Check if it's a ski resort
+            ski_keywords = ['ski', 'snowboard', 'mountain', 'resort', 'slope', 'lift']
+            if not any(keyword in name or keyword in vicinity for keyword in ski_keywords):
+                continue
+
+            # Skip non-resort places
+            exclude_keywords = ['shop', 'club', 'sledding', 'touring', 'tubing', 'hill', 'lodge', 'center', 'parking', 'cross country', 'cabin']
+            if any(term in name for term in exclude_keywords):
+                continue
+
+            # Skip places another cell (or page) of this search already returned
+            if not seen_resorts.claim(place_id):
+                continue
+
+            resort = {
+                "name": place.get("name"),
+                "address": place.get("vicinity"),
+                "rating": place.get("rating", 0),
+                "lat": place["geometry"]["location"]["lat"],
+                "lng": place["geometry"]["location"]["lng"],
+                "place_id": place_id
             }
-            if next_page_token:
-                params["pagetoken"] = next_page_token
-
-            response = requests.get(url, params=params)
-            if response.status_code != 200:
-                break
-
-            data = response.json()
-            if data.get("status") != "OK":
-                break
-
-            for place in data.get("results", []):
-                place_id = place.get("place_id")
-                name = place.get("name", "").lower()
-                vicinity = place.get("vicinity", "").lower()
-
-                # Skip if already seen or not a ski resort
-                if place_id in seen_resorts:
-                    continue
-
-                # Check if it's a ski resort
-                ski_keywords = ['ski', 'snowboard', 'mountain', 'resort', 'slope', 'lift']
-                if not any(keyword in name or keyword in vicinity for keyword in ski_keywords):
-                    continue
-
-                # Skip non-resort places
-                exclude_keywords = ['shop', 'club', 'sledding', 'touring', 'tubing', 'hill', 'lodge', 'center', 'parking', 'cross country', 'cabin']
-                if any(term in name for term in exclude_keywords):
-                    continue
-
-                resort = {
-                    "name": place.get("name"),
-                    "address": place.get("vicinity"),
-                    "rating": place.get("rating", 0),
-                    "lat": place["geometry"]["location"]["lat"],
-                    "lng": place["geometry"]["location"]["lng"],
-                    "place_id": place_id
-                }
-                results.append(resort)
-                seen_resorts.add(place_id)
-
-            next_page_token = data.get("next_page_token")
-            if not next_page_token:
-                break
-            time.sleep(1)
+            results.append(resort)
         return results
 
+    def _page_chain(self, lat, lng, radius_km, seen, fetch, label):
+        """PageChain over one circle's Nearby Search pages; places already claimed in seen are skipped."""
+        seen_resorts = seen if seen is not None else SeenPlaces()
+
+        def parse(data):
+            self.catalog.upsert_places(data.get("results", []))
+            return self._parse_nearby_page(data, seen_resorts)
+
+        keep_paging = None
+        if self.enough_candidates is not None:
+            keep_paging = lambda: len(seen_resorts) < self.enough_candidates
+        return PageChain(
+            lambda token: fetch(self._nearby_params(lat, lng, token, radius_km)),
+            parse,
+            is_cached=lambda token: self.cache.contains("place/nearbysearch", self._nearby_params(lat, lng, token, radius_km)),
+            keep_paging=keep_paging,
+            label=label,
+        )
+
+    def _fetch_page(self, params):
+        return self.get_json("https://maps.googleapis.com/maps/api/place/nearbysearch/json", params)
+
+    def fetch_cell(self, lat, lng, radius_km=50, seen=None):
+        """
+        Nearby Search one circle, following page tokens.
+        Returns (resorts, raw_result_count, incomplete); the count is None if the first request
+        failed, incomplete is True if a later page failed.
+        Places already claimed in seen (a SeenPlaces shared by all cells of a search) are skipped.
+        """
+        return self._page_chain(lat, lng, radius_km, seen, self._fetch_page, "fetch_ski_resorts_for_point").run()
+
+    def fetch_cell_deferred(self, executor, lat, lng, radius_km=50, seen=None):
+        """
+        fetch_cell as one executor task per page, so no worker sits idle while a
+        page token warms up. Returns a Future of (resorts, raw_result_count, incomplete).
+        """
+        return self._page_chain(lat, lng, radius_km, seen, self._fetch_page, "fetch_ski_resorts_for_point").run_deferred(executor)
+
+    def fetch_ski_resorts_for_point(self, lat, lng):
+        return self.fetch_cell(lat, lng)[0]
+
+    async def fetch_cell_async(self, lat, lng, radius_km=50, seen=None):
+        chain = self._page_chain(
+            lat, lng, radius_km, seen,
+            lambda params: self.client.get_json_async("place/nearbysearch", params),
+            "fetch_ski_resorts_for_point_async"
+        )
+        return await chain.run_async()
+
+    async def fetch_ski_resorts_for_point_async(self, lat, lng):
+        return (await self.fetch_cell_async(lat, lng))[0]
+
     def get_ski_resorts_grid_search(self, center_lat, center_lng):
-        step_distance = 30  # Reduced step distance for better coverage
-        lat_step = step_distance / 110.574
-        lng_step = step_distance / (111.320 * abs(np.cos(np.radians(center_lat))))
-
-        ski_resorts = []
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            lat_lng_points = [(center_lat + d_lat * lat_step, center_lng + d_lng * lng_step) 
-                            for d_lat in [-2, -1, 0, 1, 2] 
-                            for d_lng in [-2, -1, 0, 1, 2]]
-            ski_resorts = list(executor.map(lambda point: self.fetch_ski_resorts_for_point(*point), lat_lng_points))
-        return [resort for sublist in ski_resorts for resort in sublist]
-
-    def filter_by_distance(self, resorts, lat, lng):
-        return [
-            {**resort, "distance": geodesic((lat, lng), (resort["lat"], resort["lng"])).km}
-            for resort in resorts if geodesic((lat, lng), (resort["lat"], resort["lng"])).km <= self.max_distance_km
-        ]
-
-    def create_resort_embeddings(self, resorts):
-        return np.array([self.model.encode(resort["name"] + " " + resort["address"]) for resort in resorts])
-
-    def get_top_matches(self, query, resort_embeddings, resorts, top_n=10):
-        user_query_embedding = self.model.encode(query).reshape(1, -1)
-        similarities = cosine_similarity(user_query_embedding, resort_embeddings)[0]
-        sorted_resorts = sorted(zip(resorts, similarities), key=lambda x: -x[1])[:top_n]
-        return [resort for resort, _ in sorted_resorts]
-
-    def remove_duplicates(self, resorts):
-        unique_resorts = {}
-        for resort in resorts:
-            key = (resort["name"].lower(), resort["address"].lower())
-            if key not in unique_resorts:
-                unique_resorts[key] = resort
-        return list(unique_resorts.values())
-
-    def remove_invalid_resorts(self, resorts):
-        return [resort for resort in resorts if resort['rating'] > 0]
-
-    def sort_resorts(self, resorts):
-        return sorted(resorts, key=lambda x: (-x["rating"], x["distance"]))
+        # Adaptive hexagonal coverage of the max_distance_km disk instead of a fixed 5x5 grid
+        # One place_id set across all cells, so overlapping cells do not repeat places
+        seen = SeenPlaces()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return self.coverage_planner.search(
+                center_lat, center_lng, self.max_distance_km,
+                lambda cells: [future.result() for future in [
+                    self.fetch_cell_deferred(executor, cell.lat, cell.lng, cell.radius_km, seen) for cell in cells
+                ]],
+                on_complete=lambda: self.record_coverage(center_lat, center_lng)
+            )
 
-    def find_best_ski_resorts(self, user_query):
-        location = self.extract_location(user_query)
-        if not location:
+    async def get_ski_resorts_grid_search_async(self, center_lat, center_lng, on_cell=None):
+        # Every cell and its page-token chain runs concurrently; on_cell sees each cell's resorts as it completes
+        seen = SeenPlaces()
+
+        async def fetch_cell(cell):
+            fetched = await self.fetch_cell_async(cell.lat, cell.lng, cell.radius_km, seen)
+            if on_cell:
+                on_cell(fetched[0])
+            return fetched
+
+        async def fetch_cells(cells):
+            return await asyncio.gather(*(fetch_cell(cell) for cell in cells))
+
+        return await self.coverage_planner.search_async(
+            center_lat, center_lng, self.max_distance_km, fetch_cells,
+            on_complete=lambda: self.record_coverage(center_lat, center_lng)
+        )
+
+    def record_coverage(self, lat, lng):
+        # Pages skipped for enough_candidates never reached the catalog, so the region is not fully crawled
+        stats = search_stats.current_stats()
+        if stats is None or not stats.get("pages_skipped"):
+            self.catalog.record_coverage(lat, lng, self.max_distance_km, keyword=self.nearby_keyword)
+
+    def catalog_resorts(self, lat, lng):
+        """
+        Resorts around a point from the local catalog, or None if the
+        region has not been searched recently enough to trust it. With a
+        crawler attached, an expired region is still answered from the
+        catalog (up to the crawler's stale_max_age) and queued for a refresh.
+        """
+        if search_stats.current_priority() == search_stats.INTERACTIVE:
+            # Popular search centres are pre-crawled by the RegionCrawler
+            self.catalog.record_query(lat, lng)
+        age = self.catalog.coverage_age(lat, lng, self.max_distance_km, keyword=self.nearby_keyword)
+        if age is None:
+            return None
+        if age > self.catalog.max_age:
+            if self.crawler is None or not self.crawler.serves_stale(age):
+                return None
+            self.crawler.revalidate(lat, lng)
+            search_stats.incr("catalog_stale_hits")
+        places = self.catalog.query_radius(lat, lng, self.max_distance_km)
+        search_stats.incr("catalog_hits")
+        return self._parse_nearby_page({"results": places}, SeenPlaces())
+
+    @timed("grid_search")
+    def find_resorts_near(self, lat, lng):
+        """Resorts around a point: from the catalog when covered, otherwise from Google."""
+        resorts = self.catalog_resorts(lat, lng)
+        if resorts is None:
+            resorts = self.get_ski_resorts_grid_search(lat, lng)
+        return resorts
+
+    @timed("grid_search")
+    async def find_resorts_near_async(self, lat, lng):
+        resorts = self.catalog_resorts(lat, lng)
+        if resorts is None:
+            resorts = await self.get_ski_resorts_grid_search_async(lat, lng)
+        return resorts
+
+    async def stream_resorts_near_async(self, lat, lng):
+        """
+        find_resorts_near_async in batches of (source, resorts): the whole catalog
+        answer when the region is covered, otherwise each coverage cell as it completes.
+        """
+        resorts = self.catalog_resorts(lat, lng)
+        if resorts is not None:
+            yield "catalog", resorts
+            return
+        batches = asyncio.Queue()
+        search = asyncio.ensure_future(self.get_ski_resorts_grid_search_async(lat, lng, on_cell=batches.put_nowait))
+        search.add_done_callback(lambda _: batches.put_nowait(None))
+        try:
+            while True:
+                batch = await batches.get()
+                if batch is None:
+                    break
+                if batch:
+                    yield "cells", batch
+            await search
+        finally:
+            # The consumer went away (e.g. the client disconnected)
+            if not search.done():
+                search.cancel()
+
+    def _preview(self, resorts, lat, lng):
+        """Unranked, in-range resorts for a streamed partial result."""
+        candidates = self.filter_by_distance(CandidateBatch.from_records(resorts), lat, lng)
+        return self.sort_resorts(self.remove_invalid_resorts(candidates)).records()
+
+    @timed("filter_by_distance")
+    def filter_by_distance(self, candidates, lat, lng):
+        # One vectorized haversine pass over all candidates; geodesic only for survivors if exact
+        return candidates.within(lat, lng, self.max_distance_km, exact=self.exact_distances)
+
+    @timed("create_resort_embeddings")
+    def create_resort_embeddings(self, candidates):
+        resorts = candidates.source_records()
+        positions, rows = self.vector_index.lookup([resort_key(resort) for resort in resorts])
+        if len(positions) == len(resorts):
+            # Every candidate is in the prebuilt index: read its normalized rows from the memmap
+            return self.vector_index.matrix[rows]
+        if not len(positions):
+            # One batched encode call for resorts that have never been seen before
+            return self.embedding_store.encode_resorts(self.model, resorts)
+        # Indexed rows from the memmap, and one encode call for the rest (e.g. known resorts)
+        missing = np.setdiff1d(np.arange(len(resorts)), positions)
+        encoded = normalize(self.embedding_store.encode_resorts(self.model, [resorts[i] for i in missing]))
+        matrix = np.empty((len(resorts), encoded.shape[1]), dtype=np.float32)
+        matrix[positions] = self.vector_index.matrix[rows]
+        matrix[missing] = encoded
+        search_stats.incr("index_rows", len(positions))
+        return matrix
+
+    def _index_rows(self, candidates):
+        """Vector index rows of the candidates, or None unless every one of them is indexed."""
+        keys = [resort_key(resort) for resort in candidates.source_records()]
+        if not self.vector_index.has_all(keys):
             return None
+        return self.vector_index.rows_for(keys)
+
+    def encode_query(self, query):
+        """Normalized query embedding, from the query embedding cache when there is one."""
+        if self.query_embeddings is not None:
+            return self.query_embeddings.encode(self.model, query)
+        return normalize(self.model.encode(query))
+
+    def encode_queries(self, queries):
+        if self.query_embeddings is not None:
+            return self.query_embeddings.encode_many(self.model, queries)
+        return normalize(self.model.encode(queries, batch_size=64, convert_to_numpy=True, show_progress_bar=False))
+
+    @timed("lexical_prefilter")
+    def lexical_candidates(self, query, candidates):
+        """
+        (candidates, BM25 scores): the lexical_prefilter best BM25 matches among the
+        candidates, or all of them; the scores are None unless the prefilter or the
+        hybrid score is on.
+        """
+        if self.lexical_prefilter is None and not self.lexical_weight:
+            return candidates, None
+        scores = bm25_scores(query, [resort_text(resort) for resort in candidates.source_records()])
+        positions = shortlist(scores, candidates.ratings[candidates.rows], self.lexical_prefilter)
+        if len(positions) < len(candidates):
+            search_stats.incr("lexical_prefiltered", len(candidates) - len(positions))
+            candidates = candidates.take(positions)
+        return candidates, scores[positions]
+
+    @timed("get_top_matches")
+    def get_top_matches(self, query, resort_embeddings, candidates, top_n=10, lexical_scores=None, index_rows=None):
+        """
+        Top top_n candidates for query. With index_rows (every candidate's row in the
+        vector index, see _index_rows) and no resort_embeddings, the index scores
+        those rows itself.
+        """
+        if resort_embeddings is None:
+            best_rows, _ = self.vector_index.search(self.encode_query(query), top_n, rows=index_rows)
+            position_of = {}
+            for position, row in enumerate(index_rows.tolist()):
+                position_of.setdefault(row, position)
+            search_stats.incr("index_rows", len(index_rows))
+            return candidates.take(np.array([position_of[row] for row in best_rows.tolist()], dtype=np.int64))
+        # Cosine similarity is a dot product of normalized vectors; argpartition avoids a full sort
+        similarities = normalize(resort_embeddings) @ self.encode_query(query)
+        similarities = hybrid_scores(similarities, lexical_scores, self.lexical_weight)
+        return candidates.take(top_k(similarities, top_n))
 
+    def remove_duplicates(self, candidates):
+        # Same place under another name or a known resort's synthetic address; one hashed pass
+        return candidates.unique()
+
+    def remove_invalid_resorts(self, candidates):
+        return candidates.rated()
+
+    def sort_resorts(self, candidates):
+        return candidates.sorted_by_rating()
+
+    def _known_state(self, location):
         # Check if we have known resorts for this location
         location_lower = location.lower()
-        for state, resorts in self.known_resorts.items():
+        for state in self.known_resorts:
             if state in location_lower:
-                # Get coordinates for the state
-                lat, lng = self.get_lat_lng_from_location(state)
-                if lat and lng:
-                    # Combine known resorts with found resorts
-                    known_resorts_data = []
-                    for resort_name in resorts:
-                        resort_data = {
-                            "name": resort_name,
-                            "address": f"{resort_name}, {state.title()}",
-                            "rating": 4.5,  # Default rating for known resorts
-                            "lat": lat,
-                            "lng": lng,
-                            "place_id": None
-                        }
-                        known_resorts_data.append(resort_data)
-                    
-                    # Get additional resorts from Google Places
-                    found_resorts = self.get_ski_resorts_grid_search(lat, lng)
-                    all_resorts = known_resorts_data + found_resorts
-                    
-                    # Process and return results
-                    all_resorts = self.filter_by_distance(all_resorts, lat, lng)
-                    all_resorts = self.remove_duplicates(all_resorts)
-                    all_resorts = self.remove_invalid_resorts(all_resorts)
-                    
-                    if not all_resorts:
-                        return None
-                    
-                    resort_embeddings = self.create_resort_embeddings(all_resorts)
-                    top_resorts = self.get_top_matches(user_query, resort_embeddings, all_resorts, top_n=10)
-                    return self.sort_resorts(top_resorts)
+                return state
+        return None
+
+    def _rank_resorts(self, user_query, resorts, lat, lng):
+        # Every stage narrows a columnar batch; dicts are only built for the final top 10
+        candidates = self.filter_by_distance(CandidateBatch.from_records(resorts), lat, lng)
+        candidates = self.remove_duplicates(candidates)
+        report_duplicates()
+        candidates = self.remove_invalid_resorts(candidates)
+
+        if not candidates:
+            return None
+
+        candidates, lexical_scores = self.lexical_candidates(user_query, candidates)
+        # The hybrid score needs every similarity, which the index search does not return
+        index_rows = self._index_rows(candidates) if not self.lexical_weight else None
+        resort_embeddings = self.create_resort_embeddings(candidates) if index_rows is None else None
+        top_resorts = self.get_top_matches(user_query, resort_embeddings, candidates, top_n=10,
+                                           lexical_scores=lexical_scores, index_rows=index_rows)
+        return self.sort_resorts(top_resorts).records()
+
+    def _rank_resorts_batch(self, user_queries, resort_lists, centers, top_n=10):
+        """
+        _rank_resorts for many queries at once: every distinct candidate is embedded
+        once, all queries are encoded in one call and scored with one matrix product.
+        """
+        batches = []
+        lexical = []
+        for user_query, resorts, (lat, lng) in zip(user_queries, resort_lists, centers):
+            candidates = CandidateBatch.from_records(resorts if lat is not None else [])
+            lexical_scores = None
+            if lat is not None:
+                candidates = self.remove_invalid_resorts(self.remove_duplicates(self.filter_by_distance(candidates, lat, lng)))
+                candidates, lexical_scores = self.lexical_candidates(user_query, candidates)
+            batches.append(candidates)
+            lexical.append(lexical_scores)
+
+        columns = {}
+        unique_resorts = []
+        batch_columns = []
+        for candidates in batches:
+            resort_columns = []
+            for resort in candidates.source_records():
+                key = resort_key(resort)
+                if key not in columns:
+                    columns[key] = len(unique_resorts)
+                    unique_resorts.append(resort)
+                resort_columns.append(columns[key])
+            batch_columns.append(np.array(resort_columns, dtype=np.int64))
+        results = [None] * len(user_queries)
+        ranked = [i for i, candidates in enumerate(batches) if candidates]
+        if not ranked:
+            return results
+
+        resort_embeddings = normalize(self.create_resort_embeddings(CandidateBatch.from_records(unique_resorts)))
+        query_embeddings = self.encode_queries([user_queries[i] for i in ranked])
+        similarities = query_embeddings @ resort_embeddings.T
+        for row, i in enumerate(ranked):
+            scores = hybrid_scores(similarities[row, batch_columns[i]], lexical[i], self.lexical_weight)
+            best = top_k(scores, top_n)
+            results[i] = self.sort_resorts(batches[i].take(best)).records()
+        return results
+
+    def _geocode_many(self, names):
+        """Geocode distinct place names in parallel; returns {name: (lat, lng)}."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {name: submit_with_context(executor, self.get_lat_lng_from_location, name) for name in names}
+            return {name: future.result() for name, future in futures.items()}
+
+    @timed("grid_search")
+    def _resorts_near_many(self, centers):
+        """
+        find_resorts_near for many centers: covered regions come from the catalog and
+        the rest share one batch coverage search, so overlapping cells are fetched once.
+        """
+        found = {}
+        for center in centers:
+            resorts = self.catalog_resorts(*center)
+            if resorts is not None:
+                found[center] = resorts
+        missing = [center for center in centers if center not in found]
+        if not missing:
+            return found
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            def fetch_cells(cells):
+                return [future.result() for future in [
+                    self.fetch_cell_deferred(executor, cell.lat, cell.lng, cell.radius_km) for cell in cells
+                ]]
+            resort_lists, complete = self.coverage_planner.search_batch(missing, self.max_distance_km, fetch_cells)
+        for center, resorts, searched in zip(missing, resort_lists, complete):
+            found[center] = resorts
+            if searched:
+                self.record_coverage(*center)
+        return found
+
+    def find_best_ski_resorts(self, user_query):
+        with track_search() as stats:
+            results = self._find_best_ski_resorts(user_query)
+            stats.incr("results", len(results or []))
+            return results
+
+    def _find_best_ski_resorts(self, user_query):
+        location = self.extract_location(user_query)
+        if not location:
+            return None
+
+        state = self._known_state(location)
+        if state:
+            # Get coordinates for the state
+            lat, lng = self.get_lat_lng_from_location(state)
+            if lat and lng:
+                # Combine known resorts with resorts from Google Places
+                found_resorts = self.find_resorts_near(lat, lng)
+                all_resorts = known_resort_records(state, lat, lng) + found_resorts
+                return self._rank_resorts(user_query, all_resorts, lat, lng)
 
         # If no known resorts found, proceed with regular search
         latitude, longitude = self.get_lat_lng_from_location(location)
         if not latitude or not longitude:
             return None
 
-        ski_resorts = self.get_ski_resorts_grid_search(latitude, longitude)
-        ski_resorts = self.filter_by_distance(ski_resorts, latitude, longitude)
-        ski_resorts = self.remove_duplicates(ski_resorts)
-        ski_resorts = self.remove_invalid_resorts(ski_resorts)
+        ski_resorts = self.find_resorts_near(latitude, longitude)
+        return self._rank_resorts(user_query, ski_resorts, latitude, longitude)
+
+    def find_best_ski_resorts_batch(self, user_queries):
+        """
+        find_best_ski_resorts for many queries, in order. Locations are extracted
+        in one batch, distinct places geocoded in parallel, overlapping coverage
+        cells fetched once for all queries, and ranking is one batched encode
+        plus one matrix product.
+        """
+        user_queries = list(user_queries)
+        # Batch traffic yields to interactive searches at the rate limiter
+        with track_search(priority=search_stats.BATCH, searches=len(user_queries)):
+            return self._find_best_ski_resorts_batch(user_queries)
+
+    def _find_best_ski_resorts_batch(self, user_queries):
+        locations = self.extract_locations(user_queries)
+        names = set()
+        for location in locations:
+            if location:
+                names.add(location)
+                state = self._known_state(location)
+                if state:
+                    names.add(state)
+        geocoded = self._geocode_many(names)
+
+        # Same precedence as find_best_ski_resorts: a known state's resorts, else the location
+        targets = []
+        for location in locations:
+            target = None
+            if location:
+                state = self._known_state(location)
+                lat, lng = geocoded[state] if state else (None, None)
+                if lat and lng:
+                    target = ((lat, lng), state)
+                else:
+                    lat, lng = geocoded[location]
+                    if lat and lng:
+                        target = ((lat, lng), None)
+            targets.append(target)
 
-        if not ski_resorts:
+        found = self._resorts_near_many(sorted({target[0] for target in targets if target}))
+        resort_lists = []
+        centers = []
+        for target in targets:
+            if target is None:
+                resort_lists.append([])
+                centers.append((None, None))
+                continue
+            center, state = target
+            known = known_resort_records(state, *center) if state else []
+            resort_lists.append(known + found[center])
+            centers.append(center)
+        return self._rank_resorts_batch(user_queries, resort_lists, centers)
+
+    @timed("geocode")
+    async def get_lat_lng_from_location_async(self, location):
+        response = await self.client.get_json_async("geocode", {"address": location}) or {}
+        if response.get("results"):
+            lat = response["results"][0]["geometry"]["location"]["lat"]
+            lng = response["results"][0]["geometry"]["location"]["lng"]
+            return lat, lng
+        return None, None
+
+    async def find_best_ski_resorts_async(self, user_query):
+        """
+        Coroutine version of find_best_ski_resorts. Geocoding, every coverage cell and
+        every page-token chain are awaited concurrently, so latency is bounded by
+        the slowest chain; CPU-bound NLP and ranking run in a worker thread.
+        """
+        with track_search() as stats:
+            results = await self._find_best_ski_resorts_async(user_query)
+            stats.incr("results", len(results or []))
+            return results
+
+    async def _find_best_ski_resorts_async(self, user_query):
+        location = await asyncio.to_thread(self.extract_location, user_query)
+        if not location:
+            return None
+
+        state = self._known_state(location)
+        if state:
+            lat, lng = await self.get_lat_lng_from_location_async(state)
+            if lat and lng:
+                found_resorts = await self.find_resorts_near_async(lat, lng)
+                all_resorts = known_resort_records(state, lat, lng) + found_resorts
+                return await asyncio.to_thread(self._rank_resorts, user_query, all_resorts, lat, lng)
+
+        latitude, longitude = await self.get_lat_lng_from_location_async(location)
+        if not latitude or not longitude:
             return None
 
-        resort_embeddings = self.create_resort_embeddings(ski_resorts)
-        top_resorts = self.get_top_matches(user_query, resort_embeddings, ski_resorts, top_n=10)
-        return self.sort_resorts(top_resorts)
+        ski_resorts = await self.find_resorts_near_async(latitude, longitude)
+        return await asyncio.to_thread(self._rank_resorts, user_query, ski_resorts, latitude, longitude)
+
+    async def stream_best_ski_resorts_async(self, user_query):
+        """
+        Streaming version of find_best_ski_resorts_async, as an async generator of events:
+        a "location" event once the query is geocoded, "partial" events with unranked
+        resorts as known resorts, the catalog or each coverage cell arrive, then one
+        "final" event with the ranked list (or an "error" event).
+        """
+        with track_search():
+            location = await asyncio.to_thread(self.extract_location, user_query)
+            if not location:
+                yield {"type": "error", "error": "No location found in the query"}
+                return
+
+            known = []
+            lat = lng = None
+            state = self._known_state(location)
+            if state:
+                lat, lng = await self.get_lat_lng_from_location_async(state)
+                if lat and lng:
+                    known = known_resort_records(state, lat, lng)
+            if not lat or not lng:
+                lat, lng = await self.get_lat_lng_from_location_async(location)
+                if not lat or not lng:
+                    yield {"type": "error", "error": f"Could not geocode {location}"}
+                    return
+            yield {"type": "location", "location": state or location, "lat": lat, "lng": lng}
+
+            resorts = list(known)
+            preview = self._preview(known, lat, lng) if known else None
+            if preview:
+                yield {"type": "partial", "source": "known", "resorts": preview}
+            async for source, batch in self.stream_resorts_near_async(lat, lng):
+                resorts.extend(batch)
+                # A cell whose new places are all out of range or unrated adds nothing to show
+                preview = self._preview(batch, lat, lng)
+                if preview:
+                    yield {"type": "partial", "source": source, "resorts": preview}
+
+            ranked = await asyncio.to_thread(self._rank_resorts, user_query, resorts, lat, lng)
+            yield {"type": "final", "resorts": ranked or []}
@@ -0,0 +1,71 @@
+"""
+Startup profiler
+Reports where cold-start time goes for an app entry point: module import
+times (python -X importtime in a fresh interpreter), the first /api/test
+request, and the one-off cost of constructing the finder and loading each
+model.
+
+Run it through an entry point's --profile-startup flag, e.g.
+    python app.py --profile-startup
+"""
+import os
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ("torch", "spacy", "sentence_transformers", "transformers")
+
+
+def import_times(path, top=15):
+    """
+    Wall time to import the entry point at path in a fresh interpreter, and its
+    slowest top-level imports as (module, cumulative seconds), slowest first.
+    """
+    code = (
+        "import runpy, sys; "
+        f"sys.path.insert(0, {os.path.dirname(os.path.abspath(path))!r}); "
+        f"runpy.run_path({os.path.abspath(path)!r}, run_name='startup_profile')"
+    )
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    wall = time.perf_counter() - start
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented; keep only what the entry point itself pulled in
+        if not name.startswith("  "):
+            modules.append((name.strip(), int(cumulative) / 1e6))
+    modules.sort(key=lambda item: -item[1])
+    return wall, modules[:top]
+
+
+def profile_startup(path, app, get_finder=None):
+    """Print the startup report for the Flask app defined in the entry point at path."""
+    wall, modules = import_times(path)
+    print(f"Cold import of {os.path.basename(path)}: {wall:.2f}s (fresh interpreter)")
+    for name, seconds in modules:
+        print(f"  {seconds:8.3f}s  {name}")
+
+    start = time.perf_counter()
+    response = app.test_client().get("/api/test")
+    print(f"First /api/test: {(time.perf_counter() - start) * 1000:.1f}ms (HTTP {response.status_code})")
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(f"Model libraries loaded so far: {', '.join(loaded) if loaded else 'none'}")
+
+    if get_finder is None:
+        return
+    start = time.perf_counter()
+    finder = get_finder()
+    if finder is None:
+        print("Finder not configured (no API key); skipping model load times")
+        return
+    print(f"Finder construction: {time.perf_counter() - start:.2f}s")
+    for resource in (finder._nlp, finder._model):
+        try:
+            resource.get()
+            print(f"  {resource.load_seconds:8.2f}s  {resource.name}")
+        except Exception as e:
+            print(f"  failed    {resource.name}: {str(e)}")
@@ -0,0 +1,106 @@
+"""
+Streaming
+Helpers for the /api/search/stream endpoints.
+
+Flask streams responses from plain (sync) generators, while the finders
+produce search events from an async generator. iterate_in_thread drives
+the async generator on its own event loop in a worker thread and hands the
+events over through a queue. Events are rendered as NDJSON (one JSON object
+per line) or as Server-Sent Events when the client asks for
+text/event-stream.
+"""
+import asyncio
+import contextvars
+import json
+import queue
+import threading
+import traceback
+
+MIMETYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+# Stop proxies (nginx, Vercel) from buffering the stream
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+def iterate_in_thread(agen_factory):
+    """Yield the items of the async generator agen_factory() from a worker thread's event loop."""
+    items = queue.Queue()
+    stop = threading.Event()
+
+    async def pump():
+        agen = agen_factory()
+        try:
+            async for item in agen:
+                items.put(item)
+                if stop.is_set():
+                    break
+        finally:
+            await agen.aclose()
+
+    def run():
+        try:
+            asyncio.run(pump())
+        except Exception as e:
+            items.put(_Failure(e))
+        finally:
+            items.put(_DONE)
+
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(run,), name="search-stream", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        # Closed early (client disconnected): let the search stop at its next event
+        stop.set()
+
+
+def stream_format(accept_header):
+    return "sse" if "text/event-stream" in (accept_header or "") else "ndjson"
+
+
+def render(events, fmt):
+    """Serialize events for the wire; an exception becomes a final error event."""
+    try:
+        for event in events:
+            yield _encode(event, fmt)
+    except Exception as e:
+        print(f"Error streaming search results: {str(e)}")
+        print(traceback.format_exc())
+        yield _encode({"type": "error", "error": "An error occurred while processing your request"}, fmt)
+
+
+def _encode(event, fmt):
+    data = json.dumps(event)
+    if fmt == "sse":
+        return f"event: {event['type']}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+def search_events(result_cache, query, agen_factory):
+    """
+    Events for a query: a single cached "final" event when the result cache has
+    it, otherwise the live search, whose final result is added to the cache.
+    """
+    cached = result_cache.get(query)
+    if cached:
+        yield {"type": "final", "source": "cache", "resorts": cached}
+        return
+    for event in iterate_in_thread(agen_factory):
+        if event["type"] == "final":
+            result_cache.set(query, event["resorts"])
+        yield event
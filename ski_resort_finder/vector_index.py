@@ -0,0 +1,169 @@
+"""
+Vector Index
+Prebuilt semantic index over the resort catalog.
+
+Resort embeddings are L2-normalized once and saved as a float32 .npy matrix
+that is memory-mapped at startup, so ranking is a single matrix-vector
+product followed by an argpartition top-k instead of cosine_similarity plus a
+full Python sort. Geo+semantic queries pass the index rows of their region's
+candidates, and only those rows are scored; candidates missing from the index
+(new places, hard-coded known resorts) are encoded, and only those.
+
+Build it from the catalog (after `python resort_catalog.py import`) with:
+    python vector_index.py build
+"""
+import json
+import mmap
+import os
+import re
+
+import numpy as np
+
+try:
+    from .places_cache import default_cache_dir
+    from .embedding_store import resort_key
+except ImportError:
+    from places_cache import default_cache_dir
+    from embedding_store import resort_key
+
+
+def normalize(matrix):
+    """L2-normalize rows (or a single vector) as float32."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def top_k(scores, k):
+    """Indices of the k highest scores, best first, in O(n + k log k)."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class VectorIndex:
+    """
+    Memory-mapped, normalized embedding matrix with brute-force search.
+
+    Args:
+        model_name: Embedding model the vectors came from; each model has its own files
+        directory: Where the index files live; defaults to default_cache_dir()
+    """
+
+    def __init__(self, model_name, directory=None):
+        directory = directory or default_cache_dir()
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.matrix_path = os.path.join(directory, f"vector-index-{slug}.npy")
+        self.keys_path = os.path.join(directory, f"vector-index-{slug}.json")
+        self.matrix = None
+        self.keys = []
+        self.row_of = {}
+
+    def build(self, keys, vectors):
+        """Normalize and persist vectors."""
+        np.save(self.matrix_path, normalize(vectors))
+        with open(self.keys_path, "w") as f:
+            json.dump(list(keys), f)
+        return self.load()
+
+    def load(self):
+        """Memory-map a previously built index; returns False if there is none."""
+        if not (os.path.exists(self.matrix_path) and os.path.exists(self.keys_path)):
+            return False
+        self.matrix = np.load(self.matrix_path, mmap_mode="r")
+        with open(self.keys_path) as f:
+            self.keys = json.load(f)
+        self.row_of = {key: row for row, key in enumerate(self.keys)}
+        return True
+
+    def share(self):
+        """
+        Copy the matrix into an anonymous shared memory mapping (MAP_SHARED), for a
+        pre-fork master: every forked worker then reads the same resident pages
+        instead of faulting in (and possibly evicting) the memmap on its own.
+        """
+        if self.matrix is None or not self.matrix.size:
+            return False
+        shared = mmap.mmap(-1, self.matrix.nbytes)
+        matrix = np.frombuffer(shared, dtype=self.matrix.dtype).reshape(self.matrix.shape)
+        matrix[:] = self.matrix
+        matrix.flags.writeable = False
+        self.matrix = matrix
+        return True
+
+    @property
+    def loaded(self):
+        return self.matrix is not None
+
+    def has_all(self, keys):
+        return self.loaded and all(key in self.row_of for key in keys)
+
+    def rows_for(self, keys):
+        return np.fromiter((self.row_of[key] for key in keys), dtype=np.int64, count=len(keys))
+
+    def lookup(self, keys):
+        """(positions, rows): the positions in keys that are indexed, and their rows."""
+        if not self.loaded:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        found = [(position, self.row_of[key]) for position, key in enumerate(keys) if key in self.row_of]
+        if not found:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        positions, rows = zip(*found)
+        return np.array(positions, dtype=np.int64), np.array(rows, dtype=np.int64)
+
+    def search(self, query_vector, k, rows=None):
+        """
+        Top-k (rows, scores) for a query embedding.
+        rows restricts scoring to a candidate subset (e.g. one region); otherwise
+        every row is scored.
+        """
+        query = normalize(query_vector).reshape(-1)
+        if rows is None:
+            scores = self.matrix @ query
+            best = top_k(scores, k)
+            return best, scores[best]
+        # Sorted rows keep the memmap reads sequential
+        rows = np.sort(np.asarray(rows, dtype=np.int64))
+        scores = np.asarray(self.matrix[rows] @ query, dtype=np.float32)
+        best = top_k(scores, k)
+        return rows[best], scores[best]
+
+
+def build_from_catalog(model_name):
+    """Encode every catalog resort (reusing the embedding store) and build the index."""
+    try:
+        from .resort_catalog import get_default_catalog
+        from .embedding_store import EmbeddingStore
+        from .lazy_models import sentence_model, embedding_space
+    except ImportError:
+        from resort_catalog import get_default_catalog
+        from embedding_store import EmbeddingStore
+        from lazy_models import sentence_model, embedding_space
+
+    catalog = get_default_catalog()
+    rows = catalog._connect().execute("SELECT place_id, name, address FROM resorts").fetchall()
+    resorts = [{"place_id": place_id, "name": name, "address": address or ""} for place_id, name, address in rows]
+    store = EmbeddingStore(embedding_space(model_name))
+    vectors = store.encode_resorts(sentence_model(model_name).get(), resorts)
+    index = VectorIndex(embedding_space(model_name))
+    index.build([resort_key(resort) for resort in resorts], vectors)
+    return index
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Build the resort vector index from the catalog")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--model", default="paraphrase-distilroberta-base-v1")
+    args = parser.parse_args()
+
+    start = time.time()
+    index = build_from_catalog(args.model)
+    print(f"Indexed {len(index.keys)} resorts in {time.time() - start:.1f}s -> {index.matrix_path}")
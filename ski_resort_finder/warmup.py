@@ -0,0 +1,75 @@
+"""
+Embedding warm-up
+Pre-encodes the known_resorts table and every resort found in cached Places
+responses into the persistent embedding store, so the first searches after a
+deploy never wait on the sentence embedding model for those resorts.
+
+Usage:
+    python warmup.py [--model paraphrase-distilroberta-base-v1]
+"""
+import argparse
+import time
+
+try:
+    from .places_cache import get_default_cache
+    from .embedding_store import EmbeddingStore
+    from .lazy_models import sentence_model, embedding_space
+    from .ski_resort import KNOWN_RESORTS, known_resort_records
+except ImportError:
+    from places_cache import get_default_cache
+    from embedding_store import EmbeddingStore
+    from lazy_models import sentence_model, embedding_space
+    from ski_resort import KNOWN_RESORTS, known_resort_records
+
+
+def cached_resorts(cache):
+    """
+    Resort dicts from cached Places responses, in the shape each finder encodes:
+    Nearby Search results use the vicinity, Place Details use the formatted address.
+    """
+    resorts = []
+    for _, body in cache.iter_responses("place/nearbysearch"):
+        for place in body.get("results", []):
+            if place.get("name"):
+                resorts.append({
+                    "name": place["name"],
+                    "address": place.get("vicinity", ""),
+                    "place_id": place.get("place_id"),
+                })
+    for _, body in cache.iter_responses("place/details"):
+        place = body.get("result") or {}
+        if place.get("name"):
+            resorts.append({
+                "name": place["name"],
+                "address": place.get("formatted_address", ""),
+                "place_id": place.get("place_id"),
+            })
+    return resorts
+
+
+def warm_up(model_name):
+    """Encode every known and cached resort that is not in the embedding store yet."""
+    start = time.time()
+    # The configured embedding backend (SKI_RESORT_EMBEDDING_BACKEND), as the finders use
+    model = sentence_model(model_name).get()
+    store = EmbeddingStore(embedding_space(model_name))
+
+    resorts = []
+    for state in KNOWN_RESORTS:
+        resorts.extend(known_resort_records(state))
+    resorts.extend(cached_resorts(get_default_cache()))
+
+    if resorts:
+        store.encode_resorts(model, resorts)
+    stats = store.stats()
+    print(f"Encoded {stats['encoded']} new resorts, {stats['reused']} already stored "
+          f"({stats['entries']} total) in {time.time() - start:.1f}s")
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pre-encode resort embeddings")
+    parser.add_argument("--model", default="paraphrase-distilroberta-base-v1",
+                        help="Sentence embedding model name")
+    args = parser.parse_args()
+    warm_up(args.model)